@@ -65,6 +65,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "payments.memo.MemoScopeMiddleware",
 ]
 
 ROOT_URLCONF = "mpola.urls"
@@ -175,10 +176,41 @@ CELERY_BEAT_SCHEDULE = {
             'routing_key': 'scheduled_payments',
         }
     },
+    'refresh-schedule-status-snapshots': {
+        'task': 'mpola.tasks.refresh_schedule_status_snapshots',
+        'schedule': 60.0,  # Every minute; only stale snapshots are recomputed
+    },
+    'archive-finished-schedules': {
+        'task': 'mpola.tasks.archive_finished_schedules_task',
+        'schedule': crontab(minute=30, hour=3),  # Daily, off-peak
+    },
+    'drain-webhook-inbox': {
+        'task': 'mpola.tasks.drain_webhook_inbox',
+        'schedule': 2.0,  # Concurrent drains skip each other's locked rows
+        'options': {'expires': 10},
+    },
+    'reconcile-stuck-transactions': {
+        'task': 'mpola.tasks.reconcile_stuck_transactions',
+        'schedule': crontab(minute='*/5'),
+        'options': {'expires': 240},
+    },
+    'expire-stale-fund-transactions': {
+        'task': 'mpola.tasks.expire_stale_fund_transactions',
+        'schedule': crontab(minute='*/5'),
+        'options': {'expires': 240},
+    },
+    'prune-webhook-inbox': {
+        'task': 'mpola.tasks.prune_webhook_inbox',
+        'schedule': crontab(minute=45, hour=3),  # Daily, off-peak
+    },
 }
 
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# Archive tier: finished schedules untouched for this many days move to the archive tables
+ARCHIVE_RETENTION_DAYS = 90
+ARCHIVE_CHUNK_SIZE = 200
+
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -188,11 +220,93 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # For development - change for production
     ],
+    # orjson-backed drop-ins for the stock JSON classes (fall back to them if orjson is missing)
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'payments.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'payments.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
+# Keyset pagination for /api/payment-schedules/
+PAYMENT_SCHEDULES_PAGE_SIZE = 50
+PAYMENT_SCHEDULES_MAX_PAGE_SIZE = 200
+
+# Paging of nested data in /api/payment-schedules/<id>/
+SCHEDULE_DETAIL_RECEIVERS_PAGE_SIZE = 100
+SCHEDULE_DETAIL_MAX_RECEIVERS_PAGE_SIZE = 500
+SCHEDULE_DETAIL_TRANSACTIONS_LIMIT = 100
+
+# Response cache (payments/cache.py). Shared Redis, so invalidations made by
+# Celery workers reach the web processes; lookups degrade to misses if it is down.
+# Its location comes from PAYMENT_CACHE_URL. The test runner gets a private
+# in-process cache instead, so the cache paths are exercised without Redis.
+import os
+import sys
+
+if sys.argv[1:2] == ["test"]:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "TIMEOUT": 300,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get("PAYMENT_CACHE_URL", "redis://localhost:6379/1"),
+            "TIMEOUT": 300,
+        }
+    }
+PAYMENT_CACHE_TIMEOUT = 300
+
+# Delta sync (/api/changes/): rows per feed per call, and how old a change must
+# be before it is served (covers writes that commit after stamping updated_at)
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 2000
+CHANGES_SETTLE_SECONDS = 2
+
+# Receivers per call of the batch /api/receiver-progress/ endpoint
+RECEIVER_PROGRESS_MAX_BATCH = 500
+
+# Webhook inbox: /api/webhook/ stores payloads and a periodic task applies them
+# in batches. Inline processing (no Celery worker needed) is for local development.
+WEBHOOK_PROCESS_INLINE = False
+WEBHOOK_INBOX_BATCH_SIZE = 200
+WEBHOOK_INBOX_MAX_ATTEMPTS = 10
+WEBHOOK_INBOX_RETENTION_DAYS = 14
+# Event keys remembered per process, so most redeliveries skip the database
+WEBHOOK_DEDUP_CACHE_SIZE = 10000
+
+# Reconciler: transactions in flight this long are checked with Bitnob, at most
+# RECONCILE_BATCH_SIZE per run over RECONCILE_WORKERS concurrent requests, and no
+# faster than BITNOB_STATUS_QUERY_RATE requests/second per process
+RECONCILE_STUCK_AFTER_MINUTES = 30
+RECONCILE_BATCH_SIZE = 200
+RECONCILE_WORKERS = 4
+BITNOB_STATUS_QUERY_RATE = 5
+BITNOB_STATUS_QUERY_BURST = 10
+BITNOB_STATUS_QUERY_TIMEOUT = 10
+
+# USDT deposit quotes still pending this long are expired (FUND_EXPIRY_BATCH_SIZE rows per statement)
+FUND_QUOTE_LIFETIME_MINUTES = 60
+FUND_EXPIRY_BATCH_SIZE = 500
+
+# Rows fetched per database round trip by the streaming transaction export
+EXPORT_CHUNK_SIZE = 2000
+
+# Server-sent event streams ("redis" = shared across workers, "memory" = this process only).
+# Webhooks are applied by the Celery drain, so "memory" only works with WEBHOOK_PROCESS_INLINE.
+PAYMENT_EVENTS_BACKEND = "redis"
+PAYMENT_EVENTS_REDIS_URL = CELERY_BROKER_URL
+PAYMENT_EVENTS_QUEUE_SIZE = 100
+PAYMENT_EVENTS_HEARTBEAT_SECONDS = 15
+PAYMENT_EVENTS_RETRY_MS = 3000
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:4200",
@@ -207,6 +321,9 @@ CORS_ALLOW_ALL_ORIGINS = True
 # Allow credentials to be included in CORS requests
 CORS_ALLOW_CREDENTIALS = True
 
+# Let browser clients read the ETag used for conditional GETs
+CORS_EXPOSE_HEADERS = ["ETag"]
+
 # CSRF Configuration for API
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:4200",
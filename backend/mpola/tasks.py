@@ -1,21 +1,35 @@
 # tasks.py
 from celery import shared_task
 from django.utils import timezone
-from django.db import transaction
+from django.db import transaction, IntegrityError
 from datetime import datetime, timedelta
 import logging
 from payments.models import PaymentSchedule, MobileReceiver, MobileTransaction
 from payments.services.bitnob import request_mobile_invoice, pay_mobile_invoice, create_and_pay_mobile_invoice
+from payments.memo import memoized_unit
+from payments.cache import invalidate_schedule
+from payments.services.archive import archive_finished_schedules
+from payments.services.dashboard import refresh_status_snapshots
+from payments.webhooks import drain_inbox, prune_inbox
+from payments.services.reconcile import reconcile_stuck_transactions as reconcile_stuck
+from payments.services.expiry import expire_stale_fund_transactions as expire_stale_quotes
+from payments.services.wallet import allocate_wallet_funding
 
 logger = logging.getLogger(__name__)
 
 @shared_task
+@memoized_unit
 def process_scheduled_payments():
     """
     Main task to process all due scheduled payments
     This should be run periodically (e.g., every hour or daily)
     """
     logger.info("Starting scheduled payments processing...")
+
+    # Fund what the customers' pooled wallets can cover before picking schedules
+    allocation = allocate_wallet_funding()
+    if allocation["schedules_funded"]:
+        logger.info(f"Wallet allocation: {allocation}")
     
     # Get all active, funded schedules
     active_schedules = PaymentSchedule.objects.filter(
@@ -44,6 +58,7 @@ def process_scheduled_payments():
     }
 
 @shared_task
+@memoized_unit
 def process_schedule_payments(schedule_id):
     """
     Process payments for a specific schedule
@@ -56,7 +71,9 @@ def process_schedule_payments(schedule_id):
     
     logger.info(f"Processing payments for schedule: {schedule.title} ({schedule_id})")
     
-    # Check if schedule is adequately funded
+    # Check if schedule is adequately funded, drawing on the customer's wallet if not
+    if not schedule.is_adequately_funded and allocate_wallet_funding(pk=schedule.pk)["schedules_funded"]:
+        schedule.refresh_from_db(fields=['funded_amount_minor', 'is_funded'])
     if not schedule.is_adequately_funded:
         logger.warning(f"Schedule {schedule_id} is not adequately funded. Skipping.")
         return {"error": "Insufficient funding", "schedule_id": schedule_id}
@@ -90,6 +107,7 @@ def process_schedule_payments(schedule_id):
     }
 
 @shared_task
+@memoized_unit
 def process_receiver_payment(receiver_id):
     """
     Process the next payment for a specific receiver
@@ -109,22 +127,7 @@ def process_receiver_payment(receiver_id):
             "message": "All installments completed"
         }
     
-    # Check if there's already a pending/processing transaction
     next_installment = receiver.next_installment()
-    existing_txn = MobileTransaction.objects.filter(
-        receiver=receiver,
-        installment_number=next_installment,
-        status__in=['pending', 'processing']
-    ).first()
-    
-    if existing_txn:
-        logger.info(f"Receiver {receiver.name} already has a pending transaction for installment {next_installment}")
-        return {
-            "receiver_id": receiver_id,
-            "status": "skipped",
-            "message": f"Installment {next_installment} already pending",
-            "transaction_id": existing_txn.id
-        }
     
     # Determine if payment is due based on frequency
     if not is_payment_due(receiver):
@@ -174,18 +177,34 @@ def initiate_automated_payment(receiver, installment_number):
     try:
         with transaction.atomic():
             # Create transaction record
-            amount = receiver.amount_per_installment
-            amount_cents = int(float(amount) * 100)
+            installment = receiver.installment_money
+            amount = installment.amount
+            amount_cents = installment.minor  # Bitnob expects cents
             
-            txn = MobileTransaction.objects.create(
-                receiver=receiver,
-                amount=amount,
-                installment_number=installment_number,
-                status="pending",
-                sent_at=timezone.now()
-            )
+            # Optimistic insert: the one_inflight_txn_per_receiver constraint (and the
+            # receiver/installment uniqueness) reject a second in-flight transaction
+            try:
+                with transaction.atomic():
+                    txn = MobileTransaction.objects.create(
+                        receiver=receiver,
+                        amount=amount,
+                        currency=installment.currency,
+                        installment_number=installment_number,
+                        status="pending",
+                        sent_at=timezone.now()
+                    )
+            except IntegrityError:
+                logger.info(f"Receiver {receiver.name} already has a transaction in flight for installment {installment_number}")
+                return {
+                    "receiver_id": receiver.id,
+                    "status": "skipped",
+                    "message": f"Installment {installment_number} already pending",
+                    "timestamp": timezone.now().isoformat()
+                }
             
             logger.info(f"Created transaction {txn.id} for receiver {receiver.name}, installment {installment_number}")
+            # Runs when the outer block commits, after the outcome below is saved
+            invalidate_schedule(receiver.payment_schedule_id, receiver.customer_id)
             
             # Request invoice from Bitnob
             try:
@@ -252,3 +271,64 @@ def initiate_automated_payment(receiver, installment_number):
             "error": str(e),
             "timestamp": timezone.now().isoformat()
         }
+
+
+@shared_task
+def archive_finished_schedules_task():
+    """
+    Periodically move completed/cancelled schedules past the retention window
+    into the archive tables so the hot tables stay bounded
+    """
+    result = archive_finished_schedules()
+    logger.info(f"Schedule archiving complete: {result}")
+    return result
+
+
+@shared_task
+def refresh_schedule_status_snapshots():
+    """
+    Recompute the dashboard snapshots of schedules that changed since their
+    last refresh (and create snapshots for new active schedules)
+    """
+    refreshed = refresh_status_snapshots()
+    logger.info(f"Refreshed {refreshed} schedule status snapshots")
+    return {"refreshed": refreshed, "timestamp": timezone.now().isoformat()}
+
+
+@shared_task
+def drain_webhook_inbox():
+    """
+    Apply the Bitnob webhooks queued by /api/webhook/ in batches
+    """
+    outcomes = drain_inbox()
+    if outcomes:
+        logger.info(f"Webhook inbox drained: {outcomes}")
+    return outcomes
+
+
+@shared_task
+def prune_webhook_inbox():
+    """
+    Delete applied webhook inbox entries past the retention window
+    """
+    deleted = prune_inbox()
+    logger.info(f"Pruned {deleted} webhook inbox entries")
+    return {"deleted": deleted, "timestamp": timezone.now().isoformat()}
+
+
+@shared_task
+def reconcile_stuck_transactions():
+    """
+    Check transactions stuck in pending/processing with Bitnob and apply
+    the outcome of those that settled without us hearing about it
+    """
+    return reconcile_stuck()
+
+
+@shared_task
+def expire_stale_fund_transactions():
+    """
+    Expire USDT deposit quotes left pending past the quote lifetime so they
+    stop blocking new deposits for their schedule
+    """
+    return expire_stale_quotes()
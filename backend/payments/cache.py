@@ -0,0 +1,149 @@
+# cache.py
+"""
+Read-through cache for rendered API payloads.
+
+Entries are keyed by a scope (detail, funding-status, ...), the owning
+schedule or customer, that owner's *generation* and a digest of the query
+params. Invalidating a schedule or customer bumps its generation, so every
+entry built under the old one is unreachable at once and simply ages out;
+nothing has to enumerate keys. The webhook handlers, payouts and PATCH call
+``invalidate_schedule``; ``PAYMENT_CACHE_TIMEOUT`` bounds staleness for
+writes that bypass them (e.g. the admin).
+
+The cache is an optimisation only: if the backend is unreachable every
+lookup is a miss and the views render from the database as before.
+Hit/miss counters per scope are served by /api/cache-stats/.
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "payments"
+CACHED_SCOPES = ("detail", "funding-status", "receiver-progress", "schedule-list")
+
+
+def _generation_key(kind, owner_id):
+    return f"{KEY_PREFIX}:gen:{kind}:{owner_id}"
+
+
+def _generation(kind, owner_id):
+    key = _generation_key(kind, owner_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the clock, not 0, so an evicted counter never revives old entries
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump_generation(kind, owner_id):
+    if owner_id is None:
+        return
+    try:
+        cache.incr(_generation_key(kind, owner_id))
+    except ValueError:
+        # Never read yet, so nothing is cached under it
+        pass
+    except Exception:
+        logger.exception("Could not invalidate cached %s %s", kind, owner_id)
+
+
+def _params_digest(query_params):
+    query_params = query_params or {}
+    params = sorted(query_params.lists() if hasattr(query_params, 'lists') else query_params.items())
+    return hashlib.sha1(repr(params).encode()).hexdigest()[:16]
+
+
+def _cache_key(scope, kind, owner_id, query_params, discriminator):
+    try:
+        generation = _generation(kind, owner_id)
+    except Exception:
+        logger.exception("Response cache unavailable")
+        return None
+    return f"{KEY_PREFIX}:resp:{scope}:{kind}:{owner_id}:{generation}:{discriminator}:{_params_digest(query_params)}"
+
+
+def schedule_cache_key(scope, schedule_id, query_params=None, discriminator=""):
+    """Key for a payload owned by a schedule, or None if the cache is unavailable"""
+    return _cache_key(scope, "schedule", schedule_id, query_params, discriminator)
+
+
+def customer_cache_key(scope, customer_id, query_params=None, discriminator=""):
+    """Key for a payload owned by a customer, or None if the cache is unavailable"""
+    return _cache_key(scope, "customer", customer_id, query_params, discriminator)
+
+
+def _count(scope, outcome):
+    key = f"{KEY_PREFIX}:stats:{scope}:{outcome}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_cached_payload(key, scope):
+    """The cached payload for ``key`` or None, counting the hit or miss"""
+    if key is None:
+        return None
+    try:
+        payload = cache.get(key)
+        _count(scope, "hit" if payload is not None else "miss")
+    except Exception:
+        logger.exception("Response cache unavailable")
+        return None
+    return payload
+
+
+def set_cached_payload(key, payload):
+    if key is None:
+        return
+    try:
+        cache.set(key, payload, settings.PAYMENT_CACHE_TIMEOUT)
+    except Exception:
+        logger.exception("Response cache unavailable")
+
+
+def invalidate_schedule(schedule_id, customer_id=None):
+    """
+    Drop every cached payload of a schedule (and of its customer's listings).
+    Inside a transaction this happens on commit, so a reader cannot re-cache
+    the pre-commit state.
+    """
+    def bump():
+        _bump_generation("schedule", schedule_id)
+        _bump_generation("customer", customer_id)
+    transaction.on_commit(bump)
+
+
+def invalidate_customer(customer_id):
+    transaction.on_commit(lambda: _bump_generation("customer", customer_id))
+
+
+def _stats_keys():
+    return [f"{KEY_PREFIX}:stats:{scope}:{outcome}" for scope in CACHED_SCOPES for outcome in ("hit", "miss")]
+
+
+def cache_stats():
+    counts = cache.get_many(_stats_keys())
+    stats = {}
+    for scope in CACHED_SCOPES:
+        hits = counts.get(f"{KEY_PREFIX}:stats:{scope}:hit", 0)
+        misses = counts.get(f"{KEY_PREFIX}:stats:{scope}:miss", 0)
+        total = hits + misses
+        stats[scope] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total * 100, 2) if total else None,
+        }
+    return stats
+
+
+def reset_cache_stats():
+    cache.delete_many(_stats_keys())
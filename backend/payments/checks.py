@@ -0,0 +1,16 @@
+# checks.py
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def events_backend_check(app_configs, **kwargs):
+    """The memory events backend cannot carry events published by the Celery webhook drain"""
+    if settings.PAYMENT_EVENTS_BACKEND == "memory" and not settings.WEBHOOK_PROCESS_INLINE:
+        return [Error(
+            'PAYMENT_EVENTS_BACKEND = "memory" only reaches streams in the publishing process, '
+            'but webhooks are applied by the Celery inbox drain (WEBHOOK_PROCESS_INLINE = False).',
+            hint='Use PAYMENT_EVENTS_BACKEND = "redis", or set WEBHOOK_PROCESS_INLINE = True for local development.',
+            id='payments.E001',
+        )]
+    return []
@@ -0,0 +1,55 @@
+# conditional.py
+"""
+Conditional GET for schedule-scoped endpoints.
+
+Every change under a schedule bumps ``PaymentSchedule.version``, so
+(schedule id, version, endpoint, query params) identifies a response body.
+Views look the version up with one indexed primary-key read, answer a
+matching ``If-None-Match`` with 304 before doing any real work, and stamp the
+ETag on full responses.
+"""
+import hashlib
+
+from rest_framework.response import Response
+from rest_framework import status
+
+from .models import PaymentSchedule
+
+
+def schedule_version(schedule_id):
+    """Current version of a schedule, or None if it is not in the hot tables"""
+    return PaymentSchedule.objects.filter(pk=schedule_id).values_list('version', flat=True).first()
+
+
+def schedule_etag(schedule_id, version, scope, query_params=None):
+    """Weak ETag: the body is semantically, not byte-for-byte, stable for a version"""
+    query_params = query_params or {}
+    params = sorted(query_params.lists() if hasattr(query_params, 'lists') else query_params.items())
+    digest = hashlib.sha1(f"{scope}|{params}".encode()).hexdigest()[:12]
+    return f'W/"{schedule_id}-{version}-{digest}"'
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: the W/ prefix is ignored on both sides
+    opaque = etag.removeprefix("W/")
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return opaque in candidates
+
+
+def not_modified_response(request, etag):
+    """A 304 carrying the ETag if the client already holds this version, else None"""
+    if _etag_matches(request.headers.get("If-None-Match"), etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response["ETag"] = etag
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    if etag is not None:
+        response["ETag"] = etag
+    return response
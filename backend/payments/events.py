@@ -0,0 +1,235 @@
+# events.py
+"""
+Publish/subscribe for payment status changes, consumed by the SSE streams.
+
+Publishers (the webhook handlers) call ``publish()`` synchronously and the
+event is delivered once the surrounding database transaction commits.
+Subscribers are asyncio queues registered per channel (``schedule:<id>`` and
+``customer:<id>``) in a per-process registry, so an idle stream costs one
+small queue and no polling.
+
+With the default ``PAYMENT_EVENTS_BACKEND = "redis"`` events travel
+through Redis pub/sub so that a stream served by one worker (or the Celery
+drain that applies webhooks) reaches streams served by another; each process
+runs a single listener thread that fans messages out to its local queues.
+The ``"memory"`` backend only reaches streams in the publishing process,
+which is enough for a single-process dev server that applies webhooks inline
+(WEBHOOK_PROCESS_INLINE); the payments.E001 check refuses it otherwise.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+REDIS_CHANNEL_PREFIX = "mpola:events:"
+
+
+def schedule_channel(schedule_id):
+    return f"schedule:{schedule_id}"
+
+
+def customer_channel(customer_id):
+    return f"customer:{customer_id}"
+
+
+class Subscription:
+    """One stream's queue. Lives on the event loop that created it."""
+
+    def __init__(self, channels, maxsize):
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, payload):
+        # Called on self.loop. A slow client loses its oldest events rather than
+        # growing the queue without bound; it resyncs from the REST endpoints.
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(payload)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+_redis_listener = None
+_redis_listener_lock = threading.Lock()
+
+
+def subscribe(channels):
+    """Register a queue for ``channels``; must be called from a running event loop"""
+    subscription = Subscription(channels, settings.PAYMENT_EVENTS_QUEUE_SIZE)
+    with _subscribers_lock:
+        for channel in subscription.channels:
+            _subscribers.setdefault(channel, set()).add(subscription)
+    if settings.PAYMENT_EVENTS_BACKEND == "redis":
+        _ensure_redis_listener()
+    return subscription
+
+
+def unsubscribe(subscription):
+    with _subscribers_lock:
+        for channel in subscription.channels:
+            channel_subscribers = _subscribers.get(channel)
+            if channel_subscribers is None:
+                continue
+            channel_subscribers.discard(subscription)
+            if not channel_subscribers:
+                del _subscribers[channel]
+
+
+def subscriber_count():
+    with _subscribers_lock:
+        return len({subscription for subs in _subscribers.values() for subscription in subs})
+
+
+def _dispatch_local(channel, payload):
+    """Hand a payload to every local subscriber of ``channel`` (thread-safe)"""
+    with _subscribers_lock:
+        targets = list(_subscribers.get(channel, ()))
+    for subscription in targets:
+        try:
+            subscription.loop.call_soon_threadsafe(subscription.offer, payload)
+        except RuntimeError:
+            # The stream's loop has closed; its finally block will unsubscribe it
+            pass
+
+
+@lru_cache(maxsize=1)
+def _redis_client():
+    # One pooled client per process; imported lazily so the memory backend needs no Redis
+    import redis
+    return redis.Redis.from_url(settings.PAYMENT_EVENTS_REDIS_URL)
+
+
+def _redis_listen_forever():
+    while True:
+        try:
+            pubsub = _redis_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(f"{REDIS_CHANNEL_PREFIX}*")
+            for message in pubsub.listen():
+                channel = message["channel"].decode().removeprefix(REDIS_CHANNEL_PREFIX)
+                _dispatch_local(channel, json.loads(message["data"]))
+        except Exception:
+            logger.exception("Payment event listener lost its Redis connection; retrying")
+            time.sleep(1)
+
+
+def _ensure_redis_listener():
+    global _redis_listener
+    with _redis_listener_lock:
+        if _redis_listener is None or not _redis_listener.is_alive():
+            _redis_listener = threading.Thread(
+                target=_redis_listen_forever, name="payment-events-listener", daemon=True
+            )
+            _redis_listener.start()
+
+
+def _deliver(channels, payload):
+    try:
+        if settings.PAYMENT_EVENTS_BACKEND == "redis":
+            client = _redis_client()
+            message = json.dumps(payload, cls=DjangoJSONEncoder)
+            for channel in channels:
+                client.publish(f"{REDIS_CHANNEL_PREFIX}{channel}", message)
+        else:
+            # Round-trip through JSON so both backends deliver the same plain data
+            payload = json.loads(json.dumps(payload, cls=DjangoJSONEncoder))
+            for channel in channels:
+                _dispatch_local(channel, payload)
+    except Exception:
+        # Streams are best-effort; never fail the webhook that produced the change
+        logger.exception("Failed to publish payment event %s", payload.get("type"))
+
+
+def publish(event_type, data, schedule_id=None, customer_id=None):
+    """Queue an event for the schedule's and customer's streams, sent on commit"""
+    channels = []
+    if schedule_id is not None:
+        channels.append(schedule_channel(schedule_id))
+    if customer_id is not None:
+        channels.append(customer_channel(customer_id))
+    if not channels:
+        return
+    payload = {"type": event_type, "data": data}
+    transaction.on_commit(lambda: _deliver(channels, payload))
+
+
+def publish_transaction_status(txn, old_status):
+    receiver = txn.receiver
+    publish(
+        "transaction.status",
+        {
+            "transaction_id": txn.id,
+            "receiver_id": receiver.id,
+            "schedule_id": receiver.payment_schedule_id,
+            "installment_number": txn.installment_number,
+            "amount": str(txn.amount),
+            "old_status": old_status,
+            "status": txn.status,
+            "completed_at": txn.completed_at,
+        },
+        schedule_id=receiver.payment_schedule_id,
+        customer_id=receiver.customer_id,
+    )
+
+
+def publish_funding_status(fund_txn, old_status):
+    if fund_txn.schedule_id is None:
+        publish_wallet_deposit_status(fund_txn, old_status)
+        return
+    schedule = fund_txn.schedule
+    publish(
+        "funding.status",
+        {
+            "fund_transaction_id": fund_txn.id,
+            "schedule_id": schedule.id,
+            "amount": str(fund_txn.amount),
+            "currency": fund_txn.currency,
+            "old_status": old_status,
+            "status": fund_txn.status,
+            "schedule_is_funded": schedule.is_funded,
+        },
+        schedule_id=schedule.id,
+        customer_id=schedule.customer_id,
+    )
+
+
+def publish_wallet_deposit_status(fund_txn, old_status):
+    wallet = fund_txn.wallet
+    publish(
+        "wallet.deposit",
+        {
+            "fund_transaction_id": fund_txn.id,
+            "wallet_id": wallet.id,
+            "amount": str(fund_txn.amount),
+            "currency": fund_txn.currency,
+            "old_status": old_status,
+            "status": fund_txn.status,
+        },
+        customer_id=wallet.customer_id,
+    )
+
+
+def publish_wallet_allocation(schedule_id, customer_id, amount, schedule_is_funded):
+    publish(
+        "wallet.allocation",
+        {
+            "schedule_id": schedule_id,
+            "amount": str(amount),
+            "schedule_is_funded": schedule_is_funded,
+        },
+        schedule_id=schedule_id,
+        customer_id=customer_id,
+    )
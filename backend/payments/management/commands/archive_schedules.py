@@ -0,0 +1,53 @@
+# management/commands/archive_schedules.py
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from payments.services.archive import archive_finished_schedules
+
+class Command(BaseCommand):
+    help = 'Move completed/cancelled payment schedules older than the retention window into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            help='Only archive schedules not updated for this many days (default: ARCHIVE_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Number of schedules moved per database transaction (default: ARCHIVE_CHUNK_SIZE)',
+        )
+        parser.add_argument(
+            '--max-chunks',
+            type=int,
+            help='Stop after this many chunks',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many schedules are eligible',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(f'Starting schedule archiving at {timezone.now()}')
+        )
+
+        result = archive_finished_schedules(
+            retention_days=options['retention_days'],
+            chunk_size=options['chunk_size'],
+            max_chunks=options['max_chunks'],
+            dry_run=options['dry_run'],
+        )
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(f'DRY RUN MODE - {result["schedules_eligible"]} schedules eligible for archiving')
+            )
+            return
+
+        for name, count in result["archived"].items():
+            self.stdout.write(f'  {name}: {count}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Archived {result["chunks"]} chunk(s)')
+        )
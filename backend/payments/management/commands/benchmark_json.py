@@ -0,0 +1,104 @@
+# management/commands/benchmark_json.py
+import io
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from payments.models import PaymentSchedule
+from payments.renderers import ORJSONRenderer, ORJSONParser, orjson
+from payments.views import PaymentScheduleDetailView
+
+class Command(BaseCommand):
+    help = 'Compare the stock DRF JSON renderer/parser with the orjson ones on real schedule-detail payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schedule-id',
+            action='append',
+            help='Benchmark this schedule (repeatable); default: the largest schedules by receiver count',
+        )
+        parser.add_argument(
+            '--schedules',
+            type=int,
+            default=5,
+            help='How many of the largest schedules to use when no --schedule-id is given',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Renders/parses per payload and implementation',
+        )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson is not installed; ORJSONRenderer would just call the stock renderer')
+
+        schedule_ids = options['schedule_id'] or list(
+            PaymentSchedule.objects.annotate(receiver_count=Count('receivers'))
+            .order_by('-receiver_count').values_list('id', flat=True)[:options['schedules']]
+        )
+        if not schedule_ids:
+            raise CommandError('No payment schedules to benchmark')
+
+        payloads = [self.detail_payload(schedule_id) for schedule_id in schedule_ids]
+        iterations = options['iterations']
+
+        self.stdout.write(f'{len(payloads)} schedule-detail payload(s), {iterations} iterations each\n')
+        self.stdout.write(f'{"schedule":<38}{"bytes":>9}{"render stock":>14}{"render orjson":>15}{"x":>7}'
+                          f'{"parse stock":>13}{"parse orjson":>14}{"x":>7}')
+
+        totals = {"render_stock": 0.0, "render_fast": 0.0, "parse_stock": 0.0, "parse_fast": 0.0}
+        for schedule_id, data in payloads:
+            stock_body = JSONRenderer().render(data)
+            fast_body = ORJSONRenderer().render(data)
+            if json.loads(stock_body) != json.loads(fast_body):
+                raise CommandError(f'Renderers disagree on schedule {schedule_id}')
+
+            timings = {
+                "render_stock": self.time_per_call(lambda: JSONRenderer().render(data), iterations),
+                "render_fast": self.time_per_call(lambda: ORJSONRenderer().render(data), iterations),
+                "parse_stock": self.time_per_call(lambda: JSONParser().parse(io.BytesIO(stock_body)), iterations),
+                "parse_fast": self.time_per_call(lambda: ORJSONParser().parse(io.BytesIO(stock_body)), iterations),
+            }
+            for key, value in timings.items():
+                totals[key] += value
+
+            self.stdout.write(
+                f'{str(schedule_id):<38}{len(stock_body):>9}'
+                f'{timings["render_stock"]:>12.3f}ms{timings["render_fast"]:>13.3f}ms'
+                f'{timings["render_stock"] / timings["render_fast"]:>6.1f}x'
+                f'{timings["parse_stock"]:>11.3f}ms{timings["parse_fast"]:>12.3f}ms'
+                f'{timings["parse_stock"] / timings["parse_fast"]:>6.1f}x'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\nOverall: render {totals["render_stock"] / totals["render_fast"]:.1f}x faster, '
+            f'parse {totals["parse_stock"] / totals["parse_fast"]:.1f}x faster with orjson'
+        ))
+
+    def detail_payload(self, schedule_id):
+        """The data the detail endpoint would render, receivers and transactions included"""
+        request = APIRequestFactory().get(
+            f'/api/payment-schedules/{schedule_id}/',
+            {'receivers_page_size': settings.SCHEDULE_DETAIL_MAX_RECEIVERS_PAGE_SIZE}
+        )
+        response = PaymentScheduleDetailView.as_view()(request, schedule_id=schedule_id)
+        if response.status_code != 200:
+            raise CommandError(f'Schedule {schedule_id}: detail returned {response.status_code}')
+        return schedule_id, response.data
+
+    @staticmethod
+    def time_per_call(func, iterations):
+        """Mean milliseconds per call"""
+        func()  # warm up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - start) * 1000 / iterations
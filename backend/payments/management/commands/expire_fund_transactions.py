@@ -0,0 +1,31 @@
+# management/commands/expire_fund_transactions.py
+from django.core.management.base import BaseCommand
+from datetime import timedelta
+from payments.services.expiry import expire_stale_fund_transactions
+
+class Command(BaseCommand):
+    help = 'Expire USDT deposit quotes still pending past the quote lifetime'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lifetime-minutes',
+            type=int,
+            help='Quote lifetime (default: FUND_QUOTE_LIFETIME_MINUTES)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Rows expired per statement (default: FUND_EXPIRY_BATCH_SIZE)',
+        )
+
+    def handle(self, *args, **options):
+        lifetime = options['lifetime_minutes']
+        summary = expire_stale_fund_transactions(
+            lifetime=timedelta(minutes=lifetime) if lifetime is not None else None,
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Expired {summary['expired']} stale fund transactions across {summary['schedules']} schedules"
+            )
+        )
@@ -0,0 +1,46 @@
+# management/commands/export_transactions.py
+from django.core.management.base import BaseCommand, CommandError
+from payments.services.export import export_queryset, iter_export_lines, ExportError, EXPORT_KINDS, EXPORT_FORMATS
+
+class Command(BaseCommand):
+    help = 'Stream mobile or fund transactions as CSV or NDJSON (constant memory, any row count)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=list(EXPORT_KINDS), default='mobile', help='Which transactions to export')
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv', help='Output format')
+        parser.add_argument('--customer-id', type=int, help='Only this customer')
+        parser.add_argument('--customer-email', help='Only this customer (by email)')
+        parser.add_argument('--schedule-id', help='Only this payment schedule')
+        parser.add_argument('--status', help='Comma separated statuses, e.g. success,failed')
+        parser.add_argument('--from', dest='date_from', help='created_at lower bound (ISO date or datetime)')
+        parser.add_argument('--to', dest='date_to', help='created_at upper bound (ISO date or datetime, inclusive)')
+        parser.add_argument('--chunk-size', type=int, help='Rows per database round trip (default: EXPORT_CHUNK_SIZE)')
+        parser.add_argument('--output', '-o', help='Write to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            queryset = export_queryset(
+                options['kind'],
+                customer_id=options['customer_id'],
+                customer_email=options['customer_email'],
+                schedule_id=options['schedule_id'],
+                status=options['status'],
+                date_from=options['date_from'],
+                date_to=options['date_to'],
+            )
+            lines = iter_export_lines(queryset, options['kind'], options['format'], options['chunk_size'])
+
+            if options['output']:
+                rows = 0
+                with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                    for line in lines:
+                        output.write(line)
+                        rows += 1
+                if options['format'] == 'csv':
+                    rows -= 1  # header
+                self.stderr.write(self.style.SUCCESS(f'Exported {rows} row(s) to {options["output"]}'))
+            else:
+                for line in lines:
+                    self.stdout.write(line, ending='')
+        except ExportError as e:
+            raise CommandError(str(e))
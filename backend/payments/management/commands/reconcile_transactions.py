@@ -0,0 +1,41 @@
+# management/commands/reconcile_transactions.py
+from django.core.management.base import BaseCommand
+from datetime import timedelta
+from payments.services.reconcile import reconcile_stuck_transactions
+
+class Command(BaseCommand):
+    help = 'Check transactions stuck in pending/processing with Bitnob and apply settled outcomes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Transactions to check (default: RECONCILE_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Concurrent status requests (default: RECONCILE_WORKERS)',
+        )
+        parser.add_argument(
+            '--stuck-after-minutes',
+            type=int,
+            help='Minimum time in flight (default: RECONCILE_STUCK_AFTER_MINUTES)',
+        )
+
+    def handle(self, *args, **options):
+        stuck_after = options['stuck_after_minutes']
+        summary = reconcile_stuck_transactions(
+            limit=options['limit'],
+            workers=options['workers'],
+            stuck_after=timedelta(minutes=stuck_after) if stuck_after is not None else None,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {summary['checked']} stuck transactions in {summary['duration_seconds']}s: "
+                f"{summary['repaired']} repaired, {summary['still_in_flight']} still in flight, "
+                f"{summary['not_found']} not found at Bitnob, {summary['errors']} status requests failed, "
+                f"{summary['unchanged']} unchanged; "
+                f"released {summary['released']} claims without a reference"
+            )
+        )
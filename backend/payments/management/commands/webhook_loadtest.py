@@ -0,0 +1,225 @@
+# management/commands/webhook_loadtest.py
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from payments import webhooks
+from payments.models import MobileTransaction, FundTransaction, WebhookInbox
+
+# Share of generated events per outcome; mirrors what Bitnob sends us
+MOBILE_EVENT_WEIGHTS = {
+    "mobilepayment.settlement.success": 85,
+    "mobilepayment.settlement.failed": 10,
+    "mobilepayment.settlement.pending": 5,
+}
+FUND_EVENT_WEIGHTS = {
+    "stablecoin.deposit.confirmed": 90,
+    "stablecoin.deposit.expired": 7,
+    "stablecoin.deposit.failed": 3,
+}
+
+
+class QueryCounter:
+    """connection.execute_wrapper counting statements across threads"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate or replay a stream of mobilepayment.* / stablecoin.* webhooks against /api/webhook/ '
+        'or the inbox processor and report throughput, latency percentiles and queries per event. '
+        'Generated events target real in-flight transactions, so only run it against a test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['http', 'inbox'], default='inbox',
+                            help='http: POST to --url; inbox: enqueue in-process, then drain the inbox')
+        parser.add_argument('--url', default='http://localhost:8000/api/webhook/',
+                            help='Webhook endpoint for --mode http')
+        parser.add_argument('--events', type=int, default=1000, help='Number of events to send')
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Target events per second (0 = as fast as possible). With a rate, latency is '
+                                 'measured from each event\'s scheduled send time, so falling behind shows up')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent senders')
+        parser.add_argument('--fund-share', type=float, default=0.1, help='Fraction of generated events that are stablecoin.*')
+        parser.add_argument('--duplicates', type=float, default=0.0,
+                            help='Fraction of events that redeliver an earlier one verbatim')
+        parser.add_argument('--replay-inbox', action='store_true',
+                            help='Replay the most recent stored inbox payloads instead of generating events')
+        parser.add_argument('--replay-file', help='Replay payloads from an NDJSON file instead of generating events')
+        parser.add_argument('--fresh-ids', action='store_true',
+                            help='Give replayed payloads new event ids so they are processed, not de-duplicated')
+        parser.add_argument('--no-drain', action='store_true', help='--mode inbox: only measure the enqueue side')
+        parser.add_argument('--seed', type=int, help='Random seed for a repeatable stream')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        payloads = self.build_stream(options)
+        if not payloads:
+            raise CommandError('No events to send')
+
+        self.stdout.write(
+            f'Sending {len(payloads)} events ({options["mode"]} mode, concurrency {options["concurrency"]}, '
+            f'rate {options["rate"] or "unlimited"})'
+        )
+        if options['mode'] == 'http':
+            self.run_http(payloads, options)
+        else:
+            self.run_inbox(payloads, options)
+
+    # Event streams
+
+    def build_stream(self, options):
+        count = options['events']
+        if options['replay_file']:
+            with open(options['replay_file']) as f:
+                payloads = [json.loads(line) for line in f if line.strip()][:count]
+        elif options['replay_inbox']:
+            payloads = list(WebhookInbox.objects.order_by('-id').values_list('payload', flat=True)[:count])
+            payloads.reverse()
+        else:
+            payloads = self.generate(count, options['fund_share'])
+            options['fresh_ids'] = False  # generated events already have unique ids
+
+        if options['fresh_ids']:
+            payloads = [{**payload, "id": f"loadtest-{uuid.uuid4()}"} for payload in payloads]
+
+        stream = []
+        for payload in payloads:
+            if stream and self.random.random() < options['duplicates']:
+                stream.append(self.random.choice(stream))
+            else:
+                stream.append(payload)
+        return stream
+
+    def generate(self, count, fund_share):
+        fund_count = int(count * fund_share)
+        mobile_refs = list(
+            MobileTransaction.objects.filter(status__in=MobileTransaction.IN_FLIGHT_STATUSES, reference__isnull=False)
+            .values_list('reference', flat=True)[:count - fund_count]
+        )
+        fund_refs = list(FundTransaction.objects.filter(status='pending').values_list('reference', flat=True)[:fund_count])
+        if len(mobile_refs) + len(fund_refs) < count:
+            self.stdout.write(self.style.WARNING(
+                f'Only {len(mobile_refs) + len(fund_refs)} in-flight transactions; '
+                f'the rest of the events use unknown references and will be retried by the drain'
+            ))
+
+        payloads = []
+        for i in range(count):
+            is_fund = i < fund_count
+            refs, weights = (fund_refs, FUND_EVENT_WEIGHTS) if is_fund else (mobile_refs, MOBILE_EVENT_WEIGHTS)
+            index = i if is_fund else i - fund_count
+            reference = refs[index] if index < len(refs) else f"loadtest-{uuid.uuid4().hex[:16]}"
+            event = self.random.choices(list(weights), weights=list(weights.values()))[0]
+            payloads.append({
+                "id": f"loadtest-{uuid.uuid4()}",
+                "event": event,
+                "reference": reference,
+                "status": event.rsplit(".", 1)[-1],
+                "message": "Load test event",
+            })
+        self.random.shuffle(payloads)
+        return payloads
+
+    # Senders
+
+    def send_all(self, payloads, send, concurrency, rate):
+        """Call ``send(payload)`` for every payload under the rate and concurrency limits"""
+        latencies = []
+        outcomes = Counter()
+        lock = threading.Lock()
+        start = time.perf_counter()
+
+        def run(index, payload):
+            due = start + index / rate if rate else None
+            if due is not None:
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.perf_counter()
+            try:
+                outcome = send(payload)
+            except Exception as e:
+                outcome = f"error: {type(e).__name__}"
+            elapsed = time.perf_counter() - (due if due is not None else sent)
+            with lock:
+                latencies.append(elapsed)
+                outcomes[outcome] += 1
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for index, payload in enumerate(payloads):
+                pool.submit(run, index, payload)
+        return time.perf_counter() - start, sorted(latencies), outcomes
+
+    def run_http(self, payloads, options):
+        sessions = threading.local()
+
+        def send(payload):
+            if not hasattr(sessions, "session"):
+                sessions.session = requests.Session()
+            response = sessions.session.post(options['url'], json=payload, timeout=30)
+            return response.status_code
+
+        duration, latencies, outcomes = self.send_all(payloads, send, options['concurrency'], options['rate'])
+        self.report('HTTP', len(payloads), duration, latencies, outcomes)
+        self.stdout.write('Database queries are made by the server process and are not counted in http mode')
+
+    def run_inbox(self, payloads, options):
+        counter = QueryCounter()
+
+        def send(payload):
+            with connection.execute_wrapper(counter):
+                return "queued" if webhooks.enqueue(payload) else "duplicate"
+
+        duration, latencies, outcomes = self.send_all(payloads, send, options['concurrency'], options['rate'])
+        self.report('Enqueue', len(payloads), duration, latencies, outcomes, counter.count)
+
+        if options['no_drain']:
+            return
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            drained = webhooks.drain_inbox()
+        duration = time.perf_counter() - start
+        processed = sum(drained.values())
+        self.stdout.write(self.style.SUCCESS(f'\nDrain: {processed} entries in {duration:.2f}s'))
+        if processed:
+            self.stdout.write(f'  throughput   {processed / duration:,.0f} events/s')
+            self.stdout.write(f'  queries      {counter.count} ({counter.count / processed:.2f} per event)')
+        self.stdout.write(f'  outcomes     {dict(drained)}')
+
+    def report(self, label, count, duration, latencies, outcomes, queries=None):
+        self.stdout.write(self.style.SUCCESS(f'\n{label}: {count} events in {duration:.2f}s'))
+        self.stdout.write(f'  throughput   {count / duration:,.0f} events/s')
+        self.stdout.write(
+            '  latency      ' + '  '.join(
+                f'p{pct}={percentile(latencies, pct) * 1000:.1f}ms' for pct in (50, 90, 99)
+            ) + f'  max={latencies[-1] * 1000:.1f}ms'
+        )
+        if queries is not None:
+            self.stdout.write(f'  queries      {queries} ({queries / count:.2f} per event)')
+        self.stdout.write(f'  outcomes     {dict(outcomes)}')
@@ -0,0 +1,114 @@
+# memo.py
+"""
+Request/task scoped memoization for expensive model properties.
+
+Inside a ``memo_scope()`` (opened per request by ``MemoScopeMiddleware`` and
+per Celery task by the tasks module) the value of a ``scoped_property`` is
+computed once per model instance key and reused by every instance that
+represents the same row. Outside a scope the properties behave exactly like
+plain ``@property`` and hit the database on every read.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+_memo_store = ContextVar("payments_memo_store", default=None)
+
+
+@contextmanager
+def memo_scope():
+    """Open a unit of work in which scoped properties are memoized.
+
+    Nested scopes share the outermost store so that a task called from a
+    request (e.g. eager Celery execution) sees one consistent cache.
+    """
+    if _memo_store.get() is not None:
+        yield
+        return
+
+    token = _memo_store.set({})
+    try:
+        yield
+    finally:
+        _memo_store.reset(token)
+
+
+def memoized_unit(func):
+    """Decorator running a function (e.g. a Celery task) in its own memo scope"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with memo_scope():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def memo_key(model, pk):
+    return (model._meta.label_lower, pk)
+
+
+def invalidate(model, pk):
+    """Drop every memoized value for one row"""
+    store = _memo_store.get()
+    if store is not None and pk is not None:
+        store.pop(memo_key(model, pk), None)
+
+
+def invalidate_instance(instance):
+    invalidate(type(instance), instance.pk)
+
+
+class scoped_property:
+    """
+    Read-only property whose value is memoized for the current memo scope.
+
+    This is deliberately a non-data descriptor: a queryset annotation with
+    the same name sets the value on the instance and shadows the property,
+    which lets list/detail views precompute these values in bulk.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        store = _memo_store.get()
+        if store is None or instance.pk is None:
+            return self.func(instance)
+
+        values = store.setdefault(memo_key(type(instance), instance.pk), {})
+        if self.name not in values:
+            values[self.name] = self.func(instance)
+        return values[self.name]
+
+
+class MemoScopeMiddleware:
+    """
+    Wrap every request in its own memo scope. Async-capable, so async views
+    (the event streams) are not forced onto a worker thread under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with memo_scope():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with memo_scope():
+            return await self.get_response(request)
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0009_paymentschedule_last_payment_date_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedFundTransaction',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('reference', models.CharField(db_index=True, max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('currency', models.CharField(default='UGX', max_length=10)),
+                ('stablecoin_address', models.CharField(blank=True, max_length=200, null=True)),
+                ('stablecoin_network', models.CharField(blank=True, max_length=20, null=True)),
+                ('usdt_required', models.DecimalField(decimal_places=6, max_digits=20, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('expired', 'Expired'), ('failed', 'Failed')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedMobileReceiver',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('phone', models.CharField(max_length=20)),
+                ('country_code', models.CharField(max_length=5)),
+                ('amount_per_installment', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('number_of_installments', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedMobileTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('installment_number', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('success', 'Success'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('reference', models.CharField(blank=True, db_index=True, max_length=100, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('failure_reason', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['receiver', 'installment_number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPaymentSchedule',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('completed', 'Completed'), ('paused', 'Paused'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('subtotal_amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('processing_fee', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('frequency', models.CharField(max_length=20)),
+                ('next_payment_date', models.DateTimeField(blank=True, null=True)),
+                ('last_payment_date', models.DateTimeField(blank=True, null=True)),
+                ('start_date', models.DateTimeField()),
+                ('end_date', models.DateTimeField(blank=True, null=True)),
+                ('is_funded', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='paymentschedule',
+            index=models.Index(fields=['status', 'updated_at'], name='schedule_status_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedmobilereceiver',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_receivers', to='payments.bitnobcustomer'),
+        ),
+        migrations.AddField(
+            model_name='archivedmobiletransaction',
+            name='receiver',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='payments.archivedmobilereceiver'),
+        ),
+        migrations.AddField(
+            model_name='archivedpaymentschedule',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_payment_schedules', to='payments.bitnobcustomer'),
+        ),
+        migrations.AddField(
+            model_name='archivedmobilereceiver',
+            name='payment_schedule',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receivers', to='payments.archivedpaymentschedule'),
+        ),
+        migrations.AddField(
+            model_name='archivedfundtransaction',
+            name='schedule',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fund_transactions', to='payments.archivedpaymentschedule'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:15
+
+from django.db import migrations, models
+
+
+def fail_duplicate_inflight_transactions(apps, schema_editor):
+    """
+    Before the constraint can be created every receiver may have at most one
+    pending/processing transaction. Keep the latest installment in flight and
+    mark the older ones as failed.
+    """
+    MobileTransaction = apps.get_model('payments', 'MobileTransaction')
+
+    seen_receivers = set()
+    stale_ids = []
+    inflight = MobileTransaction.objects.filter(
+        status__in=['pending', 'processing']
+    ).order_by('receiver_id', '-installment_number').values_list('id', 'receiver_id')
+
+    for txn_id, receiver_id in inflight:
+        if receiver_id in seen_receivers:
+            stale_ids.append(txn_id)
+        seen_receivers.add(receiver_id)
+
+    MobileTransaction.objects.filter(id__in=stale_ids).update(
+        status='failed',
+        failure_reason='Superseded by a later in-flight installment'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0010_archive_tables'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_inflight_transactions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='mobiletransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'processing'])), fields=('receiver',), name='one_inflight_txn_per_receiver'),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:16
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+
+# (model, [(decimal field, minor-unit field), ...])
+MINOR_UNIT_COLUMNS = [
+    ('PaymentSchedule', [('subtotal_amount', 'subtotal_minor'), ('processing_fee', 'processing_fee_minor'), ('total_amount', 'total_minor')]),
+    ('MobileReceiver', [('amount_per_installment', 'amount_per_installment_minor')]),
+    ('MobileTransaction', [('amount', 'amount_minor')]),
+    ('FundTransaction', [('amount', 'amount_minor')]),
+]
+
+
+def to_minor(amount):
+    # Frozen copy of payments.money.to_minor so the migration does not depend on app code
+    if amount is None:
+        return 0
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def populate_minor_units(apps, schema_editor):
+    """Convert the existing DecimalField amounts into integer minor units"""
+    for model_name, columns in MINOR_UNIT_COLUMNS:
+        model = apps.get_model('payments', model_name)
+        decimal_fields = [decimal_field for decimal_field, _ in columns]
+        minor_fields = [minor_field for _, minor_field in columns]
+
+        batch = []
+        for obj in model.objects.only('pk', *decimal_fields).iterator(chunk_size=1000):
+            for decimal_field, minor_field in columns:
+                setattr(obj, minor_field, to_minor(getattr(obj, decimal_field)))
+            batch.append(obj)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, minor_fields)
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, minor_fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0011_one_inflight_txn_per_receiver'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fundtransaction',
+            name='amount_minor',
+            field=models.BigIntegerField(default=0, help_text='amount in minor units (cents)'),
+        ),
+        migrations.AddField(
+            model_name='mobilereceiver',
+            name='amount_per_installment_minor',
+            field=models.BigIntegerField(default=0, help_text='amount_per_installment in minor units (cents)'),
+        ),
+        migrations.AddField(
+            model_name='mobilereceiver',
+            name='currency',
+            field=models.CharField(default='UGX', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='mobiletransaction',
+            name='amount_minor',
+            field=models.BigIntegerField(default=0, help_text='amount in minor units (cents)'),
+        ),
+        migrations.AddField(
+            model_name='mobiletransaction',
+            name='currency',
+            field=models.CharField(default='UGX', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='paymentschedule',
+            name='currency',
+            field=models.CharField(default='UGX', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='paymentschedule',
+            name='processing_fee_minor',
+            field=models.BigIntegerField(default=0, help_text='processing_fee in minor units (cents)'),
+        ),
+        migrations.AddField(
+            model_name='paymentschedule',
+            name='subtotal_minor',
+            field=models.BigIntegerField(default=0, help_text='subtotal_amount in minor units (cents)'),
+        ),
+        migrations.AddField(
+            model_name='paymentschedule',
+            name='total_minor',
+            field=models.BigIntegerField(default=0, help_text='total_amount in minor units (cents)'),
+        ),
+        migrations.RunPython(populate_minor_units, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0012_money_minor_units'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleStatusSnapshot',
+            fields=[
+                ('schedule', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='status_snapshot', serialize=False, to='payments.paymentschedule')),
+                ('total_receivers', models.PositiveIntegerField(default=0)),
+                ('expected_total_transactions', models.PositiveIntegerField(default=0)),
+                ('actual_total_transactions', models.PositiveIntegerField(default=0)),
+                ('pending_transactions', models.PositiveIntegerField(default=0)),
+                ('successful_transactions', models.PositiveIntegerField(default=0)),
+                ('failed_transactions', models.PositiveIntegerField(default=0)),
+                ('total_funded_minor', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
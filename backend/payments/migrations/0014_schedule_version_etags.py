@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0013_schedule_status_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentschedule',
+            name='version',
+            field=models.PositiveBigIntegerField(default=1, help_text='Bumped on any change to the schedule, its receivers or transactions; drives ETags'),
+        ),
+        migrations.AddField(
+            model_name='schedulestatussnapshot',
+            name='schedule_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
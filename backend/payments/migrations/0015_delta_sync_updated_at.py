@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:31
+
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    """created_at is the best known last-change time for existing rows"""
+    for model_name in ('MobileReceiver', 'MobileTransaction'):
+        model = apps.get_model('payments', model_name)
+        model.objects.filter(created_at__isnull=False).update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0014_schedule_version_etags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mobilereceiver',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='mobiletransaction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='fundtransaction',
+            index=models.Index(fields=['updated_at', 'id'], name='fundtxn_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mobilereceiver',
+            index=models.Index(fields=['updated_at', 'id'], name='receiver_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mobiletransaction',
+            index=models.Index(fields=['updated_at', 'id'], name='txn_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentschedule',
+            index=models.Index(fields=['updated_at', 'id'], name='schedule_updated_id_idx'),
+        ),
+    ]
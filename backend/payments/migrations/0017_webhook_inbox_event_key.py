@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0016_webhook_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookinbox',
+            name='event_key',
+            field=models.CharField(blank=True, max_length=128, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0017_webhook_inbox_event_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mobiletransaction',
+            index=models.Index(fields=['status', 'sent_at'], name='txn_status_sent_idx'),
+        ),
+    ]
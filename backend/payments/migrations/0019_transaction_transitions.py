@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0018_transaction_status_sent_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('mobile', 'Mobile transaction'), ('fund', 'Fund transaction')], max_length=10)),
+                ('transaction_id', models.CharField(max_length=64)),
+                ('schedule_id', models.UUIDField(blank=True, null=True)),
+                ('from_status', models.CharField(blank=True, help_text='Empty for the creation of the transaction', max_length=20)),
+                ('to_status', models.CharField(max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['changed_at'], name='transition_changed_idx'), models.Index(fields=['kind', 'transaction_id', 'changed_at'], name='transition_txn_idx'), models.Index(fields=['kind', 'to_status', 'changed_at'], name='transition_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:46
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_funded_amount(apps, schema_editor):
+    """Start the incremental total from the paid fund transactions"""
+    PaymentSchedule = apps.get_model('payments', 'PaymentSchedule')
+    FundTransaction = apps.get_model('payments', 'FundTransaction')
+    paid_total = (
+        FundTransaction.objects.filter(schedule=OuterRef('pk'), status='paid')
+        .order_by().values('schedule').annotate(total=Sum('amount_minor')).values('total')[:1]
+    )
+    PaymentSchedule.objects.update(funded_amount_minor=Coalesce(Subquery(paid_total), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0019_transaction_transitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentschedule',
+            name='funded_amount_minor',
+            field=models.BigIntegerField(default=0, help_text='Total of paid fund transactions in minor units, maintained incrementally'),
+        ),
+        migrations.RunPython(backfill_funded_amount, migrations.RunPython.noop),
+    ]
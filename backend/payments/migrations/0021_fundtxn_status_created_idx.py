@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0020_schedule_funded_amount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fundtransaction',
+            index=models.Index(fields=['status', 'created_at'], name='fundtxn_status_created_idx'),
+        ),
+    ]
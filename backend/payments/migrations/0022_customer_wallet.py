@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0021_fundtxn_status_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('deposit', 'Deposit'), ('allocation', 'Allocation')], max_length=20)),
+                ('amount_minor', models.BigIntegerField(help_text='Signed change to the wallet balance in minor units (cents)')),
+                ('schedule_id', models.UUIDField(blank=True, help_text='Schedule funded by an allocation', null=True)),
+                ('fund_transaction_id', models.UUIDField(blank=True, help_text='Fund transaction of a deposit', null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='fundtransaction',
+            name='schedule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='fund_transactions', to='payments.paymentschedule'),
+        ),
+        migrations.CreateModel(
+            name='CustomerWallet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance_minor', models.BigIntegerField(default=0, help_text='Unallocated funds in minor units (cents)')),
+                ('currency', models.CharField(default='UGX', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='wallet', to='payments.bitnobcustomer')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fundtransaction',
+            name='wallet',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='fund_transactions', to='payments.customerwallet'),
+        ),
+        migrations.AddConstraint(
+            model_name='fundtransaction',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('schedule__isnull', False), ('wallet__isnull', True)), models.Q(('schedule__isnull', True), ('wallet__isnull', False)), _connector='OR'), name='fundtxn_schedule_or_wallet'),
+        ),
+        migrations.AddField(
+            model_name='walletledgerentry',
+            name='wallet',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='payments.customerwallet'),
+        ),
+        migrations.AddIndex(
+            model_name='walletledgerentry',
+            index=models.Index(fields=['wallet', 'created_at'], name='wallet_ledger_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='walletledgerentry',
+            index=models.Index(fields=['schedule_id'], name='wallet_ledger_schedule_idx'),
+        ),
+    ]
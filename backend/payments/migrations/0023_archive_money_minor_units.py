@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:03
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+
+# (archive model, [(decimal field, minor-unit field), ...]), as 0012 did for the hot tables
+MINOR_UNIT_COLUMNS = [
+    ('ArchivedPaymentSchedule', [('subtotal_amount', 'subtotal_minor'), ('processing_fee', 'processing_fee_minor'), ('total_amount', 'total_minor')]),
+    ('ArchivedMobileReceiver', [('amount_per_installment', 'amount_per_installment_minor')]),
+    ('ArchivedMobileTransaction', [('amount', 'amount_minor')]),
+    ('ArchivedFundTransaction', [('amount', 'amount_minor')]),
+]
+
+
+def to_minor(amount):
+    # Frozen copy of payments.money.to_minor so the migration does not depend on app code
+    if amount is None:
+        return 0
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def populate_minor_units(apps, schema_editor):
+    """Convert the Decimal amounts of already archived rows into integer minor units"""
+    for model_name, columns in MINOR_UNIT_COLUMNS:
+        model = apps.get_model('payments', model_name)
+        decimal_fields = [decimal_field for decimal_field, _ in columns]
+        minor_fields = [minor_field for _, minor_field in columns]
+
+        batch = []
+        for obj in model.objects.only('pk', *decimal_fields).iterator(chunk_size=1000):
+            for decimal_field, minor_field in columns:
+                setattr(obj, minor_field, to_minor(getattr(obj, decimal_field)))
+            batch.append(obj)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, minor_fields)
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, minor_fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0022_customer_wallet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedfundtransaction',
+            name='amount_minor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedmobilereceiver',
+            name='amount_per_installment_minor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedmobilereceiver',
+            name='currency',
+            field=models.CharField(default='UGX', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='archivedmobiletransaction',
+            name='amount_minor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedmobiletransaction',
+            name='currency',
+            field=models.CharField(default='UGX', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='archivedpaymentschedule',
+            name='currency',
+            field=models.CharField(default='UGX', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='archivedpaymentschedule',
+            name='processing_fee_minor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedpaymentschedule',
+            name='subtotal_minor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedpaymentschedule',
+            name='total_minor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_minor_units, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:04
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_funded_amount(apps, schema_editor):
+    """Recount already archived schedules' funded totals, as update_funding_status does"""
+    ArchivedPaymentSchedule = apps.get_model('payments', 'ArchivedPaymentSchedule')
+    ArchivedFundTransaction = apps.get_model('payments', 'ArchivedFundTransaction')
+    WalletLedgerEntry = apps.get_model('payments', 'WalletLedgerEntry')
+    paid_total = (
+        ArchivedFundTransaction.objects.filter(schedule=OuterRef('pk'), status='paid')
+        .order_by().values('schedule').annotate(total=Sum('amount_minor')).values('total')[:1]
+    )
+    # Allocations are debits to the wallet, so they are stored negative
+    allocated_total = (
+        WalletLedgerEntry.objects.filter(schedule_id=OuterRef('pk'), kind='allocation')
+        .order_by().values('schedule_id').annotate(total=Sum('amount_minor')).values('total')[:1]
+    )
+    ArchivedPaymentSchedule.objects.update(
+        funded_amount_minor=Coalesce(Subquery(paid_total), Value(0)) - Coalesce(Subquery(allocated_total), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0023_archive_money_minor_units'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedpaymentschedule',
+            name='funded_amount_minor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_funded_amount, migrations.RunPython.noop),
+    ]
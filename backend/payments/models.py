@@ -1,8 +1,11 @@
 # models.py
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
 import uuid
+from .memo import scoped_property, invalidate, invalidate_instance
+from .money import Money, DEFAULT_CURRENCY, to_minor
 
 class BitnobCustomer(models.Model):
     email = models.EmailField()
@@ -36,22 +39,37 @@ class PaymentSchedule(models.Model):
     subtotal_amount = models.DecimalField(max_digits=15, decimal_places=2, help_text="Subtotal amount across all receivers and installments (before processing fee)")
     processing_fee = models.DecimalField(max_digits=15, decimal_places=2, default=0, help_text="Processing fee (1.5% of subtotal)")
     total_amount = models.DecimalField(max_digits=15, decimal_places=2, help_text="Total amount including processing fee")
+    currency = models.CharField(max_length=10, default=DEFAULT_CURRENCY)
+    subtotal_minor = models.BigIntegerField(default=0, help_text="subtotal_amount in minor units (cents)")
+    processing_fee_minor = models.BigIntegerField(default=0, help_text="processing_fee in minor units (cents)")
+    total_minor = models.BigIntegerField(default=0, help_text="total_amount in minor units (cents)")
     frequency = models.CharField(max_length=20, default='monthly', help_text="Payment frequency (e.g., test_2min, weekly, monthly)")
     next_payment_date = models.DateTimeField(null=True, blank=True, help_text="When the next payment should be processed")
     last_payment_date = models.DateTimeField(null=True, blank=True, help_text="When the last payment was processed")
     start_date = models.DateTimeField(default=timezone.now)
     end_date = models.DateTimeField(null=True, blank=True, help_text="Expected completion date")
     is_funded = models.BooleanField(default=False, help_text="Whether this schedule has been adequately funded")
+    funded_amount_minor = models.BigIntegerField(default=0, help_text="Total of paid fund transactions in minor units, maintained incrementally")
+    version = models.PositiveBigIntegerField(default=1, help_text="Bumped on any change to the schedule, its receivers or transactions; drives ETags")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Used by the archive pipeline to find finished plans past retention
+            models.Index(fields=['status', 'updated_at'], name='schedule_status_updated_idx'),
+            # Delta sync: keyset scan on (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='schedule_updated_id_idx'),
+        ]
+
+    # Only written by save() when named in update_fields
+    SQL_MAINTAINED_FIELDS = ('funded_amount_minor', 'is_funded')
 
     def __str__(self):
         return f"{self.title} - {self.customer.email}"
 
-    @property
+    @scoped_property
     def total_receivers(self):
         return self.receivers.count()
 
@@ -62,11 +80,11 @@ class PaymentSchedule(models.Model):
             return round((self.processing_fee / self.subtotal_amount) * 100, 2)
         return 0
 
-    @property
+    @scoped_property
     def total_transactions(self):
         return MobileTransaction.objects.filter(receiver__payment_schedule=self).count()
 
-    @property
+    @scoped_property
     def completed_transactions(self):
         return MobileTransaction.objects.filter(receiver__payment_schedule=self, status='success').count()
 
@@ -82,48 +100,72 @@ class PaymentSchedule(models.Model):
         """Check if all transactions in this schedule are completed"""
         return self.total_transactions > 0 and self.completed_transactions == self.total_transactions
 
+    @property
+    def total_money(self):
+        return Money(self.total_minor, self.currency)
+
+    @scoped_property
+    def total_funded_minor(self):
+        """Total paid funding for this schedule, in minor units"""
+        return self.funded_amount_minor
+
+    @scoped_property
+    def total_payments_minor(self):
+        """Total of successful payments made from this schedule, in minor units"""
+        from django.db.models import Sum
+        return MobileTransaction.objects.filter(
+            receiver__payment_schedule=self,
+            status='success'
+        ).aggregate(total=Sum('amount_minor'))['total'] or 0
+
+    @property
+    def available_balance_minor(self):
+        return self.total_funded_minor - self.total_payments_minor
+
     @property
     def total_funded_amount(self):
         """Calculate total amount funded for this schedule"""
-        from django.db.models import Sum
-        return self.fund_transactions.filter(status="paid").aggregate(
-            total=Sum('amount')
-        )['total'] or 0
+        return Money(self.total_funded_minor, self.currency).amount
 
     @property
     def total_payments_made(self):
         """Calculate total amount of successful payments made from this schedule"""
-        from django.db.models import Sum
-        return MobileTransaction.objects.filter(
-            receiver__payment_schedule=self,
-            status='success'
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        return Money(self.total_payments_minor, self.currency).amount
 
     @property
     def available_balance(self):
         """Calculate available balance (funded amount minus successful payments)"""
-        return self.total_funded_amount - self.total_payments_made
+        return Money(self.available_balance_minor, self.currency).amount
 
     @property 
     def funding_shortfall(self):
         """Calculate how much more funding is needed"""
-        funded = self.total_funded_amount
-        required = self.total_amount
-        return max(0, required - funded)
+        return Money(max(0, self.total_minor - self.total_funded_minor), self.currency).amount
 
     @property
     def is_adequately_funded(self):
         """Check if schedule has enough funds to proceed"""
-        return self.total_funded_amount >= self.total_amount
+        return self.total_funded_minor >= self.total_minor
 
     def has_sufficient_funds_for_amount(self, amount):
         """Check if there's enough available balance for a specific amount (e.g., one installment)"""
-        return self.available_balance >= amount
+        return self.available_balance_minor >= to_minor(amount)
 
     def update_funding_status(self):
-        """Update the is_funded flag based on actual funding"""
-        self.is_funded = self.is_adequately_funded
-        self.save()
+        """
+        Recount funded_amount_minor from the paid fund transactions and the
+        wallet allocations, and reset is_funded to match. Funding changes
+        keep both up to date incrementally; this is the repair path.
+        """
+        from django.db.models import Sum
+        paid = self.fund_transactions.filter(status="paid").aggregate(total=Sum('amount_minor'))['total'] or 0
+        # Allocations are debits to the wallet, so they are stored negative
+        allocated = WalletLedgerEntry.objects.filter(schedule_id=self.pk, kind="allocation").aggregate(
+            total=Sum('amount_minor')
+        )['total'] or 0
+        self.funded_amount_minor = paid - allocated
+        self.is_funded = self.funded_amount_minor >= self.total_minor
+        self.save(update_fields=['funded_amount_minor', 'is_funded', 'updated_at'])
         return self.is_funded
 
     def get_frequency_timedelta(self):
@@ -168,7 +210,26 @@ class PaymentSchedule(models.Model):
         # Set initial next_payment_date if not set
         if not self.next_payment_date and self.start_date:
             self.next_payment_date = self.calculate_next_payment_date(self.start_date)
+        # Keep the minor-unit columns in step with the decimal ones
+        self.subtotal_minor = to_minor(self.subtotal_amount)
+        self.processing_fee_minor = to_minor(self.processing_fee)
+        self.total_minor = to_minor(self.total_amount)
+        if not self._state.adding:
+            # Increment in SQL so concurrent bumps from child rows are never lost
+            self.version = F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'version'}
+            else:
+                # The funding columns are moved by conditional UPDATEs (apply_funding_changes);
+                # a full save must not write back the copy loaded earlier
+                kwargs['update_fields'] = {
+                    field.name for field in self._meta.concrete_fields if not field.primary_key
+                } - set(self.SQL_MAINTAINED_FIELDS)
         super().save(*args, **kwargs)
+        if not isinstance(self.version, int):
+            # Drop the expression; the new value is reloaded only if someone reads it
+            del self.version
+        invalidate_instance(self)
 
 class MobileReceiver(models.Model):
     payment_schedule = models.ForeignKey(PaymentSchedule, on_delete=models.CASCADE, related_name="receivers", null=True, blank=True)
@@ -177,19 +238,36 @@ class MobileReceiver(models.Model):
     phone = models.CharField(max_length=20)
     country_code = models.CharField(max_length=5)
     amount_per_installment = models.DecimalField(max_digits=12, decimal_places=2)
+    amount_per_installment_minor = models.BigIntegerField(default=0, help_text="amount_per_installment in minor units (cents)")
+    currency = models.CharField(max_length=10, default=DEFAULT_CURRENCY)
     number_of_installments = models.PositiveIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         # Ensure phone numbers are unique within a payment schedule
         unique_together = [('payment_schedule', 'phone')]
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='receiver_updated_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.phone}"
 
+    def save(self, *args, **kwargs):
+        self.amount_per_installment_minor = to_minor(self.amount_per_installment)
+        super().save(*args, **kwargs)
+        invalidate_instance(self)
+        invalidate(PaymentSchedule, self.payment_schedule_id)
+        bump_schedule_version(self.payment_schedule_id)
+
+    @property
+    def installment_money(self):
+        return Money(self.amount_per_installment_minor, self.currency)
+
     @property
     def total_amount(self):
-        return self.amount_per_installment * self.number_of_installments
+        return (self.installment_money * self.number_of_installments).amount
 
     def next_installment(self):
         """Get the next installment number for this receiver"""
@@ -214,16 +292,8 @@ class MobileReceiver(models.Model):
             time_remaining = schedule.next_payment_date - timezone.now()
             return False, f"Next payment not due yet. Wait {time_remaining.total_seconds():.0f} seconds"
         
-        # Check if there's already a pending transaction for the next installment
-        next_installment_num = self.next_installment()
-        existing_txn = self.transactions.filter(
-            installment_number=next_installment_num,
-            status__in=['pending', 'processing']
-        ).first()
-        
-        if existing_txn:
-            return False, f"Installment {next_installment_num} already in progress"
-        
+        # An installment already in flight is rejected by the one_inflight_txn_per_receiver
+        # constraint when the transaction is inserted, so no pre-check query is needed here
         return True, "Ready for next installment"
 
     def get_next_payment_info(self):
@@ -241,7 +311,7 @@ class MobileReceiver(models.Model):
             "time_until_next_payment": (schedule.next_payment_date - timezone.now()).total_seconds() if schedule.next_payment_date else 0
         }
 
-    @property
+    @scoped_property
     def completed_installments(self):
         return self.transactions.filter(status='success').count()
 
@@ -267,6 +337,8 @@ class MobileTransaction(models.Model):
 
     receiver = models.ForeignKey(MobileReceiver, on_delete=models.CASCADE, related_name="transactions")
     amount = models.DecimalField(max_digits=12, decimal_places=2)
+    amount_minor = models.BigIntegerField(default=0, help_text="amount in minor units (cents)")
+    currency = models.CharField(max_length=10, default=DEFAULT_CURRENCY)
     installment_number = models.PositiveIntegerField()
     status = models.CharField(max_length=20, choices=TRANSACTION_STATUS_CHOICES, default="pending")
     reference = models.CharField(max_length=100, unique=True, null=True, blank=True, help_text="Bitnob transaction reference")
@@ -274,14 +346,37 @@ class MobileTransaction(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     failure_reason = models.TextField(blank=True, help_text="Reason for failure if transaction failed")
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    IN_FLIGHT_STATUSES = ['pending', 'processing']
 
     class Meta:
         unique_together = ['receiver', 'installment_number']  # Prevent duplicate installments
         ordering = ['receiver', 'installment_number']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='txn_updated_id_idx'),
+            # Reconciler: in-flight transactions by age
+            models.Index(fields=['status', 'sent_at'], name='txn_status_sent_idx'),
+        ]
+        constraints = [
+            # At most one pending/processing transaction per receiver. Payout code
+            # inserts optimistically and treats IntegrityError as "already in flight".
+            models.UniqueConstraint(
+                fields=['receiver'],
+                condition=models.Q(status__in=['pending', 'processing']),
+                name='one_inflight_txn_per_receiver',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.receiver.name} - Installment {self.installment_number} - {self.status}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def save(self, *args, **kwargs):
         # Auto-set completed_at when status changes to success
         if self.status == 'success' and not self.completed_at:
@@ -289,12 +384,92 @@ class MobileTransaction(models.Model):
         # Set created_at if not set (for existing records)
         if not self.created_at:
             self.created_at = timezone.now()
-        super().save(*args, **kwargs)
+        self.amount_minor = to_minor(self.amount)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            record_status_change(self)
+        # Status changes move the receiver's and schedule's aggregates
+        invalidate(MobileReceiver, self.receiver_id)
+        invalidate(PaymentSchedule, self.payment_schedule_id)
+        bump_schedule_version(self.payment_schedule_id)
+
+    @property
+    def payment_schedule_id(self):
+        """
+        The receiver's schedule id: read from the receiver if it is loaded,
+        otherwise looked up once (without loading the receiver) and kept
+        """
+        if MobileTransaction.receiver.is_cached(self):
+            return self.receiver.payment_schedule_id
+        if '_payment_schedule_id' not in self.__dict__:
+            self._payment_schedule_id = (
+                MobileReceiver.objects.filter(pk=self.receiver_id).values_list('payment_schedule_id', flat=True).first()
+            )
+        return self._payment_schedule_id
+
+    def delete(self, *args, **kwargs):
+        schedule_id = self.payment_schedule_id
+        result = super().delete(*args, **kwargs)
+        invalidate(MobileReceiver, self.receiver_id)
+        invalidate(PaymentSchedule, schedule_id)
+        bump_schedule_version(schedule_id)
+        return result
 # models.py
 
 from django.db import models
 import uuid
 
+class CustomerWallet(models.Model):
+    """
+    Pooled funding balance of one customer. It is topped up by USDT deposits
+    that belong to the wallet instead of a schedule, and drawn down when
+    payouts run by allocating to the customer's unfunded schedules
+    (services/wallet.py). balance_minor only moves through conditional
+    UPDATEs, each recorded in WalletLedgerEntry.
+    """
+    customer = models.OneToOneField(BitnobCustomer, on_delete=models.CASCADE, related_name="wallet")
+    balance_minor = models.BigIntegerField(default=0, help_text="Unallocated funds in minor units (cents)")
+    currency = models.CharField(max_length=10, default=DEFAULT_CURRENCY)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Wallet of {self.customer.email}: {self.balance}"
+
+    @property
+    def balance(self):
+        return Money(self.balance_minor, self.currency).amount
+
+
+class WalletLedgerEntry(models.Model):
+    """
+    Append-only record of every change to a wallet balance, written in the
+    same database transaction as the change: deposits in (positive) and
+    allocations out to a schedule (negative). Ids are stored without
+    foreign keys so the history outlives archiving.
+    """
+    KIND_CHOICES = (
+        ("deposit", "Deposit"),
+        ("allocation", "Allocation"),
+    )
+
+    wallet = models.ForeignKey(CustomerWallet, on_delete=models.CASCADE, related_name="ledger_entries")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount_minor = models.BigIntegerField(help_text="Signed change to the wallet balance in minor units (cents)")
+    schedule_id = models.UUIDField(null=True, blank=True, help_text="Schedule funded by an allocation")
+    fund_transaction_id = models.UUIDField(null=True, blank=True, help_text="Fund transaction of a deposit")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'created_at'], name='wallet_ledger_idx'),
+            models.Index(fields=['schedule_id'], name='wallet_ledger_schedule_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.amount_minor} ({self.wallet_id})"
+
+
 class FundTransaction(models.Model):
     STATUS_CHOICES = (
         ("pending", "Pending"),
@@ -304,10 +479,13 @@ class FundTransaction(models.Model):
     )
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    schedule = models.ForeignKey("PaymentSchedule", on_delete=models.CASCADE, related_name="fund_transactions")
+    schedule = models.ForeignKey("PaymentSchedule", on_delete=models.CASCADE, related_name="fund_transactions", null=True, blank=True)
+    # Set instead of schedule for a top-up of the customer's pooled wallet
+    wallet = models.ForeignKey(CustomerWallet, on_delete=models.CASCADE, related_name="fund_transactions", null=True, blank=True)
     reference = models.CharField(max_length=100, unique=True)
     
     amount = models.DecimalField(max_digits=20, decimal_places=2)  # UGX
+    amount_minor = models.BigIntegerField(default=0, help_text="amount in minor units (cents)")
     currency = models.CharField(max_length=10, default="UGX")
 
     stablecoin_address = models.CharField(max_length=200, blank=True, null=True)
@@ -317,3 +495,323 @@ class FundTransaction(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='fundtxn_updated_id_idx'),
+            # Stale quote sweep: pending rows past the quote lifetime
+            models.Index(fields=['status', 'created_at'], name='fundtxn_status_created_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(schedule__isnull=False, wallet__isnull=True)
+                | models.Q(schedule__isnull=True, wallet__isnull=False),
+                name='fundtxn_schedule_or_wallet',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.amount_minor = to_minor(self.amount)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            record_status_change(self)
+        invalidate(PaymentSchedule, self.schedule_id)
+        bump_schedule_version(self.schedule_id)
+
+
+class ArchivedPaymentSchedule(models.Model):
+    """
+    Cold copy of a completed or cancelled PaymentSchedule moved out of the hot
+    tables by the archive pipeline. Rows keep their original primary keys so
+    existing links (e.g. /api/payment-schedules/<id>/) keep resolving.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    customer = models.ForeignKey(BitnobCustomer, on_delete=models.CASCADE, related_name="archived_payment_schedules")
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=PaymentSchedule.SCHEDULE_STATUS_CHOICES)
+    subtotal_amount = models.DecimalField(max_digits=15, decimal_places=2)
+    processing_fee = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    total_amount = models.DecimalField(max_digits=15, decimal_places=2)
+    currency = models.CharField(max_length=10, default=DEFAULT_CURRENCY)
+    subtotal_minor = models.BigIntegerField(default=0)
+    processing_fee_minor = models.BigIntegerField(default=0)
+    total_minor = models.BigIntegerField(default=0)
+    funded_amount_minor = models.BigIntegerField(default=0)
+    frequency = models.CharField(max_length=20)
+    next_payment_date = models.DateTimeField(null=True, blank=True)
+    last_payment_date = models.DateTimeField(null=True, blank=True)
+    start_date = models.DateTimeField()
+    end_date = models.DateTimeField(null=True, blank=True)
+    is_funded = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"[archived] {self.title}"
+
+
+class ArchivedMobileReceiver(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    payment_schedule = models.ForeignKey(ArchivedPaymentSchedule, on_delete=models.CASCADE, related_name="receivers")
+    customer = models.ForeignKey(BitnobCustomer, on_delete=models.CASCADE, related_name="archived_receivers")
+    name = models.CharField(max_length=100)
+    phone = models.CharField(max_length=20)
+    country_code = models.CharField(max_length=5)
+    amount_per_installment = models.DecimalField(max_digits=12, decimal_places=2)
+    amount_per_installment_minor = models.BigIntegerField(default=0)
+    currency = models.CharField(max_length=10, default=DEFAULT_CURRENCY)
+    number_of_installments = models.PositiveIntegerField()
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"[archived] {self.name} - {self.phone}"
+
+
+class ArchivedMobileTransaction(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    receiver = models.ForeignKey(ArchivedMobileReceiver, on_delete=models.CASCADE, related_name="transactions")
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    amount_minor = models.BigIntegerField(default=0)
+    currency = models.CharField(max_length=10, default=DEFAULT_CURRENCY)
+    installment_number = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=MobileTransaction.TRANSACTION_STATUS_CHOICES)
+    reference = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    failure_reason = models.TextField(blank=True)
+    created_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['receiver', 'installment_number']
+
+
+class ArchivedFundTransaction(models.Model):
+    id = models.UUIDField(primary_key=True, editable=False)
+    schedule = models.ForeignKey(ArchivedPaymentSchedule, on_delete=models.CASCADE, related_name="fund_transactions")
+    reference = models.CharField(max_length=100, db_index=True)
+    amount = models.DecimalField(max_digits=20, decimal_places=2)
+    amount_minor = models.BigIntegerField(default=0)
+    currency = models.CharField(max_length=10, default="UGX")
+    stablecoin_address = models.CharField(max_length=200, blank=True, null=True)
+    stablecoin_network = models.CharField(max_length=20, blank=True, null=True)
+    usdt_required = models.DecimalField(max_digits=20, decimal_places=6, null=True)
+    status = models.CharField(max_length=20, choices=FundTransaction.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+
+class ScheduleStatusSnapshot(models.Model):
+    """
+    Precomputed row of /api/scheduled-payments-status/ for one schedule.
+    A snapshot is stale once the schedule's version has moved past the
+    version it was computed from; the periodic refresh recomputes only those.
+    """
+    schedule = models.OneToOneField(PaymentSchedule, on_delete=models.CASCADE, primary_key=True, related_name="status_snapshot")
+    total_receivers = models.PositiveIntegerField(default=0)
+    expected_total_transactions = models.PositiveIntegerField(default=0)
+    actual_total_transactions = models.PositiveIntegerField(default=0)
+    pending_transactions = models.PositiveIntegerField(default=0)
+    successful_transactions = models.PositiveIntegerField(default=0)
+    failed_transactions = models.PositiveIntegerField(default=0)
+    total_funded_minor = models.BigIntegerField(default=0)
+    schedule_version = models.PositiveBigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Status snapshot for {self.schedule_id}"
+
+
+class WebhookInbox(models.Model):
+    """
+    A Bitnob webhook as received. The webhook view stores it and acknowledges
+    straight away; payments.webhooks.drain_inbox applies it later.
+    """
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("processed", "Processed"),
+        ("ignored", "Ignored"),
+        ("failed", "Failed"),
+    )
+
+    event = models.CharField(max_length=100)
+    reference = models.CharField(max_length=100)
+    # Provider event id, or a hash of reference/event/status; redeliveries collide on it
+    event_key = models.CharField(max_length=128, unique=True, null=True, blank=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Drain scan: only the (small) pending backlog is indexed
+            models.Index(fields=['id'], condition=models.Q(status='pending'), name='webhook_inbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.reference} - {self.status}"
+
+
+class TransactionTransition(models.Model):
+    """
+    Append-only log of MobileTransaction and FundTransaction status changes,
+    one row per change (creation included), written in the same database
+    transaction as the change. Ids are stored without foreign keys so the
+    history outlives archiving. Time-in-state, "changed since" and audit
+    queries are range scans over its indexes.
+    """
+    KIND_CHOICES = (
+        ("mobile", "Mobile transaction"),
+        ("fund", "Fund transaction"),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    transaction_id = models.CharField(max_length=64)
+    schedule_id = models.UUIDField(null=True, blank=True)
+    from_status = models.CharField(max_length=20, blank=True, help_text="Empty for the creation of the transaction")
+    to_status = models.CharField(max_length=20)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['changed_at'], name='transition_changed_idx'),
+            models.Index(fields=['kind', 'transaction_id', 'changed_at'], name='transition_txn_idx'),
+            models.Index(fields=['kind', 'to_status', 'changed_at'], name='transition_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.transaction_id}: {self.from_status or '-'} -> {self.to_status}"
+
+
+def record_transitions(changes, changed_at=None):
+    """
+    Log status changes, given as ``(transaction, previous status)`` pairs
+    (previous status None for a new transaction), with one INSERT.
+    """
+    changed_at = changed_at or timezone.now()
+    load_payment_schedule_ids([txn for txn, _ in changes if isinstance(txn, MobileTransaction)])
+    rows = []
+    for txn, from_status in changes:
+        if isinstance(txn, FundTransaction):
+            kind, schedule_id = "fund", txn.schedule_id
+        else:
+            kind, schedule_id = "mobile", txn.payment_schedule_id
+        rows.append(TransactionTransition(
+            kind=kind, transaction_id=str(txn.pk), schedule_id=schedule_id,
+            from_status=from_status or "", to_status=txn.status, changed_at=changed_at,
+        ))
+        txn._loaded_status = txn.status
+    if rows:
+        TransactionTransition.objects.bulk_create(rows)
+        apply_funding_changes(changes)
+
+
+def load_payment_schedule_ids(txns):
+    """Look up payment_schedule_id for mobile transactions whose receiver is not loaded, in one query"""
+    missing = [
+        txn for txn in txns
+        if not MobileTransaction.receiver.is_cached(txn) and '_payment_schedule_id' not in txn.__dict__
+    ]
+    if not missing:
+        return
+    schedule_ids = dict(
+        MobileReceiver.objects.filter(pk__in={txn.receiver_id for txn in missing}).values_list('pk', 'payment_schedule_id')
+    )
+    for txn in missing:
+        txn._payment_schedule_id = schedule_ids.get(txn.receiver_id)
+
+
+def apply_funding_changes(changes):
+    """
+    Move funded totals by the fund transactions that became paid (or stopped
+    being paid), given as ``(transaction, previous status)`` pairs: schedule
+    deposits add to their schedule's total (see add_schedule_funding), wallet
+    top-ups to their wallet's balance, with a ledger entry each.
+    """
+    schedule_deltas, wallet_deltas, ledger = {}, {}, []
+    for txn, from_status in changes:
+        if isinstance(txn, FundTransaction):
+            delta = (txn.amount_minor if txn.status == "paid" else 0) - (txn.amount_minor if from_status == "paid" else 0)
+            if not delta:
+                continue
+            if txn.wallet_id is not None:
+                wallet_deltas[txn.wallet_id] = wallet_deltas.get(txn.wallet_id, 0) + delta
+                ledger.append(WalletLedgerEntry(
+                    wallet_id=txn.wallet_id, kind="deposit", amount_minor=delta, fund_transaction_id=txn.pk,
+                ))
+            else:
+                schedule_deltas[txn.schedule_id] = schedule_deltas.get(txn.schedule_id, 0) + delta
+    add_schedule_funding(schedule_deltas)
+    if wallet_deltas:
+        CustomerWallet.objects.filter(pk__in=list(wallet_deltas)).update(
+            balance_minor=F('balance_minor') + per_row(wallet_deltas), updated_at=timezone.now()
+        )
+        WalletLedgerEntry.objects.bulk_create(ledger)
+
+
+def per_row(values):
+    """``CASE pk WHEN ... THEN value END``: a different integer per row in one UPDATE"""
+    return models.Case(
+        *(models.When(pk=pk, then=models.Value(value)) for pk, value in values.items()),
+        default=models.Value(0),
+        output_field=models.BigIntegerField(),
+    )
+
+
+def add_schedule_funding(deltas, **lookup):
+    """
+    Add ``{schedule id: amount in minor units}`` to the schedules' funded
+    totals with one UPDATE that also sets is_funded from each new total,
+    whatever the schedule's funding history, and bumps their versions.
+    ``lookup`` narrows the rows it may change; returns the number changed.
+    """
+    if not deltas:
+        return 0
+    delta = per_row(deltas)
+    updated = PaymentSchedule.objects.filter(pk__in=list(deltas), **lookup).update(
+        funded_amount_minor=F('funded_amount_minor') + delta,
+        # SET expressions see the old row, so compare against old total + delta
+        is_funded=models.Case(
+            models.When(total_minor__lte=F('funded_amount_minor') + delta, then=models.Value(True)),
+            default=models.Value(False),
+        ),
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+    )
+    for schedule_id in deltas:
+        invalidate(PaymentSchedule, schedule_id)
+    return updated
+
+
+def record_status_change(txn):
+    """Called by save(): log the status change since the row was loaded or last saved, if any"""
+    from_status = getattr(txn, '_loaded_status', None)
+    if txn.status != from_status:
+        record_transitions([(txn, from_status)])
+
+
+def bump_schedule_version(*schedule_ids):
+    """
+    Record that something under these schedules changed: one UPDATE that
+    increments their version counters, invalidating ETags and snapshots.
+    updated_at moves too (update() skips auto_now), so delta sync re-sends
+    the schedule with its recomputed counts.
+    """
+    schedule_ids = [schedule_id for schedule_id in schedule_ids if schedule_id is not None]
+    if schedule_ids:
+        PaymentSchedule.objects.filter(pk__in=schedule_ids).update(
+            version=F('version') + 1, updated_at=timezone.now()
+        )
@@ -0,0 +1,96 @@
+# money.py
+"""
+Integer minor-unit money.
+
+Amounts are carried as an integer number of minor units (cents) plus a
+currency code, so sums and comparisons are exact and aggregate as plain
+integers in the database. All currencies use two minor digits here, which
+matches the DecimalFields and the cent amounts Bitnob expects.
+"""
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+DEFAULT_CURRENCY = "UGX"
+MINOR_UNIT_DIGITS = 2
+MINOR_UNITS_PER_MAJOR = 10 ** MINOR_UNIT_DIGITS
+
+# 1.5% processing fee expressed as a fraction
+PROCESSING_FEE_RATE = (15, 1000)
+
+
+def to_minor(amount):
+    """Convert a Decimal/str/int/float major-unit amount to integer minor units (half-up)"""
+    if amount is None:
+        return 0
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return int((amount * MINOR_UNITS_PER_MAJOR).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def to_major(minor):
+    """Convert integer minor units back to a 2dp Decimal"""
+    return (Decimal(int(minor or 0)) / MINOR_UNITS_PER_MAJOR).quantize(Decimal("0.01"))
+
+
+@dataclass(frozen=True)
+class Money:
+    minor: int
+    currency: str = DEFAULT_CURRENCY
+
+    @classmethod
+    def from_major(cls, amount, currency=DEFAULT_CURRENCY):
+        return cls(to_minor(amount), currency)
+
+    @classmethod
+    def zero(cls, currency=DEFAULT_CURRENCY):
+        return cls(0, currency)
+
+    @property
+    def amount(self):
+        """Major-unit Decimal, for API responses and DecimalFields"""
+        return to_major(self.minor)
+
+    def _check_currency(self, other):
+        if self.currency != other.currency:
+            raise ValueError(f"Currency mismatch: {self.currency} vs {other.currency}")
+
+    def __add__(self, other):
+        if other == 0:
+            return self
+        self._check_currency(other)
+        return Money(self.minor + other.minor, self.currency)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        self._check_currency(other)
+        return Money(self.minor - other.minor, self.currency)
+
+    def __mul__(self, factor):
+        if not isinstance(factor, int):
+            raise TypeError("Money can only be multiplied by an integer")
+        return Money(self.minor * factor, self.currency)
+
+    __rmul__ = __mul__
+
+    def __lt__(self, other):
+        self._check_currency(other)
+        return self.minor < other.minor
+
+    def __le__(self, other):
+        self._check_currency(other)
+        return self.minor <= other.minor
+
+    def fraction(self, numerator, denominator):
+        """This amount scaled by numerator/denominator, rounded half-up to a minor unit"""
+        scaled = self.minor * numerator
+        quotient, remainder = divmod(scaled, denominator)
+        if remainder * 2 >= denominator:
+            quotient += 1
+        return Money(quotient, self.currency)
+
+    def processing_fee(self):
+        return self.fraction(*PROCESSING_FEE_RATE)
+
+    def __str__(self):
+        return str(self.amount)
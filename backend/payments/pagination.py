@@ -0,0 +1,95 @@
+# pagination.py
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is an opaque, URL-safe token encoding the ordering key of the last
+row on the previous page. Fetching the next page is an index range scan
+(``WHERE (created_at, id) < (?, ?)``), so page latency does not grow with the
+page number the way OFFSET pagination does.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+
+def parse_cursor_datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"not a datetime: {value}")
+    return parsed
+
+
+def parse_page_size(value, default, maximum):
+    """Parse a page_size query parameter, clamped to [1, maximum]"""
+    if value in (None, ""):
+        return default
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor(f"Invalid page_size: {value}")
+    return max(1, min(page_size, maximum))
+
+
+def keyset_filter(key_fields, key_values, descending=True):
+    """
+    Build the "strictly after this key" condition for a compound ordering,
+    e.g. for (created_at, id) descending:
+    created_at < c OR (created_at = c AND id < i)
+    """
+    lookup = "lt" if descending else "gt"
+    condition = Q()
+    for index, field in enumerate(key_fields):
+        equal_prefix = {name: value for name, value in zip(key_fields[:index], key_values[:index])}
+        condition |= Q(**equal_prefix, **{f"{field}__{lookup}": key_values[index]})
+    return condition
+
+
+def keyset_page(queryset, key_fields, cursor=None, page_size=50, descending=True, key_parsers=None):
+    """
+    Return ``(rows, next_cursor)`` for one page of ``queryset`` ordered by ``key_fields``.
+
+    ``key_parsers`` optionally maps a key field to a callable converting the
+    decoded cursor value (always JSON) back into a comparable Python value.
+    """
+    prefix = "-" if descending else ""
+    queryset = queryset.order_by(*[f"{prefix}{field}" for field in key_fields])
+
+    if cursor:
+        key_values = decode_cursor(cursor)
+        if not isinstance(key_values, list) or len(key_values) != len(key_fields):
+            raise InvalidCursor("Cursor does not match this listing")
+        key_parsers = key_parsers or {}
+        try:
+            key_values = [key_parsers.get(field, lambda v: v)(value) for field, value in zip(key_fields, key_values)]
+        except (AttributeError, TypeError, ValueError) as e:
+            # uuid.UUID() raises AttributeError for a number
+            raise InvalidCursor(f"Invalid cursor: {e}")
+        queryset = queryset.filter(keyset_filter(key_fields, key_values, descending))
+
+    # Fetch one extra row to learn whether another page exists
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, field) for field in key_fields])
+    return rows, next_cursor
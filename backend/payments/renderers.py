@@ -0,0 +1,70 @@
+# renderers.py
+"""
+DRF renderer and parser backed by orjson.
+
+orjson encodes dicts, lists, strings, UUIDs and datetimes in C; the few
+types it does not know (Decimal, timedelta, lazy strings, querysets) go
+through DRF's own encoder, so the JSON is the same as the stock
+JSONRenderer's (minus whitespace). If orjson is not installed both classes
+fall back to the stock implementations.
+
+Compare the two with ``python manage.py benchmark_json``.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Same values as the stock encoder: Decimal -> float, timedelta -> seconds, ...
+_encode_fallback = JSONEncoder().default
+
+# U+2028/U+2029 are escaped by DRF so the output stays a strict JavaScript subset
+_LINE_SEPARATOR = "\u2028".encode()
+_PARAGRAPH_SEPARATOR = "\u2029".encode()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Drop-in replacement for rest_framework.renderers.JSONRenderer"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        # orjson only indents by two; any requested indent gets that
+        option = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+
+        try:
+            ret = orjson.dumps(data, default=_encode_fallback, option=option)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits; the stock encoder copes
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if _LINE_SEPARATOR in ret or _PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(_LINE_SEPARATOR, b'\\u2028').replace(_PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    """Drop-in replacement for rest_framework.parsers.JSONParser"""
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -1,6 +1,7 @@
 # serializers.py
+from django.db.models import Count, Q
 from rest_framework import serializers
-from .models import BitnobCustomer, MobileReceiver, PaymentSchedule, MobileTransaction
+from .models import BitnobCustomer, MobileReceiver, PaymentSchedule, MobileTransaction, ArchivedPaymentSchedule
 
 class CustomerCreateSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -51,7 +52,18 @@ class ReceiverCreateSerializer(serializers.Serializer):
     )
 
 class PaymentScheduleSerializer(serializers.ModelSerializer):
-    """Serializer for reading PaymentSchedule objects"""
+    """
+    Serializer for reading PaymentSchedule objects.
+
+    Pass ``fields=[...]`` to render only a subset (sparse fieldsets); the
+    computed fields then only cost queries when they are asked for.
+    """
+    # Fields that need extra queries per schedule unless annotated in bulk
+    COMPUTED_FIELDS = [
+        'total_receivers', 'total_transactions', 'completed_transactions',
+        'progress_percentage', 'is_completed'
+    ]
+
     total_receivers = serializers.ReadOnlyField()
     total_transactions = serializers.ReadOnlyField()
     completed_transactions = serializers.ReadOnlyField()
@@ -70,9 +82,39 @@ class PaymentScheduleSerializer(serializers.ModelSerializer):
             'processing_fee_percentage', 'is_completed', 'customer_name'
         ]
 
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields) - {'id'}:
+                self.fields.pop(name)
+
     def get_customer_name(self, obj):
         return f"{obj.customer.first_name} {obj.customer.last_name}"
 
+
+def annotate_schedule_counts(queryset, fields):
+    """
+    Annotate the per-schedule counts needed by ``fields`` so that serializing a
+    page costs one query instead of several per schedule. The annotations
+    shadow the model's scoped properties of the same name.
+    """
+    counts = {}
+    needs_transactions = {'total_transactions', 'progress_percentage', 'is_completed'}
+    needs_completed = {'completed_transactions', 'progress_percentage', 'is_completed'}
+
+    if 'total_receivers' in fields:
+        counts['total_receivers'] = Count('receivers', distinct=True)
+    if needs_transactions & set(fields):
+        counts['total_transactions'] = Count('receivers__transactions', distinct=True)
+    if needs_completed & set(fields):
+        counts['completed_transactions'] = Count(
+            'receivers__transactions',
+            filter=Q(receivers__transactions__status='success'),
+            distinct=True
+        )
+    return queryset.annotate(**counts) if counts else queryset
+
 class MobileReceiverSerializer(serializers.ModelSerializer):
     """Serializer for reading MobileReceiver objects"""
     total_amount = serializers.ReadOnlyField()
@@ -109,3 +151,61 @@ class MobileTransactionSerializer(serializers.ModelSerializer):
 
     def get_receiver_phone(self, obj):
         return obj.receiver.phone
+
+class ArchivedPaymentScheduleSerializer(serializers.ModelSerializer):
+    """
+    Read-only view of an archived schedule, shaped like PaymentScheduleSerializer.
+    Expects receivers and their transactions to be prefetched.
+    """
+    total_receivers = serializers.SerializerMethodField()
+    total_transactions = serializers.SerializerMethodField()
+    completed_transactions = serializers.SerializerMethodField()
+    progress_percentage = serializers.SerializerMethodField()
+    processing_fee_percentage = serializers.SerializerMethodField()
+    is_completed = serializers.SerializerMethodField()
+    customer_name = serializers.SerializerMethodField()
+    archived = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedPaymentSchedule
+        fields = [
+            'id', 'title', 'description', 'status', 'subtotal_amount',
+            'processing_fee', 'total_amount', 'frequency', 'start_date',
+            'end_date', 'created_at', 'updated_at', 'total_receivers',
+            'total_transactions', 'completed_transactions', 'progress_percentage',
+            'processing_fee_percentage', 'is_completed', 'customer_name',
+            'archived', 'archived_at'
+        ]
+
+    def _transactions(self, obj):
+        return [txn for receiver in obj.receivers.all() for txn in receiver.transactions.all()]
+
+    def get_total_receivers(self, obj):
+        return len(obj.receivers.all())
+
+    def get_total_transactions(self, obj):
+        return len(self._transactions(obj))
+
+    def get_completed_transactions(self, obj):
+        return sum(1 for txn in self._transactions(obj) if txn.status == 'success')
+
+    def get_progress_percentage(self, obj):
+        total = self.get_total_transactions(obj)
+        if total == 0:
+            return 0
+        return round((self.get_completed_transactions(obj) / total) * 100, 2)
+
+    def get_processing_fee_percentage(self, obj):
+        if obj.subtotal_amount > 0:
+            return round((obj.processing_fee / obj.subtotal_amount) * 100, 2)
+        return 0
+
+    def get_is_completed(self, obj):
+        total = self.get_total_transactions(obj)
+        return total > 0 and self.get_completed_transactions(obj) == total
+
+    def get_customer_name(self, obj):
+        return f"{obj.customer.first_name} {obj.customer.last_name}"
+
+    def get_archived(self, obj):
+        return True
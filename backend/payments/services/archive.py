@@ -0,0 +1,118 @@
+# services/archive.py
+"""
+Cold archive tier for finished payment plans.
+
+Completed and cancelled schedules whose last update is older than the
+retention window are copied, together with their receivers, mobile
+transactions and fund transactions, into the Archived* tables and then
+removed from the hot tables. Each chunk is moved inside its own database
+transaction so a failure never leaves a plan half archived.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from payments.cache import invalidate_customer
+from payments.models import (
+    PaymentSchedule, MobileReceiver, MobileTransaction, FundTransaction,
+    ArchivedPaymentSchedule, ArchivedMobileReceiver, ArchivedMobileTransaction, ArchivedFundTransaction,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = ['completed', 'cancelled']
+
+# hot model -> (archive model, lookup from the hot model to the schedule id)
+ARCHIVE_PLAN = [
+    (PaymentSchedule, ArchivedPaymentSchedule, 'id__in'),
+    (MobileReceiver, ArchivedMobileReceiver, 'payment_schedule_id__in'),
+    (MobileTransaction, ArchivedMobileTransaction, 'receiver__payment_schedule_id__in'),
+    (FundTransaction, ArchivedFundTransaction, 'schedule_id__in'),
+]
+
+
+def archivable_schedules(retention_days=None):
+    """Finished schedules that have not been touched within the retention window"""
+    if retention_days is None:
+        retention_days = getattr(settings, 'ARCHIVE_RETENTION_DAYS', 90)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    return PaymentSchedule.objects.filter(status__in=ARCHIVABLE_STATUSES, updated_at__lt=cutoff)
+
+
+def _copy_rows(hot_model, archive_model, lookup, schedule_ids):
+    """Copy the rows belonging to ``schedule_ids`` into the archive table"""
+    attnames = [field.attname for field in archive_model._meta.concrete_fields if field.attname != 'archived_at']
+    rows = hot_model.objects.filter(**{lookup: schedule_ids}).values(*attnames)
+    archived = [archive_model(**row) for row in rows]
+    archive_model.objects.bulk_create(archived, batch_size=500)
+    return len(archived)
+
+
+def archive_chunk(schedule_ids):
+    """Move one chunk of schedules (and everything hanging off them) to the archive tables"""
+    counts = {}
+    with transaction.atomic():
+        customer_ids = set(
+            PaymentSchedule.objects.filter(id__in=schedule_ids).values_list('customer_id', flat=True)
+        )
+        for hot_model, archive_model, lookup in ARCHIVE_PLAN:
+            counts[hot_model.__name__] = _copy_rows(hot_model, archive_model, lookup, schedule_ids)
+
+        # Delete leaves first so each delete is a single statement
+        for hot_model, _, lookup in reversed(ARCHIVE_PLAN):
+            hot_model.objects.filter(**{lookup: schedule_ids}).delete()
+
+        # Archived plans drop out of their customers' cached listings
+        for customer_id in customer_ids:
+            invalidate_customer(customer_id)
+    return counts
+
+
+def archive_finished_schedules(retention_days=None, chunk_size=None, max_chunks=None, dry_run=False):
+    """
+    Archive finished schedules in chunks until none are left (or ``max_chunks`` is reached).
+    Returns a summary of how many rows of each kind were moved.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'ARCHIVE_CHUNK_SIZE', 200)
+
+    candidates = archivable_schedules(retention_days).order_by('updated_at')
+    if dry_run:
+        return {"dry_run": True, "schedules_eligible": candidates.count()}
+
+    totals = {hot_model.__name__: 0 for hot_model, _, _ in ARCHIVE_PLAN}
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        schedule_ids = list(candidates.values_list('id', flat=True)[:chunk_size])
+        if not schedule_ids:
+            break
+
+        counts = archive_chunk(schedule_ids)
+        for name, count in counts.items():
+            totals[name] += count
+        chunks += 1
+        logger.info(f"Archived chunk {chunks}: {counts}")
+
+    return {
+        "chunks": chunks,
+        "archived": totals,
+        "timestamp": timezone.now().isoformat()
+    }
+
+
+def get_archived_schedule(schedule_id):
+    """Fetch an archived schedule with receivers and transactions prefetched, or None"""
+    return (
+        ArchivedPaymentSchedule.objects
+        .select_related('customer')
+        .prefetch_related('receivers__transactions')
+        .filter(id=schedule_id)
+        .first()
+    )
+
+
+def is_archived(schedule_id):
+    return ArchivedPaymentSchedule.objects.filter(id=schedule_id).exists()
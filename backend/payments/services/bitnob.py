@@ -2,9 +2,27 @@
 import requests
 from django.conf import settings
 
+from payments.ratelimit import TokenBucket
+
 BASE = "https://api.bitnob.co/api/v1"
 HEADERS = {"Authorization": f"Bearer {settings.BITNOB_API_KEY}", "Content-Type": "application/json"}
 
+# Shared by every thread of this process that queries payment status
+status_query_limiter = TokenBucket(settings.BITNOB_STATUS_QUERY_RATE, settings.BITNOB_STATUS_QUERY_BURST)
+
+# Provider payment status -> our MobileTransaction status (None: still in flight)
+MOBILE_PAYMENT_STATUSES = {
+    "success": "success",
+    "successful": "success",
+    "completed": "success",
+    "paid": "success",
+    "failed": "failed",
+    "cancelled": "failed",
+    "expired": "failed",
+    "pending": None,
+    "processing": None,
+}
+
 def lookup_mobile(country, number):
     # Skip lookup for Uganda as it's not supported
     if country in ["+256", "256", "UG", "Uganda"]:
@@ -106,4 +124,32 @@ def create_and_pay_mobile_invoice(country, number, sender_name, amount_cents, cu
         'reference': invoice_result['reference']
     }
 
-
+def get_mobile_payment_status(reference):
+    """
+    Ask Bitnob for the current state of a mobile payment (rate limited).
+    Returns {"found", "error", "status" (ours, None while in flight),
+    "provider_status", "message"}. ``error`` is set, and ``found`` is False,
+    when Bitnob could not be asked or gave no usable answer: the payment may
+    well exist.
+    """
+    status_query_limiter.acquire()
+    url = f"{BASE}/mobile-payments/{reference}"
+    try:
+        res = requests.get(url, headers=HEADERS, timeout=settings.BITNOB_STATUS_QUERY_TIMEOUT)
+        if res.status_code == 404:
+            return {"found": False, "error": False, "status": None, "provider_status": None, "message": "Payment not found"}
+        if res.status_code >= 500:
+            return {"found": False, "error": True, "status": None, "provider_status": None,
+                    "message": f"Status request failed: HTTP {res.status_code}"}
+        response = res.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return {"found": False, "error": True, "status": None, "provider_status": None, "message": f"Status request failed: {str(e)}"}
+    data = response.get("data") or {}
+    provider_status = str(data.get("status") or "").lower()
+    return {
+        "found": bool(response.get("status") and data),
+        "error": False,
+        "status": MOBILE_PAYMENT_STATUSES.get(provider_status),
+        "provider_status": provider_status or None,
+        "message": data.get("failureReason") or response.get("message", ""),
+    }
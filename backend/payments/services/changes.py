@@ -0,0 +1,143 @@
+# services/changes.py
+"""
+Delta sync: rows created or modified after a cursor.
+
+Each feed (schedules, receivers, transactions, fund transactions) is read
+as a keyset scan over its (updated_at, id) index, so a sync costs what
+changed rather than the size of the dataset. The cursor records the last
+(updated_at, id) seen per feed.
+
+Rows are only returned once they are ``CHANGES_SETTLE_SECONDS`` old: a
+transaction that stamped updated_at but had not yet committed when a client
+synced would otherwise land behind that client's cursor and never be sent.
+Deleted and archived rows are not reported.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from payments.models import PaymentSchedule, MobileReceiver, MobileTransaction, FundTransaction
+from payments.pagination import encode_cursor, decode_cursor, keyset_filter, parse_cursor_datetime, InvalidCursor
+from payments.serializers import PaymentScheduleSerializer, annotate_schedule_counts
+
+KEY_FIELDS = ('updated_at', 'id')
+
+RECEIVER_FIELDS = (
+    'id', 'payment_schedule_id', 'name', 'phone', 'country_code', 'amount_per_installment',
+    'currency', 'number_of_installments', 'created_at', 'updated_at',
+)
+TRANSACTION_FIELDS = (
+    'id', 'receiver_id', 'installment_number', 'amount', 'currency', 'status', 'reference',
+    'sent_at', 'completed_at', 'failure_reason', 'created_at', 'updated_at',
+)
+FUND_TRANSACTION_FIELDS = (
+    'id', 'schedule_id', 'wallet_id', 'reference', 'amount', 'currency', 'status', 'usdt_required',
+    'stablecoin_address', 'stablecoin_network', 'created_at', 'updated_at',
+)
+
+
+def _schedules(customer_id):
+    queryset = annotate_schedule_counts(
+        PaymentSchedule.objects.select_related('customer'), PaymentScheduleSerializer.Meta.fields
+    )
+    return queryset.filter(customer_id=customer_id) if customer_id else queryset
+
+
+def _receivers(customer_id):
+    queryset = MobileReceiver.objects.all()
+    return queryset.filter(customer_id=customer_id) if customer_id else queryset
+
+
+def _transactions(customer_id):
+    queryset = MobileTransaction.objects.all()
+    return queryset.filter(receiver__customer_id=customer_id) if customer_id else queryset
+
+
+def _fund_transactions(customer_id):
+    queryset = FundTransaction.objects.all()
+    if not customer_id:
+        return queryset
+    return queryset.filter(Q(schedule__customer_id=customer_id) | Q(wallet__customer_id=customer_id))
+
+
+def _serialize_schedules(rows):
+    return PaymentScheduleSerializer(rows, many=True).data
+
+
+DECIMAL_FIELDS = {'amount', 'amount_per_installment', 'usdt_required'}
+
+
+def _plain_rows(rows):
+    # Decimals go out as strings, like everywhere else in the API
+    for row in rows:
+        for key in DECIMAL_FIELDS & row.keys():
+            if row[key] is not None:
+                row[key] = str(row[key])
+    return rows
+
+
+# feed name -> (base queryset for a customer, values() fields or None for models, serializer, id parser)
+FEEDS = {
+    "schedules": (_schedules, None, _serialize_schedules, uuid.UUID),
+    "receivers": (_receivers, RECEIVER_FIELDS, _plain_rows, int),
+    "transactions": (_transactions, TRANSACTION_FIELDS, _plain_rows, int),
+    "fund_transactions": (_fund_transactions, FUND_TRANSACTION_FIELDS, _plain_rows, uuid.UUID),
+}
+
+
+def parse_changes_cursor(cursor):
+    """{feed: (updated_at, id)} from a cursor returned by a previous sync ({} for a full sync)"""
+    if not cursor:
+        return {}
+    positions = decode_cursor(cursor)
+    if not isinstance(positions, dict) or not set(positions) <= set(FEEDS):
+        raise InvalidCursor("Cursor does not match this feed")
+    parsed = {}
+    try:
+        for feed, (updated_at, row_id) in positions.items():
+            parsed[feed] = (parse_cursor_datetime(updated_at), FEEDS[feed][3](row_id))
+    except (AttributeError, TypeError, ValueError) as e:
+        # uuid.UUID() raises AttributeError for a number
+        raise InvalidCursor(f"Invalid cursor: {e}")
+    return parsed
+
+
+def _row_key(row):
+    if isinstance(row, dict):
+        return row['updated_at'], row['id']
+    return row.updated_at, row.id
+
+
+def changes_since(cursor=None, customer_id=None, page_size=None):
+    """
+    Return ``(changes, next_cursor, has_more)``. ``changes`` maps each feed to
+    its changed rows, oldest first; call again with ``next_cursor`` while
+    ``has_more`` is true.
+    """
+    page_size = page_size or settings.CHANGES_PAGE_SIZE
+    positions = parse_changes_cursor(cursor)
+    settled_before = timezone.now() - timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+
+    changes = {}
+    next_positions = dict(positions)
+    has_more = False
+    for feed, (base_queryset, fields, serialize, _) in FEEDS.items():
+        queryset = base_queryset(customer_id).filter(updated_at__lte=settled_before).order_by(*KEY_FIELDS)
+        if feed in positions:
+            queryset = queryset.filter(keyset_filter(KEY_FIELDS, positions[feed], descending=False))
+        if fields is not None:
+            queryset = queryset.values(*fields)
+
+        # Fetch one extra row to learn whether this feed has more
+        rows = list(queryset[:page_size + 1])
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            has_more = True
+        if rows:
+            next_positions[feed] = _row_key(rows[-1])
+        changes[feed] = serialize(rows)
+
+    return changes, encode_cursor(next_positions), has_more
@@ -0,0 +1,154 @@
+# services/dashboard.py
+"""
+Scheduled-payments status dashboard.
+
+All per-schedule numbers are produced by one grouped query: transaction
+counts by conditional aggregation over the receivers→transactions join, and
+receiver totals as correlated subqueries (so they are not multiplied
+by the join). ``ScheduleStatusSnapshot`` stores the same rows for dashboards
+that prefer a precomputed read; only snapshots whose schedule version has
+moved on are recomputed.
+"""
+from django.db.models import Count, Q, Sum, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from payments.models import PaymentSchedule, MobileReceiver, ScheduleStatusSnapshot
+from payments.money import Money
+
+SNAPSHOT_COUNT_FIELDS = [
+    'total_receivers', 'expected_total_transactions', 'actual_total_transactions',
+    'pending_transactions', 'successful_transactions', 'failed_transactions',
+    'total_funded_minor',
+]
+
+
+def _schedule_subquery_total(queryset, schedule_field, expression):
+    """Correlated scalar subquery: aggregate of ``queryset`` for the outer schedule"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{schedule_field: OuterRef('pk')})
+            .order_by()
+            .values(schedule_field)
+            .annotate(total=expression)
+            .values('total')[:1]
+        ),
+        Value(0)
+    )
+
+
+def active_schedules():
+    return PaymentSchedule.objects.filter(status='active', is_funded=True)
+
+
+def annotate_status_counts(queryset):
+    """Annotate every number the dashboard needs onto a PaymentSchedule queryset (one SQL statement)"""
+    transactions = 'receivers__transactions'
+    return queryset.order_by().annotate(
+        actual_total_transactions=Count(transactions),
+        pending_transactions=Count(transactions, filter=Q(receivers__transactions__status__in=['pending', 'processing'])),
+        successful_transactions=Count(transactions, filter=Q(receivers__transactions__status='success')),
+        failed_transactions=Count(transactions, filter=Q(receivers__transactions__status='failed')),
+        total_receivers=_schedule_subquery_total(MobileReceiver.objects.all(), 'payment_schedule', Count('id')),
+        expected_total_transactions=_schedule_subquery_total(
+            MobileReceiver.objects.all(), 'payment_schedule', Sum('number_of_installments')
+        ),
+        total_funded_minor=F('funded_amount_minor'),
+    )
+
+
+def _is_payment_due(schedule, now):
+    """Same answer as PaymentSchedule.is_payment_due() but without saving the schedule"""
+    next_payment_date = schedule.next_payment_date or schedule.calculate_next_payment_date()
+    return now >= next_payment_date
+
+
+def _summary_row(schedule, counts, now):
+    expected_total = counts['expected_total_transactions']
+    successful = counts['successful_transactions']
+    total_funded = Money(counts['total_funded_minor'], schedule.currency)
+    return {
+        "schedule_id": str(schedule.id),
+        "title": schedule.title,
+        "frequency": schedule.frequency,
+        "is_funded": schedule.is_funded,
+        "next_payment_date": schedule.next_payment_date,
+        "last_payment_date": schedule.last_payment_date,
+        "is_payment_due": _is_payment_due(schedule, now),
+        "total_receivers": counts['total_receivers'],
+        "expected_total_transactions": expected_total,
+        "actual_total_transactions": counts['actual_total_transactions'],
+        "pending_transactions": counts['pending_transactions'],
+        "successful_transactions": successful,
+        "failed_transactions": counts['failed_transactions'],
+        "completion_percentage": round((successful / expected_total * 100), 2) if expected_total > 0 else 0,
+        "created_at": schedule.created_at,
+        "funding_status": {
+            "total_required": str(schedule.total_amount),
+            "total_funded": str(total_funded),
+            "is_adequately_funded": total_funded.minor >= schedule.total_minor
+        }
+    }
+
+
+def live_schedule_summaries():
+    """Dashboard rows computed from the hot tables in one grouped query"""
+    now = timezone.now()
+    schedules = annotate_status_counts(active_schedules()).order_by('-created_at')
+    return [
+        _summary_row(schedule, {field: getattr(schedule, field) for field in SNAPSHOT_COUNT_FIELDS}, now)
+        for schedule in schedules
+    ]
+
+
+def snapshot_schedule_summaries():
+    """Dashboard rows read from the precomputed snapshots (one query)"""
+    now = timezone.now()
+    snapshots = (
+        ScheduleStatusSnapshot.objects
+        .filter(schedule__status='active', schedule__is_funded=True)
+        .select_related('schedule')
+        .order_by('-schedule__created_at')
+    )
+    return [
+        _summary_row(snapshot.schedule, {field: getattr(snapshot, field) for field in SNAPSHOT_COUNT_FIELDS}, now)
+        for snapshot in snapshots
+    ]
+
+
+def refresh_status_snapshots(batch_size=500):
+    """
+    Recompute snapshots whose schedule version has moved on, and create them
+    for active schedules that have none yet. Returns the number written.
+    """
+    stale_ids = set(
+        ScheduleStatusSnapshot.objects.filter(
+            schedule_version__lt=F('schedule__version')
+        ).values_list('schedule_id', flat=True)[:batch_size]
+    )
+    missing_ids = set(
+        active_schedules().filter(status_snapshot__isnull=True).values_list('id', flat=True)[:batch_size]
+    )
+    schedule_ids = stale_ids | missing_ids
+    if not schedule_ids:
+        return 0
+
+    # The version is read by the same statement as the counts, so a change racing
+    # with the refresh leaves the snapshot behind its schedule (still stale)
+    now = timezone.now()
+    snapshots = [
+        ScheduleStatusSnapshot(
+            schedule_id=schedule.id,
+            schedule_version=schedule.version,
+            refreshed_at=now,
+            **{field: getattr(schedule, field) for field in SNAPSHOT_COUNT_FIELDS}
+        )
+        for schedule in annotate_status_counts(PaymentSchedule.objects.filter(id__in=schedule_ids))
+    ]
+    ScheduleStatusSnapshot.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        unique_fields=['schedule'],
+        update_fields=SNAPSHOT_COUNT_FIELDS + ['schedule_version', 'refreshed_at'],
+    )
+    return len(snapshots)
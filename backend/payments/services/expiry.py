@@ -0,0 +1,89 @@
+# services/expiry.py
+"""
+Expiry of abandoned USDT deposit quotes.
+
+A pending FundTransaction blocks new deposits for its schedule, and only a
+webhook ever settles it. Pending rows older than the quote lifetime are
+found through the (status, created_at) index and moved to ``expired`` a
+chunk at a time: the chunk is locked where the database supports it
+(skipping rows a webhook worker holds) and moved with one conditional
+UPDATE. Only the rows that statement moved are logged (one INSERT) and
+announced with a ``funding.status`` event, as if Bitnob had sent
+``stablecoin.deposit.expired``; their schedules get one version bump and
+cache invalidation.
+Money arriving later still moves an expired row to paid.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from payments import events
+from payments.cache import invalidate_schedule
+from payments.memo import invalidate
+from payments.models import FundTransaction, PaymentSchedule, bump_schedule_version, record_transitions
+from payments.transitions import transition_rows
+
+logger = logging.getLogger(__name__)
+
+
+def stale_quotes(lifetime=None, **lookup):
+    """Pending fund transactions created more than ``lifetime`` ago, oldest first"""
+    if lifetime is None:
+        lifetime = timedelta(minutes=settings.FUND_QUOTE_LIFETIME_MINUTES)
+    return (
+        FundTransaction.objects
+        .filter(status="pending", created_at__lt=timezone.now() - lifetime, **lookup)
+        .order_by('created_at')
+    )
+
+
+def expire_chunk(lifetime=None, batch_size=None, **lookup):
+    """
+    Expire up to ``batch_size`` stale quotes. Returns ``(selected, expired
+    rows)``; rows paid or expired by someone else in the meantime are skipped.
+    """
+    batch_size = batch_size or settings.FUND_EXPIRY_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        # A no-op on SQLite, where a webhook may still settle a row before the UPDATE
+        selected = list(stale_quotes(lifetime, **lookup).select_for_update(skip_locked=True)[:batch_size])
+        if not selected:
+            return 0, []
+        moved = transition_rows(
+            FundTransaction, "expired", [row.pk for row in selected], "pending", {"updated_at": now}
+        )
+        rows = [row for row in selected if row.pk in moved]
+        for row in rows:
+            row.status, row.updated_at = "expired", now
+        record_transitions([(row, "pending") for row in rows], now)
+
+    schedules = PaymentSchedule.objects.in_bulk({row.schedule_id for row in rows if row.schedule_id is not None})
+    for schedule_id in schedules:
+        invalidate(PaymentSchedule, schedule_id)
+    bump_schedule_version(*schedules)
+    for schedule in schedules.values():
+        invalidate_schedule(schedule.id, schedule.customer_id)
+    for row in rows:
+        if row.schedule_id is not None:
+            row.schedule = schedules[row.schedule_id]
+        events.publish_funding_status(row, "pending")
+    return len(selected), rows
+
+
+def expire_stale_fund_transactions(lifetime=None, batch_size=None, **lookup):
+    """Expire every pending fund transaction past the quote lifetime, chunk by chunk"""
+    batch_size = batch_size or settings.FUND_EXPIRY_BATCH_SIZE
+    expired, schedule_ids = 0, set()
+    while True:
+        selected, rows = expire_chunk(lifetime, batch_size, **lookup)
+        expired += len(rows)
+        schedule_ids.update(row.schedule_id for row in rows if row.schedule_id is not None)
+        # A short chunk means the rest are gone or held by another worker
+        if selected < batch_size:
+            break
+    if expired:
+        logger.info(f"Expired {expired} stale fund transactions across {len(schedule_ids)} schedules")
+    return {"expired": expired, "schedules": len(schedule_ids), "timestamp": timezone.now().isoformat()}
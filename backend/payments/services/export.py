@@ -0,0 +1,176 @@
+# services/export.py
+"""
+Streaming export of mobile and fund transactions for reconciliation.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)``, so no model
+instances are built and the database driver fetches one chunk at a time;
+each row is encoded as a CSV or NDJSON line as it is produced. Memory use is
+the same for ten rows or ten million.
+"""
+import csv
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from payments.models import MobileTransaction, FundTransaction
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+# kind -> (model, [(column header, values_list path or expression), ...])
+EXPORT_KINDS = {
+    "mobile": (MobileTransaction, [
+        ("id", "id"),
+        ("reference", "reference"),
+        ("status", "status"),
+        ("installment_number", "installment_number"),
+        ("amount", "amount"),
+        ("amount_minor", "amount_minor"),
+        ("currency", "currency"),
+        ("receiver_id", "receiver_id"),
+        ("receiver_name", "receiver__name"),
+        ("receiver_phone", "receiver__phone"),
+        ("schedule_id", "receiver__payment_schedule_id"),
+        ("customer_email", "receiver__customer__email"),
+        ("sent_at", "sent_at"),
+        ("completed_at", "completed_at"),
+        ("failure_reason", "failure_reason"),
+        ("created_at", "created_at"),
+    ]),
+    "fund": (FundTransaction, [
+        ("id", "id"),
+        ("reference", "reference"),
+        ("status", "status"),
+        ("amount", "amount"),
+        ("amount_minor", "amount_minor"),
+        ("currency", "currency"),
+        ("usdt_required", "usdt_required"),
+        ("stablecoin_network", "stablecoin_network"),
+        ("stablecoin_address", "stablecoin_address"),
+        ("schedule_id", "schedule_id"),
+        ("wallet_id", "wallet_id"),
+        # Schedule deposits reach the customer through the schedule, wallet top-ups through the wallet
+        ("customer_email", Coalesce("schedule__customer__email", "wallet__customer__email")),
+        ("created_at", "created_at"),
+        ("updated_at", "updated_at"),
+    ]),
+}
+
+# Filter name -> ORM lookups, per kind (a row matches if any of them does)
+CUSTOMER_LOOKUPS = {"mobile": ("receiver__customer_id",), "fund": ("schedule__customer_id", "wallet__customer_id")}
+CUSTOMER_EMAIL_LOOKUPS = {
+    "mobile": ("receiver__customer__email",),
+    "fund": ("schedule__customer__email", "wallet__customer__email"),
+}
+SCHEDULE_LOOKUPS = {"mobile": ("receiver__payment_schedule_id",), "fund": ("schedule_id",)}
+
+
+def _any_of(lookups, value):
+    condition = Q()
+    for lookup in lookups:
+        condition |= Q(**{lookup: value})
+    return condition
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _parse_bound(value, end_of_day=False):
+    """Accept an ISO datetime or a plain date (whole day) for the from/to filters"""
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            # Well-formed but impossible values (month 13, hour 25) raise rather than return None
+            parsed = parse_datetime(value)
+            day = parse_date(value) if parsed is None else None
+        except ValueError:
+            raise ExportError(f"Invalid date: {value}")
+        if parsed is None:
+            if day is None:
+                raise ExportError(f"Invalid date: {value}")
+            parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_queryset(kind, customer_id=None, customer_email=None, schedule_id=None, status=None,
+                    date_from=None, date_to=None):
+    """Filtered queryset of ``kind`` ("mobile" or "fund"), ordered for a stable export"""
+    if kind not in EXPORT_KINDS:
+        raise ExportError(f"Unknown export kind: {kind}. Use one of: {', '.join(EXPORT_KINDS)}")
+    model, _ = EXPORT_KINDS[kind]
+
+    conditions = []
+    if customer_id:
+        conditions.append(_any_of(CUSTOMER_LOOKUPS[kind], customer_id))
+    if customer_email:
+        conditions.append(_any_of(CUSTOMER_EMAIL_LOOKUPS[kind], customer_email))
+    if schedule_id:
+        conditions.append(_any_of(SCHEDULE_LOOKUPS[kind], schedule_id))
+    filters = {}
+    if status:
+        filters["status__in"] = [value.strip() for value in status.split(",") if value.strip()]
+    date_from = _parse_bound(date_from)
+    date_to = _parse_bound(date_to, end_of_day=True)
+    if date_from:
+        filters["created_at__gte"] = date_from
+    if date_to:
+        filters["created_at__lte"] = date_to
+
+    try:
+        return model.objects.filter(*conditions, **filters).order_by("created_at", "pk")
+    except (ValidationError, ValueError, TypeError) as e:
+        raise ExportError(f"Invalid filter: {e}")
+
+
+def _plain(value):
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    return value
+
+
+def export_rows(queryset, kind, chunk_size=None):
+    """Yield plain tuples for the export columns, one database chunk at a time"""
+    _, columns = EXPORT_KINDS[kind]
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    for row in queryset.values_list(*[path for _, path in columns]).iterator(chunk_size=chunk_size):
+        yield tuple(_plain(value) for value in row)
+
+
+class _Echo:
+    """File-like object whose write() hands back the line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_export_lines(queryset, kind, fmt="csv", chunk_size=None):
+    """Yield the export as text lines (CSV with a header row, or NDJSON)"""
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unknown export format: {fmt}. Use one of: {', '.join(EXPORT_FORMATS)}")
+    headers = [header for header, _ in EXPORT_KINDS[kind][1]]
+
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(headers)
+        for row in export_rows(queryset, kind, chunk_size):
+            yield writer.writerow(["" if value is None else value for value in row])
+    else:
+        for row in export_rows(queryset, kind, chunk_size):
+            yield json.dumps(dict(zip(headers, row)), separators=(",", ":")) + "\n"
@@ -0,0 +1,138 @@
+# services/plans.py
+"""
+Payment plan creation.
+
+Everything is validated up front; the schedule and all of its receivers are
+then written inside a single database transaction, with the receivers
+inserted by bulk_create. A failure rolls the whole plan back, so there is no
+half-created schedule to clean up.
+"""
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+
+from payments.models import BitnobCustomer, PaymentSchedule, MobileReceiver
+from payments.money import Money
+
+RECEIVER_BATCH_SIZE = 1000
+
+
+class PlanCreationError(Exception):
+    """Raised with the error payload and HTTP status to return to the client"""
+
+    def __init__(self, payload, status=400):
+        super().__init__(payload.get("error"))
+        self.payload = payload
+        self.status = status
+
+
+def _validate_receivers(receivers_data):
+    """Normalise receivers and compute the plan subtotal, rejecting the whole plan on the first problem"""
+    subtotal = Money.zero()
+    receivers = []
+    phone_numbers_in_schedule = set()
+
+    for r in receivers_data:
+        try:
+            amount_per_installment = Money.from_major(r["amountPerInstallment"])
+            number_of_installments = int(r["numberOfInstallments"])
+        except (ValueError, TypeError, ArithmeticError) as e:
+            raise PlanCreationError({
+                "error": f"Invalid amount or installments for receiver {r.get('name', 'Unknown')}",
+                "detail": str(e)
+            })
+
+        phone = str(r["phone"]).strip()
+        country_code = str(r["countryCode"]).strip()
+        if not phone or not country_code:
+            raise PlanCreationError({
+                "error": f"Failed to create receiver {r.get('name', 'Unknown')}",
+                "detail": "Phone number and country code are required"
+            })
+
+        # Check for duplicate phone numbers within this payment schedule
+        if phone in phone_numbers_in_schedule:
+            raise PlanCreationError({
+                "error": f"Duplicate phone number {phone} found in payment schedule. Each phone number can only appear once per schedule.",
+                "detail": "Phone numbers must be unique within a payment schedule"
+            })
+        phone_numbers_in_schedule.add(phone)
+
+        subtotal += amount_per_installment * number_of_installments
+        receivers.append({
+            "name": r["name"],
+            "phone": phone,
+            "country_code": country_code,
+            "amount_per_installment": amount_per_installment,
+            "number_of_installments": number_of_installments,
+        })
+
+    return receivers, subtotal
+
+
+def create_payment_plan(data):
+    """
+    Create a payment schedule and its receivers from validated
+    PaymentScheduleCreateSerializer data.
+
+    Returns ``(schedule, receivers, summary)`` where summary holds the
+    subtotal, processing fee and total as Money. Raises PlanCreationError.
+    """
+    try:
+        customer = BitnobCustomer.objects.get(email=data["email"])
+    except BitnobCustomer.DoesNotExist:
+        raise PlanCreationError({"error": "Customer not found"}, status=404)
+
+    receivers_data, subtotal = _validate_receivers(data["receivers"])
+
+    # Add 1.5% processing fee
+    processing_fee = subtotal.processing_fee()
+    total = subtotal + processing_fee
+
+    start_date = data.get("start_date") or timezone.now()
+
+    try:
+        with transaction.atomic():
+            schedule = PaymentSchedule.objects.create(
+                customer=customer,
+                title=data["title"],
+                description=data.get("description", ""),
+                frequency=data.get("frequency", "monthly"),
+                subtotal_amount=subtotal.amount,
+                processing_fee=processing_fee.amount,
+                total_amount=total.amount,
+                currency=total.currency,
+                start_date=start_date
+            )
+
+            # bulk_create bypasses save(), so the minor-unit columns are set explicitly
+            receivers = MobileReceiver.objects.bulk_create([
+                MobileReceiver(
+                    payment_schedule=schedule,
+                    customer=customer,
+                    name=r["name"],
+                    phone=r["phone"],
+                    country_code=r["country_code"],
+                    amount_per_installment=r["amount_per_installment"].amount,
+                    amount_per_installment_minor=r["amount_per_installment"].minor,
+                    currency=r["amount_per_installment"].currency,
+                    number_of_installments=r["number_of_installments"],
+                )
+                for r in receivers_data
+            ], batch_size=RECEIVER_BATCH_SIZE)
+    except IntegrityError as e:
+        raise PlanCreationError({
+            "error": "A phone number is already used in this payment schedule",
+            "detail": str(e)
+        })
+    except Exception as e:
+        raise PlanCreationError({
+            "error": "Failed to create payment schedule",
+            "detail": str(e)
+        }, status=500)
+
+    summary = {
+        "subtotal": subtotal,
+        "processing_fee": processing_fee,
+        "total": total,
+    }
+    return schedule, receivers, summary
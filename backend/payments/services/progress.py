@@ -0,0 +1,74 @@
+# services/progress.py
+"""
+Receiver progress in a fixed number of queries.
+
+Installment counts come from one grouped conditional aggregate over the
+receivers' transactions, and the transaction listings from one fetch
+ordered by (receiver, installment). Serving one receiver or a whole plan
+therefore costs the same two queries.
+"""
+from django.db.models import Count, Q
+
+from payments.models import MobileReceiver, MobileTransaction
+
+TRANSACTION_FIELDS = ('receiver_id', 'id', 'installment_number', 'amount', 'status', 'sent_at')
+
+
+def annotate_progress_counts(queryset):
+    return queryset.annotate(
+        completed_installments=Count('transactions', filter=Q(transactions__status='success')),
+        pending_installments=Count('transactions', filter=Q(transactions__status='pending')),
+        failed_installments=Count('transactions', filter=Q(transactions__status='failed')),
+    )
+
+
+def _transactions_by_receiver(receiver_ids):
+    grouped = {receiver_id: [] for receiver_id in receiver_ids}
+    rows = (
+        MobileTransaction.objects
+        .filter(receiver_id__in=receiver_ids)
+        .order_by('receiver_id', 'installment_number')
+        .values(*TRANSACTION_FIELDS)
+    )
+    for row in rows:
+        grouped[row.pop('receiver_id')].append({**row, "amount": str(row["amount"])})
+    return grouped
+
+
+def progress_row(receiver, transactions):
+    total_installments = receiver.number_of_installments
+    completed_installments = receiver.completed_installments
+    return {
+        "receiver_id": receiver.id,
+        "receiver_name": receiver.name,
+        "receiver_phone": receiver.phone,
+        "total_installments": total_installments,
+        "completed_installments": completed_installments,
+        "pending_installments": receiver.pending_installments,
+        "failed_installments": receiver.failed_installments,
+        "total_amount": str(receiver.amount_per_installment * total_installments),
+        "completed_amount": str(receiver.amount_per_installment * completed_installments),
+        "progress_percentage": round((completed_installments / total_installments) * 100, 2) if total_installments > 0 else 0,
+        "transactions": transactions,
+    }
+
+
+def receivers_progress(receivers):
+    """
+    Progress rows for receivers that were loaded through
+    ``annotate_progress_counts`` (one more query for all their transactions).
+    """
+    receivers = list(receivers)
+    transactions = _transactions_by_receiver([receiver.id for receiver in receivers])
+    return [progress_row(receiver, transactions[receiver.id]) for receiver in receivers]
+
+
+def progress_for_receiver_ids(receiver_ids):
+    """Progress for the given receivers in request order; unknown ids are returned separately"""
+    receivers = {
+        receiver.id: receiver
+        for receiver in annotate_progress_counts(MobileReceiver.objects.filter(id__in=receiver_ids))
+    }
+    found = [receivers[receiver_id] for receiver_id in receiver_ids if receiver_id in receivers]
+    missing = [receiver_id for receiver_id in receiver_ids if receiver_id not in receivers]
+    return receivers_progress(found), missing
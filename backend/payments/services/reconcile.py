@@ -0,0 +1,139 @@
+# services/reconcile.py
+"""
+Repair of mobile transactions whose settlement webhook never arrived.
+
+Transactions still pending/processing some time after they were sent are
+found through the (status, sent_at) index, their status is fetched from
+Bitnob by a small thread pool (every request waits on the shared
+status-query rate limiter), and the settled ones are applied exactly like
+webhooks, so the transition rules, schedule recomputation, cache
+invalidation and SSE events are the same.
+
+A payout claims its installment with a pending row before it asks Bitnob
+for an invoice, and saves the reference only once the invoice returns. If
+the request dies in between, the row has nothing to query Bitnob with and
+would block the receiver for ever, so in-flight rows without a reference
+past the same cutoff are released: moved to ``cancelled`` with one
+conditional UPDATE per status, logged and announced like any transition.
+"""
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from payments import events
+from payments.cache import invalidate_schedule
+from payments.memo import invalidate
+from payments.models import MobileReceiver, MobileTransaction, PaymentSchedule, bump_schedule_version, record_transitions
+from payments.services.bitnob import get_mobile_payment_status
+from payments.transitions import transition_rows
+from payments.webhooks import apply_payloads
+
+logger = logging.getLogger(__name__)
+
+
+def stuck_transactions(stuck_after=None):
+    """In-flight transactions sent more than ``stuck_after`` ago, oldest first"""
+    if stuck_after is None:
+        stuck_after = timedelta(minutes=settings.RECONCILE_STUCK_AFTER_MINUTES)
+    return (
+        MobileTransaction.objects
+        .filter(status__in=MobileTransaction.IN_FLIGHT_STATUSES, sent_at__lt=timezone.now() - stuck_after)
+        .order_by('sent_at')
+    )
+
+
+def find_stuck_references(limit, stuck_after=None):
+    """References of stuck transactions, oldest first"""
+    return list(
+        stuck_transactions(stuck_after).exclude(reference__isnull=True).values_list('reference', flat=True)[:limit]
+    )
+
+
+def release_orphaned_claims(limit, stuck_after=None):
+    """
+    Cancel up to ``limit`` stuck transactions that never got a Bitnob
+    reference, freeing their receivers. Returns the released rows; rows
+    a payout or webhook moved in the meantime are left alone.
+    """
+    claims = list(stuck_transactions(stuck_after).filter(reference__isnull=True).select_related('receiver')[:limit])
+    if not claims:
+        return []
+    now = timezone.now()
+    changes = {"updated_at": now, "failure_reason": "Released: no Bitnob reference was saved for this payout"}
+    released = []
+    with transaction.atomic():
+        for status in MobileTransaction.IN_FLIGHT_STATUSES:
+            rows = [row for row in claims if row.status == status]
+            if rows:
+                moved = transition_rows(MobileTransaction, "cancelled", [row.pk for row in rows], status, changes)
+                released.extend((row, status) for row in rows if row.pk in moved)
+        for row, _ in released:
+            row.status, row.updated_at, row.failure_reason = "cancelled", now, changes["failure_reason"]
+        record_transitions(released, now)
+
+    schedules = {row.receiver.payment_schedule_id: row.receiver.customer_id for row, _ in released}
+    for row, _ in released:
+        invalidate(MobileReceiver, row.receiver_id)
+    for schedule_id in schedules:
+        invalidate(PaymentSchedule, schedule_id)
+    bump_schedule_version(*schedules)
+    for schedule_id, customer_id in schedules.items():
+        invalidate_schedule(schedule_id, customer_id)
+    for row, old_status in released:
+        events.publish_transaction_status(row, old_status)
+    if released:
+        logger.warning(f"Released {len(released)} payout claims that never got a Bitnob reference")
+    return [row for row, _ in released]
+
+
+def reconcile_stuck_transactions(limit=None, workers=None, stuck_after=None):
+    """
+    Release stuck claims without a reference, then check up to ``limit``
+    stuck transactions with Bitnob and apply the settled ones
+    """
+    start = time.perf_counter()
+    limit = limit or settings.RECONCILE_BATCH_SIZE
+    workers = workers or settings.RECONCILE_WORKERS
+    released = release_orphaned_claims(limit, stuck_after)
+    references = find_stuck_references(limit, stuck_after)
+
+    counts = Counter()
+    payloads = []
+    if references:
+        # Threads only talk to Bitnob; all database work stays on this thread
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(get_mobile_payment_status, references))
+        for reference, result in zip(references, results):
+            if result["error"]:
+                counts["errors"] += 1
+            elif not result["found"]:
+                counts["not_found"] += 1
+            elif result["status"] is None:
+                counts["still_in_flight"] += 1
+            else:
+                payloads.append({
+                    "event": f"mobilepayment.settlement.{result['status']}",
+                    "reference": reference,
+                    "message": f"Reconciled: {result['message'] or result['provider_status']}",
+                })
+
+    outcomes = Counter(apply_payloads(payloads)) if payloads else Counter()
+    summary = {
+        "checked": len(references),
+        "repaired": outcomes["processed"],
+        "unchanged": outcomes["ignored"] + outcomes["retry"],
+        "still_in_flight": counts["still_in_flight"],
+        "not_found": counts["not_found"],
+        "errors": counts["errors"],
+        "released": len(released),
+        "duration_seconds": round(time.perf_counter() - start, 3),
+    }
+    if references or released:
+        logger.info(f"Reconciled stuck transactions: {summary}")
+    return summary
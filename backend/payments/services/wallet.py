@@ -0,0 +1,124 @@
+# services/wallet.py
+"""
+Customer-level pooled funding.
+
+Instead of funding each schedule with its own USDT deposit, a customer can
+top up one wallet with a single deposit: a FundTransaction that belongs to
+the wallet rather than a schedule. The webhook marks it paid like any other
+deposit, and apply_funding_changes credits the wallet.
+
+When payouts run, active schedules that are not funded draw their shortfall
+from their customer's wallet. Per wallet that is three statements however
+many schedules it funds: a conditional UPDATE that debits the balance only
+if it still covers the total, one INSERT of the ledger entries and one
+conditional UPDATE adding each schedule's share to its funded total only
+if the schedule is still short by exactly that share, all in one database
+transaction that is rolled back if either condition fails.
+
+Only whole shortfalls are allocated, earliest due first. A partly funded
+schedule still cannot pay out, so the money does more good left in the
+wallet for the next schedule.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from payments import events
+from payments.cache import invalidate_schedule
+from payments.models import PaymentSchedule, CustomerWallet, WalletLedgerEntry, add_schedule_funding, per_row
+from payments.money import Money
+
+logger = logging.getLogger(__name__)
+
+
+def get_wallet(customer_id):
+    wallet, _ = CustomerWallet.objects.get_or_create(customer_id=customer_id)
+    return wallet
+
+
+def allocation_candidates(**lookup):
+    """
+    Active unfunded schedules whose customer's wallet has a balance, earliest
+    due first, as (schedule id, wallet id, wallet balance, shortfall) rows
+    """
+    return (
+        PaymentSchedule.objects
+        .filter(status='active', is_funded=False, customer__wallet__balance_minor__gt=0, **lookup)
+        .annotate(shortfall=F('total_minor') - F('funded_amount_minor'))
+        .order_by('next_payment_date', 'created_at')
+        .values_list('pk', 'customer__wallet__id', 'customer__wallet__balance_minor', 'shortfall')
+    )
+
+
+def plan_allocations(candidates):
+    """{wallet id: {schedule id: amount}}, filling whole shortfalls until each balance runs out"""
+    plans, remaining = {}, {}
+    for schedule_id, wallet_id, balance, shortfall in candidates:
+        remaining.setdefault(wallet_id, balance)
+        if 0 < shortfall <= remaining[wallet_id]:
+            plans.setdefault(wallet_id, {})[schedule_id] = shortfall
+            remaining[wallet_id] -= shortfall
+    return plans
+
+
+def allocate(wallet_id, allocations):
+    """
+    Move ``{schedule id: amount}`` from the wallet to the schedules. Returns
+    False, changing nothing, if the balance no longer covers the total or a
+    schedule's shortfall is no longer its amount (a deposit or another
+    allocation funded it since the plan was made).
+    """
+    total = sum(allocations.values())
+    now = timezone.now()
+    with transaction.atomic():
+        debited = CustomerWallet.objects.filter(pk=wallet_id, balance_minor__gte=total).update(
+            balance_minor=F('balance_minor') - total, updated_at=now
+        )
+        if not debited:
+            return False
+        WalletLedgerEntry.objects.bulk_create([
+            WalletLedgerEntry(wallet_id=wallet_id, kind="allocation", amount_minor=-amount,
+                              schedule_id=schedule_id, created_at=now)
+            for schedule_id, amount in allocations.items()
+        ])
+        funded = add_schedule_funding(
+            allocations, is_funded=False, funded_amount_minor=F('total_minor') - per_row(allocations)
+        )
+        if funded != len(allocations):
+            transaction.set_rollback(True)
+            return False
+    return True
+
+
+def allocate_wallet_funding(**lookup):
+    """
+    Fund the unfunded active schedules (narrowed by ``lookup``) that their
+    customers' wallets can cover. Returns a summary of the run.
+    """
+    plans = plan_allocations(allocation_candidates(**lookup))
+    funded, conflicts = {}, 0
+    for wallet_id, allocations in plans.items():
+        if allocate(wallet_id, allocations):
+            funded.update(allocations)
+        else:
+            # Spent or funded concurrently; the next run plans against the new state
+            conflicts += 1
+
+    if funded:
+        schedules = PaymentSchedule.objects.filter(pk__in=list(funded)).values_list(
+            'pk', 'customer_id', 'currency', 'is_funded'
+        )
+        for schedule_id, customer_id, currency, is_funded in schedules:
+            invalidate_schedule(schedule_id, customer_id)
+            events.publish_wallet_allocation(
+                schedule_id, customer_id, Money(funded[schedule_id], currency).amount, is_funded
+            )
+        logger.info(f"Allocated wallet funds to {len(funded)} schedules from {len(plans) - conflicts} wallets")
+    return {
+        "schedules_funded": len(funded),
+        "allocated_minor": sum(funded.values()),
+        "wallets": len(plans) - conflicts,
+        "conflicts": conflicts,
+    }
@@ -1,3 +1,830 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.apps import apps
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from payments import transitions, webhooks
+from payments.models import (
+    BitnobCustomer, PaymentSchedule, MobileReceiver, MobileTransaction, FundTransaction, TransactionTransition,
+    CustomerWallet, WebhookInbox, ArchivedPaymentSchedule, record_transitions,
+)
+from payments.cache import cache_stats
+from payments.memo import memo_scope
+from payments.money import Money, to_major, to_minor
+from payments.pagination import encode_cursor
+from payments.ratelimit import TokenBucket
+from payments.services import bitnob
+from payments.services.archive import ARCHIVE_PLAN, archive_finished_schedules
+from payments.services.expiry import expire_stale_fund_transactions
+from payments.services.reconcile import reconcile_stuck_transactions
+from payments.services import wallet as wallet_service
+from payments.transitions import transition_instance, transition_rows
+
+
+def make_schedule(total_amount=100):
+    customer = BitnobCustomer.objects.create(
+        email=f"{uuid.uuid4().hex[:8]}@example.com", first_name="Test", last_name="Customer",
+        phone="700000000", country_code="256", bitnob_id=uuid.uuid4().hex,
+    )
+    schedule = PaymentSchedule.objects.create(
+        customer=customer, title="Test plan", subtotal_amount=total_amount, processing_fee=0, total_amount=total_amount,
+    )
+    return customer, schedule
+
+
+def make_receiver(customer, schedule, phone="771000000", amount=100, installments=1):
+    return MobileReceiver.objects.create(
+        payment_schedule=schedule, customer=customer, name="Receiver", phone=phone,
+        country_code="256", amount_per_installment=amount, number_of_installments=installments,
+    )
+
+
+def racing_transition_rows(concurrent_change):
+    """transition_rows that lets another actor change the rows first, as a concurrent worker would"""
+    def run(*args, **kwargs):
+        concurrent_change()
+        return transition_rows(*args, **kwargs)
+    return run
+
+
+class CoalescedWebhookRaceTests(TestCase):
+    def enqueue(self, event, reference):
+        return webhooks.enqueue({"id": uuid.uuid4().hex, "event": event, "reference": reference})
+
+    def test_row_settled_concurrently_is_not_applied_twice(self):
+        customer, schedule = make_schedule()
+        receiver = MobileReceiver.objects.create(
+            payment_schedule=schedule, customer=customer, name="Receiver", phone="771000000",
+            country_code="256", amount_per_installment=100, number_of_installments=1,
+        )
+        txn = MobileTransaction.objects.create(
+            receiver=receiver, amount=100, installment_number=1, status="processing", reference="ref-mobile",
+        )
+        entry = self.enqueue("mobilepayment.settlement.success", txn.reference)
+
+        def settle():
+            transition_instance(MobileTransaction.objects.get(pk=txn.pk), "success")
+
+        with mock.patch("payments.webhooks.transition_rows", side_effect=racing_transition_rows(settle)):
+            results = webhooks.apply_coalesced([entry])
+
+        self.assertEqual(results[entry.id], ("ignored", None))
+        self.assertEqual(
+            TransactionTransition.objects.filter(kind="mobile", transaction_id=str(txn.pk), to_status="success").count(), 1
+        )
+
+    def test_deposit_confirmed_concurrently_is_credited_once(self):
+        customer, schedule = make_schedule(total_amount=100)
+        fund_txn = FundTransaction.objects.create(schedule=schedule, reference="ref-fund", amount=100)
+        entry = self.enqueue("stablecoin.deposit.confirmed", fund_txn.reference)
+
+        def confirm():
+            transition_instance(FundTransaction.objects.get(pk=fund_txn.pk), "paid")
+
+        with mock.patch("payments.webhooks.transition_rows", side_effect=racing_transition_rows(confirm)):
+            results = webhooks.apply_coalesced([entry])
+
+        self.assertEqual(results[entry.id], ("ignored", None))
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.funded_amount_minor, fund_txn.amount_minor)
+        self.assertTrue(schedule.is_funded)
+        self.assertEqual(
+            TransactionTransition.objects.filter(kind="fund", transaction_id=str(fund_txn.pk), to_status="paid").count(), 1
+        )
+
+    def test_wallet_top_up_confirmed_concurrently_is_credited_once(self):
+        customer, _ = make_schedule()
+        wallet = CustomerWallet.objects.create(customer=customer)
+        fund_txn = FundTransaction.objects.create(wallet=wallet, reference="ref-wallet", amount=250)
+        entry = self.enqueue("stablecoin.deposit.confirmed", fund_txn.reference)
+
+        def confirm():
+            transition_instance(FundTransaction.objects.get(pk=fund_txn.pk), "paid")
+
+        with mock.patch("payments.webhooks.transition_rows", side_effect=racing_transition_rows(confirm)):
+            results = webhooks.apply_coalesced([entry])
+
+        self.assertEqual(results[entry.id], ("ignored", None))
+        wallet.refresh_from_db()
+        self.assertEqual(wallet.balance_minor, fund_txn.amount_minor)
+        self.assertEqual(wallet.ledger_entries.filter(kind="deposit").count(), 1)
+
+
+class FundExpiryTests(TestCase):
+    def test_quote_paid_during_the_sweep_is_not_logged_as_expired(self):
+        _, schedule = make_schedule()
+        stale = [
+            FundTransaction.objects.create(schedule=schedule, reference=f"ref-stale-{i}", amount=10) for i in range(2)
+        ]
+        FundTransaction.objects.filter(schedule=schedule).update(created_at=timezone.now() - timedelta(days=1))
+        paid = stale[0]
+
+        def confirm():
+            transition_instance(FundTransaction.objects.get(pk=paid.pk), "paid")
+
+        with mock.patch("payments.services.expiry.transition_rows", side_effect=racing_transition_rows(confirm)):
+            summary = expire_stale_fund_transactions(batch_size=10)
+
+        self.assertEqual(summary["expired"], 1)
+        self.assertEqual(FundTransaction.objects.get(pk=paid.pk).status, "paid")
+        self.assertEqual(FundTransaction.objects.get(pk=stale[1].pk).status, "expired")
+        self.assertFalse(
+            TransactionTransition.objects.filter(transaction_id=str(paid.pk), to_status="expired").exists()
+        )
+
+
+class WebhookEventKeyTests(TestCase):
+    def test_later_event_for_the_same_provider_id_is_not_a_duplicate(self):
+        processing = {"id": "txn-1", "event": "mobilepayment.settlement.pending", "reference": "ref-1", "status": "processing"}
+        success = {"id": "txn-1", "event": "mobilepayment.settlement.success", "reference": "ref-1", "status": "success"}
+
+        self.assertNotEqual(webhooks.event_key(processing), webhooks.event_key(success))
+        self.assertIsNotNone(webhooks.enqueue(processing))
+        self.assertIsNotNone(webhooks.enqueue(success))
+        self.assertIsNone(webhooks.enqueue(dict(success)))
+
+    def test_long_provider_ids_fit_the_key_column(self):
+        key = webhooks.event_key({"id": "x" * 200, "event": "mobilepayment.settlement.success"})
+        self.assertLessEqual(len(key), 128)
+        self.assertTrue(key.startswith("id:sha256:"))
+
+
+class ExportFilterTests(TestCase):
+    def test_impossible_dates_are_rejected_with_400(self):
+        for params in ({"from": "2026-13-45"}, {"to": "2026-01-01T25:00"}, {"from": "2026-02-30T10:00:00"}):
+            response = self.client.get("/api/exports/transactions/", params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class CursorTests(TestCase):
+    def test_cursor_with_a_number_for_the_uuid_is_rejected_with_400(self):
+        cursor = encode_cursor(["2026-01-01T00:00:00", 5])
+        response = self.client.get("/api/payment-schedules/", {"cursor": cursor})
+        self.assertEqual(response.status_code, 400)
+
+        cursor = encode_cursor({"schedules": ["2026-01-01T00:00:00+00:00", 5]})
+        response = self.client.get("/api/changes/", {"since": cursor})
+        self.assertEqual(response.status_code, 400)
+
+    def test_receivers_cursor_with_a_non_integer_id_is_rejected_with_400(self):
+        _, schedule = make_schedule()
+        for key in (["abc"], [{"id": 1}], [[1]]):
+            response = self.client.get(f"/api/payment-schedules/{schedule.pk}/", {"receivers_cursor": encode_cursor(key)})
+            self.assertEqual(response.status_code, 400, key)
+
+    def test_receiver_progress_cursor_with_a_non_integer_id_is_rejected_with_400(self):
+        _, schedule = make_schedule()
+        for key in (["abc"], [{"id": 1}], [[1]]):
+            response = self.client.get("/api/receiver-progress/", {"schedule_id": schedule.pk, "cursor": encode_cursor(key)})
+            self.assertEqual(response.status_code, 400, key)
+
+
+INVOICE = {
+    "success": True, "id": "inv-1", "reference": "ref-payout",
+    "response": {"data": {"paymentRequest": "lnbc1"}},
+}
+
+
+class PayoutClaimTests(TestCase):
+    def setUp(self):
+        lookup = mock.patch("payments.views.lookup_mobile", return_value={"status": True})
+        lookup.start()
+        self.addCleanup(lookup.stop)
+        customer, self.schedule = make_schedule(total_amount=100)
+        PaymentSchedule.objects.filter(pk=self.schedule.pk).update(
+            funded_amount_minor=10000, is_funded=True, next_payment_date=timezone.now() - timedelta(minutes=1),
+        )
+        self.receiver = make_receiver(customer, self.schedule, amount=50, installments=2)
+
+    def payout(self):
+        return self.client.post(
+            "/api/initiate-payout/", {"receiverId": self.receiver.pk, "senderName": "Sender"}, content_type="application/json"
+        )
+
+    def test_reference_is_saved_before_the_payment_is_sent(self):
+        def pay(customer_email, reference, invoice_id, wallet):
+            self.assertEqual(MobileTransaction.objects.get(receiver=self.receiver).reference, reference)
+            return {"status": True}
+
+        with mock.patch("payments.views.request_mobile_invoice", return_value=INVOICE), \
+                mock.patch("payments.views.pay_mobile_invoice", side_effect=pay):
+            response = self.payout()
+
+        self.assertEqual(response.status_code, 201)
+        txn = MobileTransaction.objects.get(receiver=self.receiver)
+        self.assertEqual((txn.status, txn.reference), ("processing", "ref-payout"))
+        self.assertEqual(
+            list(TransactionTransition.objects.filter(transaction_id=str(txn.pk)).order_by('id')
+                 .values_list('from_status', 'to_status')),
+            [("", "pending"), ("pending", "processing")],
+        )
+
+    def test_failed_invoice_releases_the_claim_through_the_state_machine(self):
+        with mock.patch("payments.views.request_mobile_invoice", return_value={"success": False, "error": "down"}):
+            response = self.payout()
+
+        self.assertEqual(response.status_code, 400)
+        txn = MobileTransaction.objects.get(receiver=self.receiver)
+        self.assertEqual(txn.status, "cancelled")
+        self.assertTrue(
+            TransactionTransition.objects.filter(transaction_id=str(txn.pk), from_status="pending", to_status="cancelled").exists()
+        )
+        # The receiver is no longer blocked
+        with mock.patch("payments.views.request_mobile_invoice", return_value=INVOICE), \
+                mock.patch("payments.views.pay_mobile_invoice", return_value={"status": False, "message": "no funds"}):
+            response = self.payout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            MobileTransaction.objects.get(reference="ref-payout").failure_reason, "no funds"
+        )
+
+    def test_claim_released_meanwhile_is_not_paid(self):
+        def invoice(*args, **kwargs):
+            MobileTransaction.objects.filter(receiver=self.receiver).update(status="cancelled")
+            return INVOICE
+
+        with mock.patch("payments.views.request_mobile_invoice", side_effect=invoice), \
+                mock.patch("payments.views.pay_mobile_invoice") as pay:
+            response = self.payout()
+
+        self.assertEqual(response.status_code, 409)
+        pay.assert_not_called()
+
+
+class ReconcilerTests(TestCase):
+    def setUp(self):
+        customer, self.schedule = make_schedule()
+        self.receiver = make_receiver(customer, self.schedule, installments=3)
+
+    def claim(self, sent_minutes_ago, **fields):
+        return MobileTransaction.objects.create(
+            receiver=self.receiver, amount=100, installment_number=self.receiver.next_installment(),
+            sent_at=timezone.now() - timedelta(minutes=sent_minutes_ago), **fields,
+        )
+
+    def test_claim_without_a_reference_is_released(self):
+        orphan = self.claim(sent_minutes_ago=60)
+
+        with mock.patch("payments.services.reconcile.get_mobile_payment_status") as status, \
+                self.assertLogs("payments.services.reconcile", "WARNING"):
+            summary = reconcile_stuck_transactions()
+
+        status.assert_not_called()
+        self.assertEqual((summary["released"], summary["checked"]), (1, 0))
+        orphan.refresh_from_db()
+        self.assertEqual(orphan.status, "cancelled")
+        self.assertTrue(
+            TransactionTransition.objects.filter(transaction_id=str(orphan.pk), from_status="pending", to_status="cancelled").exists()
+        )
+        # The receiver can be paid again
+        self.claim(sent_minutes_ago=0)
+
+    def status(self, **result):
+        return {"found": True, "error": False, "status": None, "provider_status": "pending", "message": "", **result}
+
+    def test_settled_payment_is_applied_like_a_webhook(self):
+        txn = self.claim(sent_minutes_ago=60, reference="ref-stuck", status="processing")
+
+        with mock.patch("payments.services.reconcile.get_mobile_payment_status",
+                        return_value=self.status(status="success", provider_status="successful")):
+            summary = reconcile_stuck_transactions()
+
+        self.assertEqual((summary["checked"], summary["repaired"]), (1, 1))
+        txn.refresh_from_db()
+        self.assertEqual(txn.status, "success")
+        self.assertIsNotNone(txn.completed_at)
+
+    def test_outage_is_reported_as_errors_not_as_missing_payments(self):
+        txn = self.claim(sent_minutes_ago=60, reference="ref-stuck", status="processing")
+
+        with mock.patch("payments.services.reconcile.get_mobile_payment_status",
+                        return_value=self.status(found=False, error=True, provider_status=None)):
+            summary = reconcile_stuck_transactions()
+
+        self.assertEqual((summary["errors"], summary["not_found"], summary["repaired"]), (1, 0, 0))
+        self.assertEqual(MobileTransaction.objects.get(pk=txn.pk).status, "processing")
+
+    def test_recent_claim_is_left_to_its_payout(self):
+        claim = self.claim(sent_minutes_ago=1)
+
+        summary = reconcile_stuck_transactions()
+
+        self.assertEqual(summary["released"], 0)
+        self.assertEqual(MobileTransaction.objects.get(pk=claim.pk).status, "pending")
+
+
+@mock.patch("payments.services.bitnob.status_query_limiter", TokenBucket(1000, 1000))
+class PaymentStatusQueryTests(TestCase):
+    def get(self, **response):
+        with mock.patch("payments.services.bitnob.requests.get", **response):
+            return bitnob.get_mobile_payment_status("ref-1")
+
+    def response(self, status_code=200, body=None):
+        res = mock.Mock(status_code=status_code)
+        res.json.side_effect = ValueError("Expecting value") if body is None else None
+        res.json.return_value = body
+        return res
+
+    def test_settled_payment(self):
+        result = self.get(return_value=self.response(body={"status": True, "data": {"status": "SUCCESSFUL"}}))
+        self.assertEqual((result["found"], result["error"], result["status"]), (True, False, "success"))
+
+    def test_unknown_payment_is_not_found(self):
+        result = self.get(return_value=self.response(status_code=404))
+        self.assertEqual((result["found"], result["error"]), (False, False))
+
+    def test_outages_are_errors(self):
+        for response in (
+            {"side_effect": requests.exceptions.ConnectionError("refused")},
+            {"side_effect": requests.exceptions.Timeout("timed out")},
+            {"return_value": self.response(body=None)},
+            {"return_value": self.response(status_code=502, body={"status": False})},
+        ):
+            result = self.get(**response)
+            self.assertEqual((result["found"], result["error"]), (False, True), response)
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        clock = mock.patch("payments.ratelimit.time")
+        self.time = clock.start()
+        self.addCleanup(clock.stop)
+        self.now = 100.0
+        self.time.monotonic.side_effect = lambda: self.now
+
+        def sleep(seconds):
+            self.now += seconds
+        self.time.sleep.side_effect = sleep
+
+    def test_burst_then_refill_at_the_rate(self):
+        bucket = TokenBucket(rate=2, burst=3)
+        self.assertEqual([bucket.try_acquire() for _ in range(4)], [True, True, True, False])
+        self.now += 0.5
+        self.assertEqual([bucket.try_acquire() for _ in range(2)], [True, False])
+        self.now += 60
+        self.assertEqual(sum(bucket.try_acquire() for _ in range(10)), 3)
+
+    def test_acquire_waits_for_the_next_token(self):
+        bucket = TokenBucket(rate=4, burst=1)
+        self.assertTrue(bucket.acquire())
+        self.assertTrue(bucket.acquire())
+        self.assertAlmostEqual(self.now, 100.25)
+
+    def test_acquire_gives_up_at_the_timeout(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        bucket.acquire()
+        self.assertFalse(bucket.acquire(timeout=0.5))
+        self.time.sleep.assert_not_called()
+
+
+class WalletAllocationTests(TestCase):
+    def setUp(self):
+        self.customer, self.schedule = make_schedule(total_amount=100)
+        self.wallet = CustomerWallet.objects.create(customer=self.customer, balance_minor=50000)
+
+    def test_schedule_funded_after_planning_is_not_allocated_to(self):
+        plans = wallet_service.plan_allocations(wallet_service.allocation_candidates())
+        self.assertEqual(plans, {self.wallet.pk: {self.schedule.pk: 10000}})
+        deposit = FundTransaction.objects.create(schedule=self.schedule, reference="ref-deposit", amount=100)
+        transition_instance(deposit, "paid")
+
+        self.assertFalse(wallet_service.allocate(self.wallet.pk, plans[self.wallet.pk]))
+
+        self.wallet.refresh_from_db()
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.wallet.balance_minor, 50000)
+        self.assertFalse(self.wallet.ledger_entries.exists())
+        self.assertEqual(self.schedule.funded_amount_minor, 10000)
+
+    def test_confirmed_top_up_credits_the_balance_with_a_ledger_entry(self):
+        quote = {"address": "TAddress", "usdt_amount": Decimal("0.75"), "ugx_rate": Decimal("3700")}
+        with mock.patch("payments.views.quote_usdt_deposit", return_value=(quote, None)):
+            response = self.client.post(
+                f"/api/customers/{self.customer.pk}/wallet/fund/", {"amount": "250"}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 201)
+        reference = response.json()["funding_details"]["reference"]
+
+        _, status = webhooks.handle_event({"event": "stablecoin.deposit.confirmed", "reference": reference})
+
+        self.assertEqual(status, 200)
+        wallet = self.client.get(f"/api/customers/{self.customer.pk}/wallet/").json()
+        self.assertEqual(wallet["wallet"]["balance_minor"], 50000 + 25000)
+        self.assertEqual([(entry["kind"], entry["amount_minor"]) for entry in wallet["ledger"]], [("deposit", 25000)])
+        self.assertEqual(wallet["deposits"][0]["status"], "paid")
+
+    def test_whole_shortfalls_are_allocated_earliest_due_first(self):
+        def schedule_due(total_amount, days):
+            _, schedule = make_schedule(total_amount)
+            PaymentSchedule.objects.filter(pk=schedule.pk).update(
+                customer=self.customer, next_payment_date=timezone.now() + timedelta(days=days)
+            )
+            return schedule.pk
+
+        PaymentSchedule.objects.filter(pk=self.schedule.pk).update(next_payment_date=timezone.now() + timedelta(days=2))
+        first, last = schedule_due(450, days=1), schedule_due(40, days=3)
+
+        summary = wallet_service.allocate_wallet_funding()
+
+        # 450 is due first and fits; the 100 due next no longer does, the 40 after it does
+        self.assertEqual((summary["schedules_funded"], summary["allocated_minor"]), (2, 49000))
+        funded = dict(PaymentSchedule.objects.values_list('pk', 'is_funded'))
+        self.assertEqual((funded[first], funded[self.schedule.pk], funded[last]), (True, False, True))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance_minor, 1000)
+        self.assertEqual(
+            sorted(self.wallet.ledger_entries.values_list('schedule_id', 'amount_minor')),
+            sorted([(first, -45000), (last, -4000)]),
+        )
+
+    def test_allocation_lost_to_concurrent_spending_changes_nothing(self):
+        plans = wallet_service.plan_allocations(wallet_service.allocation_candidates())
+        CustomerWallet.objects.filter(pk=self.wallet.pk).update(balance_minor=5000)
+
+        self.assertFalse(wallet_service.allocate(self.wallet.pk, plans[self.wallet.pk]))
+
+        self.wallet.refresh_from_db()
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.wallet.balance_minor, 5000)
+        self.assertFalse(self.wallet.ledger_entries.exists())
+        self.assertEqual((self.schedule.funded_amount_minor, self.schedule.is_funded), (0, False))
+
+    def test_recount_matches_the_incremental_total(self):
+        _, schedule = make_schedule(total_amount=300)
+        PaymentSchedule.objects.filter(pk=schedule.pk).update(customer=self.customer)
+        for index, amount in enumerate((100, 50, 70)):
+            deposit = FundTransaction.objects.create(schedule=schedule, reference=f"ref-{index}", amount=amount)
+            transition_instance(deposit, "paid" if amount != 70 else "failed")
+        wallet_service.allocate_wallet_funding()
+
+        schedule.refresh_from_db()
+        incremental = (schedule.funded_amount_minor, schedule.is_funded)
+        self.assertEqual(incremental, (30000, True))
+        schedule.update_funding_status()
+        schedule.refresh_from_db()
+        self.assertEqual((schedule.funded_amount_minor, schedule.is_funded), incremental)
+
+
+@override_settings(WEBHOOK_PROCESS_INLINE=False, WEBHOOK_INBOX_MAX_ATTEMPTS=3, WEBHOOK_INBOX_RETENTION_DAYS=14)
+class WebhookInboxTests(TestCase):
+    def setUp(self):
+        webhooks.recent_keys.clear()
+        customer, schedule = make_schedule()
+        receiver = make_receiver(customer, schedule)
+        self.txn = MobileTransaction.objects.create(
+            receiver=receiver, amount=100, installment_number=1, status="processing", reference="ref-inbox",
+        )
+
+    def test_webhook_is_acknowledged_then_applied_by_the_drain(self):
+        payload = {"id": "evt-1", "event": "mobilepayment.settlement.success", "reference": self.txn.reference}
+        response = self.client.post("/api/webhook/", payload, content_type="application/json")
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(MobileTransaction.objects.get(pk=self.txn.pk).status, "processing")
+
+        self.assertEqual(webhooks.drain_inbox(), {"processed": 1})
+
+        self.assertEqual(MobileTransaction.objects.get(pk=self.txn.pk).status, "success")
+        entry = WebhookInbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts), ("processed", 1))
+        self.assertIsNotNone(entry.processed_at)
+        # A redelivery is acknowledged without being stored again
+        response = self.client.post("/api/webhook/", payload, content_type="application/json")
+        self.assertEqual(response.json()["status"], "duplicate")
+        self.assertEqual(WebhookInbox.objects.count(), 1)
+
+    def test_entry_that_keeps_failing_is_retried_up_to_the_attempt_limit(self):
+        webhooks.enqueue({"id": "evt-2", "event": "mobilepayment.settlement.success", "reference": "ref-unknown"})
+
+        outcomes = [webhooks.drain_inbox() for _ in range(4)]
+
+        self.assertEqual(outcomes, [{"retry": 1}, {"retry": 1}, {"failed": 1}, {}])
+        entry = WebhookInbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts, entry.last_error), ("failed", 3, "Transaction not found"))
+
+    def test_entry_applies_once_its_transaction_appears(self):
+        webhooks.enqueue({"id": "evt-3", "event": "mobilepayment.settlement.success", "reference": "ref-late"})
+        self.assertEqual(webhooks.drain_inbox(), {"retry": 1})
+
+        MobileTransaction.objects.filter(pk=self.txn.pk).update(reference="ref-late")
+
+        self.assertEqual(webhooks.drain_inbox(), {"processed": 1})
+        self.assertEqual(MobileTransaction.objects.get(pk=self.txn.pk).status, "success")
+        self.assertEqual(WebhookInbox.objects.get().attempts, 2)
+
+    def test_prune_deletes_only_old_settled_entries(self):
+        old = timezone.now() - timedelta(days=15)
+        for index, (status, received_at) in enumerate([
+            ("processed", old), ("ignored", old), ("failed", old), ("pending", old), ("processed", timezone.now()),
+        ]):
+            entry = WebhookInbox.objects.create(
+                event="mobilepayment.settlement.success", reference=f"ref-{index}", payload={}, status=status
+            )
+            WebhookInbox.objects.filter(pk=entry.pk).update(received_at=received_at)
+
+        self.assertEqual(webhooks.prune_inbox(), 2)
+        self.assertEqual(
+            sorted(WebhookInbox.objects.values_list('status', flat=True)), ["failed", "pending", "processed"]
+        )
+
+
+class CoalescedWebhookBatchTests(TestCase):
+    def setUp(self):
+        webhooks.recent_keys.clear()
+        self.customer, self.schedule = make_schedule()
+
+    def burst(self, size):
+        """One processing transaction per receiver of the schedule, each settled by its own queued webhook"""
+        txns = []
+        for index in range(size):
+            receiver = make_receiver(self.customer, self.schedule, phone=f"77{size:02d}{index:05d}")
+            txn = MobileTransaction.objects.create(
+                receiver=receiver, amount=100, installment_number=1, status="processing", reference=f"ref-{size}-{index}",
+            )
+            webhooks.enqueue({"id": uuid.uuid4().hex, "event": "mobilepayment.settlement.success", "reference": txn.reference})
+            txns.append(txn)
+        return txns
+
+    def drain_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            outcomes = webhooks.drain_inbox()
+        return outcomes, len(queries)
+
+    def test_burst_for_one_schedule_runs_in_a_bounded_number_of_queries(self):
+        self.burst(3)
+        small, small_queries = self.drain_queries()
+        txns = self.burst(30)
+        large, large_queries = self.drain_queries()
+
+        self.assertEqual((small, large), ({"processed": 3}, {"processed": 30}))
+        self.assertEqual(large_queries, small_queries)
+        self.assertEqual(MobileTransaction.objects.filter(pk__in=[txn.pk for txn in txns], status="success").count(), 30)
+        self.assertEqual(TransactionTransition.objects.filter(to_status="success").count(), 33)
+
+    def test_entry_refused_by_a_constraint_falls_back_without_losing_the_others(self):
+        txns = self.burst(3)
+        refused = txns[1]
+        transition = transitions.transition
+
+        def constrained(model, new_status, changes=None, **lookup):
+            if refused.pk == lookup.get("pk") or refused.pk in lookup.get("pk__in", ()):
+                raise IntegrityError("CHECK constraint failed")
+            return transition(model, new_status, changes, **lookup)
+
+        with mock.patch("payments.transitions.transition", side_effect=constrained), \
+                self.assertLogs("payments.webhooks", "ERROR"):
+            outcomes = webhooks.drain_inbox()
+
+        self.assertEqual(outcomes, {"processed": 2, "retry": 1})
+        statuses = dict(MobileTransaction.objects.filter(pk__in=[txn.pk for txn in txns]).values_list('pk', 'status'))
+        self.assertEqual(statuses, {txns[0].pk: "success", refused.pk: "processing", txns[2].pk: "success"})
+        entry = WebhookInbox.objects.get(reference=refused.reference)
+        self.assertEqual((entry.status, entry.attempts), ("pending", 1))
+        self.assertIn("CHECK constraint failed", entry.last_error)
+
+
+# Commit hooks run here; keep the SSE events they publish in process
+@override_settings(PAYMENT_EVENTS_BACKEND="memory")
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer, self.schedule = make_schedule()
+        self.receiver = make_receiver(self.customer, self.schedule)
+
+    def list_titles(self):
+        response = self.client.get("/api/payment-schedules/", {"customer_email": self.customer.email})
+        return [schedule["title"] for schedule in response.json()["payment_schedules"]]
+
+    def test_listing_is_served_from_the_cache_until_a_write(self):
+        self.assertEqual(self.list_titles(), ["Test plan"])
+        self.assertEqual(self.list_titles(), ["Test plan"])
+        self.assertEqual(cache_stats()["schedule-list"]["hits"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/api/payment-schedules/{self.schedule.pk}/", {"title": "Renamed"}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.list_titles(), ["Renamed"])
+
+    def test_settlement_after_a_cached_get_is_visible(self):
+        txn = MobileTransaction.objects.create(
+            receiver=self.receiver, amount=100, installment_number=1, status="processing", reference="ref-cached",
+        )
+
+        def progress():
+            return self.client.get(f"/api/receiver-progress/{self.receiver.pk}/").json()
+
+        before = progress()
+        self.assertEqual(progress(), before)
+        self.assertEqual(cache_stats()["receiver-progress"]["hits"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            webhooks.handle_event({"event": "mobilepayment.settlement.success", "reference": txn.reference})
+
+        self.assertNotEqual(progress(), before)
+        self.assertEqual(cache_stats()["receiver-progress"]["hits"], 1)
+
+
+class MoneyTests(TestCase):
+    def test_to_minor_rounds_half_up(self):
+        cases = [
+            ("1.005", 101), ("1.004", 100), ("-1.005", -101), ("0.125", 13),
+            (Decimal("2500"), 250000), (7, 700), (0.1, 10), (19.99, 1999), (None, 0),
+        ]
+        for amount, minor in cases:
+            self.assertEqual(to_minor(amount), minor, amount)
+
+    def test_to_major_is_two_decimal_places(self):
+        self.assertEqual(to_major(101), Decimal("1.01"))
+        self.assertEqual(to_major(-5), Decimal("-0.05"))
+        self.assertEqual(str(to_major(None)), "0.00")
+        self.assertEqual(to_major(to_minor("123.45")), Decimal("123.45"))
+
+    def test_arithmetic_keeps_the_currency(self):
+        ugx, kes = Money(150), Money(150, "KES")
+        self.assertEqual(ugx + Money(50), Money(200))
+        self.assertEqual(sum([ugx, Money(50)]), Money(200))
+        self.assertEqual(Money.from_major("1.50") * 3, Money(450))
+        self.assertTrue(Money(1) < ugx <= Money(150))
+        self.assertEqual(str(ugx - Money(200)), "-0.50")
+        for operation in (lambda: ugx + kes, lambda: ugx - kes, lambda: ugx < kes):
+            self.assertRaises(ValueError, operation)
+        self.assertRaises(TypeError, lambda: ugx * Decimal("1.5"))
+
+    def test_processing_fee_is_one_and_a_half_percent_rounded_half_up(self):
+        cases = [(10000, 150), (100, 2), (33, 0), (34, 1), (99, 1), (0, 0), (123456789, 1851852)]
+        for minor, fee in cases:
+            self.assertEqual(Money(minor, "KES").processing_fee(), Money(fee, "KES"), minor)
+
+    def test_saving_derives_minor_units_from_the_decimal_amounts(self):
+        customer, schedule = make_schedule(total_amount=Decimal("1015.50"))
+        receiver = make_receiver(customer, schedule, amount=Decimal("0.05"))
+        self.assertEqual(PaymentSchedule.objects.values_list('total_minor', 'subtotal_minor').get(pk=schedule.pk), (101550, 101550))
+        self.assertEqual(MobileReceiver.objects.values_list('amount_per_installment_minor', flat=True).get(pk=receiver.pk), 5)
+
+    def test_migrations_convert_like_the_app(self):
+        for name in ("0012_money_minor_units", "0023_archive_money_minor_units"):
+            frozen = import_module(f"payments.migrations.{name}").to_minor
+            for amount in ("1.005", "-1.005", Decimal("0.125"), 19.99, 7, None):
+                self.assertEqual(frozen(amount), to_minor(amount), (name, amount))
+
+    def test_backfill_fills_the_minor_unit_columns(self):
+        customer, schedule = make_schedule(total_amount=Decimal("250.25"))
+        receiver = make_receiver(customer, schedule, amount=Decimal("12.50"), installments=2)
+        txn = MobileTransaction.objects.create(receiver=receiver, amount=Decimal("12.50"), installment_number=1)
+        deposit = FundTransaction.objects.create(schedule=schedule, reference="ref-backfill", amount=Decimal("250.25"))
+        PaymentSchedule.objects.update(subtotal_minor=0, processing_fee_minor=0, total_minor=0)
+        MobileReceiver.objects.update(amount_per_installment_minor=0)
+        MobileTransaction.objects.update(amount_minor=0)
+        FundTransaction.objects.update(amount_minor=0)
+
+        import_module("payments.migrations.0012_money_minor_units").populate_minor_units(apps, None)
+
+        self.assertEqual(PaymentSchedule.objects.values_list('total_minor', flat=True).get(pk=schedule.pk), 25025)
+        self.assertEqual(MobileReceiver.objects.values_list('amount_per_installment_minor', flat=True).get(pk=receiver.pk), 1250)
+        self.assertEqual(MobileTransaction.objects.values_list('amount_minor', flat=True).get(pk=txn.pk), 1250)
+        self.assertEqual(FundTransaction.objects.values_list('amount_minor', flat=True).get(pk=deposit.pk), 25025)
+
+    def test_archive_tables_keep_every_money_column(self):
+        for hot_model, archive_model, _ in ARCHIVE_PLAN:
+            money_columns = {
+                field.attname for field in hot_model._meta.concrete_fields
+                if field.attname.endswith('_minor') or field.attname == 'currency'
+            }
+            archived = {field.attname for field in archive_model._meta.concrete_fields}
+            self.assertEqual(money_columns - archived, set(), archive_model.__name__)
+
+
+class ArchiveTests(TestCase):
+    def finished_schedule(self, days_ago=120):
+        customer, schedule = make_schedule(total_amount=100)
+        receiver = make_receiver(customer, schedule, amount=50, installments=2)
+        for installment in (1, 2):
+            MobileTransaction.objects.create(
+                receiver=receiver, amount=50, installment_number=installment, status="success",
+                reference=f"ref-{schedule.pk}-{installment}",
+            )
+        deposit = FundTransaction.objects.create(schedule=schedule, reference=f"ref-{schedule.pk}-fund", amount=100)
+        transition_instance(deposit, "paid")
+        PaymentSchedule.objects.filter(pk=schedule.pk).update(
+            status="completed", updated_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return schedule
+
+    def test_archived_schedule_is_served_read_only_by_the_detail_view(self):
+        schedule = self.finished_schedule()
+        recent = self.finished_schedule(days_ago=1)
+
+        summary = archive_finished_schedules(retention_days=90)
+
+        self.assertEqual(summary["archived"], {
+            "PaymentSchedule": 1, "MobileReceiver": 1, "MobileTransaction": 2, "FundTransaction": 1,
+        })
+        self.assertFalse(PaymentSchedule.objects.filter(pk=schedule.pk).exists())
+        self.assertFalse(MobileTransaction.objects.filter(receiver__payment_schedule_id=schedule.pk).exists())
+        self.assertTrue(PaymentSchedule.objects.filter(pk=recent.pk).exists())
+        self.assertEqual(
+            ArchivedPaymentSchedule.objects.values_list('currency', 'total_minor', 'funded_amount_minor').get(pk=schedule.pk),
+            ("UGX", 10000, 10000),
+        )
+
+        response = self.client.get(f"/api/payment-schedules/{schedule.pk}/")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body["archived"])
+        self.assertEqual(
+            (body["payment_schedule"]["id"], body["payment_schedule"]["status"], body["payment_schedule"]["total_amount"]),
+            (str(schedule.pk), "completed", "100.00"),
+        )
+        [receiver] = body["receivers"]
+        self.assertEqual((receiver["completed_installments"], receiver["progress_percentage"]), (2, 100.0))
+        self.assertEqual(
+            [(txn["installment_number"], txn["status"], txn["reference"]) for txn in receiver["transactions"]],
+            [(1, "success", f"ref-{schedule.pk}-1"), (2, "success", f"ref-{schedule.pk}-2")],
+        )
+
+        response = self.client.patch(
+            f"/api/payment-schedules/{schedule.pk}/", {"title": "Renamed"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 409)
+        response = self.client.patch(
+            f"/api/payment-schedules/{uuid.uuid4()}/", {"title": "Renamed"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_active_schedules_stay_hot(self):
+        schedule = self.finished_schedule()
+        PaymentSchedule.objects.filter(pk=schedule.pk).update(status="active")
+
+        self.assertEqual(archive_finished_schedules(retention_days=90)["chunks"], 0)
+        self.assertTrue(PaymentSchedule.objects.filter(pk=schedule.pk).exists())
+
+
+class MemoTests(TestCase):
+    def setUp(self):
+        customer, self.schedule = make_schedule()
+        self.receivers = [make_receiver(customer, self.schedule, phone=f"77100000{index}") for index in (1, 2)]
+        self.txns = [
+            MobileTransaction.objects.create(
+                receiver=receiver, amount=100, installment_number=1, status="processing", reference=f"ref-memo-{receiver.pk}",
+            )
+            for receiver in self.receivers
+        ]
+
+    def receiver_queries(self, queries):
+        return [query["sql"] for query in queries if 'FROM "payments_mobilereceiver"' in query["sql"]]
+
+    def test_aggregates_are_computed_once_per_scope_and_dropped_on_change(self):
+        with memo_scope():
+            self.assertEqual(PaymentSchedule.objects.get(pk=self.schedule.pk).completed_transactions, 0)
+            schedule = PaymentSchedule.objects.get(pk=self.schedule.pk)
+            first, second = (MobileReceiver.objects.get(pk=receiver.pk) for receiver in self.receivers)
+            self.assertEqual((first.completed_installments, second.completed_installments), (0, 0))
+            with self.assertNumQueries(0):
+                self.assertEqual(schedule.completed_transactions, 0)
+                self.assertEqual(MobileReceiver(pk=first.pk).completed_installments, 0)
+
+            txn = MobileTransaction.objects.get(pk=self.txns[0].pk)
+            txn.status = "success"
+            txn.save()
+            self.assertEqual((schedule.completed_transactions, first.completed_installments), (1, 1))
+
+            webhooks.handle_event({"event": "mobilepayment.settlement.success", "reference": self.txns[1].reference})
+            self.assertEqual((schedule.completed_transactions, second.completed_installments), (2, 1))
+
+    def test_saving_without_the_receiver_loaded_looks_up_only_its_schedule_id(self):
+        txn = MobileTransaction.objects.get(pk=self.txns[0].pk)
+        txn.status = "success"
+        with CaptureQueriesContext(connection) as queries:
+            txn.save()
+
+        [query] = self.receiver_queries(queries)
+        self.assertIn('"payment_schedule_id"', query)
+        self.assertNotIn('"name"', query)
+        self.assertEqual(
+            TransactionTransition.objects.get(transaction_id=str(txn.pk), to_status="success").schedule_id, self.schedule.pk
+        )
+
+    def test_logging_many_transitions_looks_up_their_schedules_in_one_query(self):
+        txns = list(MobileTransaction.objects.filter(pk__in=[txn.pk for txn in self.txns]))
+        for txn in txns:
+            txn.status = "success"
+        with CaptureQueriesContext(connection) as queries:
+            record_transitions([(txn, "processing") for txn in txns])
+
+        self.assertEqual(len(self.receiver_queries(queries)), 1)
+        self.assertEqual(
+            list(TransactionTransition.objects.filter(to_status="success").values_list('schedule_id', flat=True)),
+            [self.schedule.pk, self.schedule.pk],
+        )
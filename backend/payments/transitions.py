@@ -0,0 +1,135 @@
+# transitions.py
+"""
+Allowed status transitions of MobileTransaction and FundTransaction.
+
+A transition is applied as one conditional statement,
+``UPDATE ... SET status = <new> WHERE <lookup> AND status IN (<allowed
+predecessors>)``, and the rowcount says whether it happened. Nothing is read
+first and only the changed columns are written, and a late or out-of-order
+event (a ``pending`` after a ``success``) cannot move a row backwards, even
+when several workers handle events for the same row concurrently.
+
+``update()`` bypasses ``save()``: callers bump the schedule version,
+invalidate caches and, for multi-row transitions, log the moved rows with
+``record_transitions`` themselves, usually once for many rows.
+``transition_instance`` logs its row itself.
+
+The TransactionTransition log also answers time-in-state questions; see
+``time_in_status``.
+"""
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from payments.models import MobileTransaction, FundTransaction, TransactionTransition, record_transitions
+
+# model -> {new status: statuses it may be entered from}
+TRANSITIONS = {
+    MobileTransaction: {
+        "processing": {"pending"},
+        "success": {"pending", "processing"},
+        "failed": {"pending", "processing"},
+        "cancelled": {"pending", "processing"},
+    },
+    FundTransaction: {
+        # Money that arrives after the quote lapsed or was reported failed still counts
+        "paid": {"pending", "expired", "failed"},
+        "failed": {"pending"},
+        "expired": {"pending"},
+    },
+}
+
+
+def allowed_from(model, new_status):
+    """Statuses from which ``new_status`` may be entered (empty if it never can, e.g. back to pending)"""
+    return TRANSITIONS[model].get(new_status, set())
+
+
+def can_transition(model, old_status, new_status):
+    return old_status in allowed_from(model, new_status)
+
+
+def transition(model, new_status, changes=None, **lookup):
+    """
+    Move the rows matching ``lookup`` to ``new_status`` where their current
+    status allows it, also writing ``changes``. Returns the number of rows moved.
+    """
+    allowed = allowed_from(model, new_status)
+    if not allowed:
+        return 0
+    # update() skips auto_now
+    changes = {"updated_at": timezone.now(), **(changes or {})}
+    return model.objects.filter(status__in=allowed, **lookup).update(status=new_status, **changes)
+
+
+def transition_rows(model, new_status, pks, from_status, changes=None):
+    """
+    Move the rows ``pks`` from ``from_status`` to ``new_status`` with one
+    conditional UPDATE and return the set of pks this statement moved. A row
+    another worker moved first, even to the same status, is not among them:
+    when the rowcount falls short, the moved rows are told apart by the
+    updated_at this statement wrote (they stay locked until commit).
+    """
+    changes = {"updated_at": timezone.now(), **(changes or {})}
+    moved = transition(model, new_status, changes, pk__in=pks, status=from_status)
+    if moved == len(pks):
+        return set(pks)
+    if not moved:
+        return set()
+    return set(
+        model.objects.filter(pk__in=pks, status=new_status, updated_at=changes["updated_at"])
+        .values_list('pk', flat=True)
+    )
+
+
+def transition_instance(obj, new_status, **changes):
+    """
+    Move a loaded row to ``new_status`` if that is allowed from the status it
+    was read with and the row still has that status. On success the instance
+    is updated to match and True is returned; otherwise it is left untouched.
+    """
+    model = type(obj)
+    if not can_transition(model, obj.status, new_status):
+        return False
+    changes = {"updated_at": timezone.now(), **changes}
+    from_status = obj.status
+    with transaction.atomic():
+        if not transition(model, new_status, changes, pk=obj.pk, status=from_status):
+            return False
+        obj.status = new_status
+        for field, value in changes.items():
+            setattr(obj, field, value)
+        record_transitions([(obj, from_status)], changes["updated_at"])
+    return True
+
+
+def time_in_status(kind, status, since):
+    """
+    How long transactions of ``kind`` ("mobile"/"fund") spent in ``status``,
+    over the stays that ended after ``since``: {"count", "p50", "p90", "p99",
+    "max"} in seconds. Each stay's start is found through the per-transaction
+    index, so the cost follows the number of transitions in the window.
+    """
+    entered_at = (
+        TransactionTransition.objects
+        .filter(kind=kind, transaction_id=OuterRef('transaction_id'), to_status=status,
+                changed_at__lte=OuterRef('changed_at'))
+        .order_by('-changed_at')
+        .values('changed_at')[:1]
+    )
+    stays = (
+        TransactionTransition.objects
+        .filter(kind=kind, from_status=status, changed_at__gte=since)
+        .annotate(entered_at=Subquery(entered_at))
+        .exclude(entered_at__isnull=True)
+        .values_list('entered_at', 'changed_at')
+    )
+    durations = sorted((left - entered).total_seconds() for entered, left in stays)
+    if not durations:
+        return {"count": 0, "p50": None, "p90": None, "p99": None, "max": None}
+
+    def pct(p):
+        return round(durations[min(len(durations) - 1, int(len(durations) * p / 100))], 3)
+
+    return {"count": len(durations), "p50": pct(50), "p90": pct(90), "p99": pct(99), "max": round(durations[-1], 3)}
+
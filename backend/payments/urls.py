@@ -10,13 +10,23 @@ urlpatterns = [
     path("payment-schedules/<uuid:schedule_id>/funding-status/", views.get_funding_status, name="funding_status"),
     path("webhook/", views.bitnob_webhook, name="bitnob_webhook"),
     path("initiate-payout/", views.InitiatePayout.as_view(), name="initiate_payout"),
+    path("receiver-progress/", views.get_receivers_progress, name="receivers_progress"),
     path("receiver-progress/<int:receiver_id>/", views.get_schedule_progress, name="receiver_progress"),
+    path("events/schedules/<uuid:schedule_id>/", views.schedule_events, name="schedule_events"),
+    path("events/customers/<int:customer_id>/", views.customer_events, name="customer_events"),
     path("schedules/<uuid:schedule_id>/fund-usdt/", views.CreateUSDTDepositView.as_view(), name="fund-usdt-legacy"),
     path("schedules/<uuid:schedule_id>/funding-status/", views.get_funding_status, name="funding_status_legacy"),
+    path("customers/<int:customer_id>/wallet/", views.get_customer_wallet, name="customer_wallet"),
+    path("customers/<int:customer_id>/wallet/fund/", views.CreateWalletDepositView.as_view(), name="fund_customer_wallet"),
     path("fund-transactions/<uuid:fund_transaction_id>/confirm/", views.manual_fund_confirmation, name="manual_fund_confirmation"),
     path("test/simulate-webhook/", views.test_simulate_webhook, name="test_simulate_webhook"),
     path("trigger-scheduled-payments/", views.trigger_scheduled_payments, name="trigger_scheduled_payments"),
     path("scheduled-payments-status/", views.get_scheduled_payments_status, name="scheduled_payments_status"),
+    path("cache-stats/", views.get_cache_stats, name="cache_stats"),
+    path("exports/transactions/", views.export_transactions, name="export_transactions"),
+    path("changes/", views.get_changes, name="changes"),
+    path("transaction-transitions/", views.get_transaction_transitions, name="transaction_transitions"),
+    path("transaction-transitions/time-in-status/", views.get_time_in_status, name="time_in_status"),
     path("test/create-schedule/", views.create_test_schedule, name="create_test_schedule"),
     path("test/create-5min-payment/", views.create_5min_test_payment, name="create_5min_test_payment"),
     path("test/bitnob-api-status/", views.check_bitnob_api_status, name="check_bitnob_api_status"),
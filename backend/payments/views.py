@@ -1,5 +1,8 @@
 # views.py
+import asyncio
+import json
 import requests
+from decimal import InvalidOperation
 from datetime import timedelta
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
@@ -9,18 +12,44 @@ from rest_framework import status
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.utils import timezone
-from django.db.models import Sum
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction, IntegrityError
+from django.db.models import Sum, Count, Q, Prefetch
 from .serializers import (
     CustomerCreateSerializer, 
     ReceiverCreateSerializer, 
     PaymentScheduleCreateSerializer,
-    PaymentScheduleSerializer
+    PaymentScheduleSerializer,
+    ArchivedPaymentScheduleSerializer,
+    annotate_schedule_counts
 )
 from django.conf import settings
-from .models import BitnobCustomer, MobileTransaction, MobileReceiver, PaymentSchedule
+from .models import (
+    BitnobCustomer, MobileTransaction, MobileReceiver, PaymentSchedule, TransactionTransition, bump_schedule_version,
+)
+from .memo import invalidate
 from .services.bitnob import lookup_mobile, request_mobile_invoice, pay_mobile_invoice, create_and_pay_mobile_invoice
+from .services.archive import get_archived_schedule, is_archived
+from .services.plans import create_payment_plan, PlanCreationError
+from .services.dashboard import live_schedule_summaries, snapshot_schedule_summaries
+from .services.progress import annotate_progress_counts, receivers_progress, progress_for_receiver_ids
+from .services.changes import changes_since
+from .services.expiry import expire_chunk
+from .services.wallet import get_wallet
+from .services.export import export_queryset, iter_export_lines, ExportError, EXPORT_FORMATS
+from .pagination import keyset_page, parse_page_size, parse_cursor_datetime, InvalidCursor
+from .conditional import schedule_version, schedule_etag, not_modified_response, with_etag
+from . import events, webhooks
+from .transitions import transition_instance, time_in_status
+from .cache import (
+    schedule_cache_key, customer_cache_key, get_cached_payload, set_cached_payload,
+    invalidate_schedule, invalidate_customer, cache_stats
+)
 
 from .models import PaymentSchedule, FundTransaction
+from .money import Money
 import uuid
 
 
@@ -154,132 +183,51 @@ class CreateBitnobCustomer(APIView):
         print(f"Serializer errors: {serializer.errors}")  # Debug log
         return Response(serializer.errors, status=400)
 
-class CreatePaymentPlan(APIView):
-    def post(self, request):
-        serializer = PaymentScheduleCreateSerializer(data=request.data)
-        if serializer.is_valid():
-            data = serializer.validated_data
-            
-            try:
-                customer = BitnobCustomer.objects.get(email=data["email"])
-            except BitnobCustomer.DoesNotExist:
-                return Response({"error": "Customer not found"}, status=404)
 
-            # Calculate total amount across all receivers
-            subtotal_amount = 0
-            receivers_data = data["receivers"]
-            
-            # Validate receivers data and calculate subtotal
-            phone_numbers_in_schedule = set()
-            for r in receivers_data:
-                try:
-                    amount_per_installment = float(r["amountPerInstallment"])
-                    number_of_installments = int(r["numberOfInstallments"])
-                    subtotal_amount += amount_per_installment * number_of_installments
-                    
-                    # Check for duplicate phone numbers within this payment schedule
-                    phone = str(r["phone"]).strip()
-                    if phone in phone_numbers_in_schedule:
-                        return Response({
-                            "error": f"Duplicate phone number {phone} found in payment schedule. Each phone number can only appear once per schedule.",
-                            "detail": "Phone numbers must be unique within a payment schedule"
-                        }, status=400)
-                    phone_numbers_in_schedule.add(phone)
-                    
-                except (ValueError, TypeError) as e:
-                    return Response({
-                        "error": f"Invalid amount or installments for receiver {r.get('name', 'Unknown')}",
-                        "detail": str(e)
-                    }, status=400)
+def create_payment_plan_response(request):
+    """Validate the request and create a payment plan; shared by both plan creation endpoints"""
+    serializer = PaymentScheduleCreateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
 
-            # Add 1.5% processing fee
-            processing_fee = subtotal_amount * 0.015
-            total_amount = subtotal_amount + processing_fee
+    try:
+        payment_schedule, receivers, summary = create_payment_plan(serializer.validated_data)
+    except PlanCreationError as e:
+        return Response(e.payload, status=e.status)
+    invalidate_customer(payment_schedule.customer_id)
 
-            try:
-                # Create the payment schedule with proper start_date handling
-                start_date = data.get("start_date")
-                if not start_date:
-                    start_date = timezone.now()
-                    
-                payment_schedule = PaymentSchedule.objects.create(
-                    customer=customer,
-                    title=data["title"],
-                    description=data.get("description", ""),
-                    frequency=data.get("frequency", "monthly"),
-                    subtotal_amount=subtotal_amount,
-                    processing_fee=round(processing_fee, 2),
-                    total_amount=round(total_amount, 2),
-                    start_date=start_date
-                )
+    created_receivers = [
+        {
+            "id": receiver.id,
+            "name": receiver.name,
+            "phone": receiver.phone,
+            "country_code": receiver.country_code,
+            "total_amount": str(receiver.total_amount),
+            "amount_per_installment": str(receiver.amount_per_installment),
+            "installments": receiver.number_of_installments
+        }
+        for receiver in receivers
+    ]
 
-                # Create receivers for this payment schedule
-                created_receivers = []
-                for r in receivers_data:
-                    try:
-                        # Validate phone number format
-                        phone = str(r["phone"]).strip()
-                        country_code = str(r["countryCode"]).strip()
-                        
-                        if not phone or not country_code:
-                            raise ValueError("Phone number and country code are required")
-                        
-                        receiver = MobileReceiver.objects.create(
-                            payment_schedule=payment_schedule,
-                            customer=customer,
-                            name=r["name"],
-                            phone=phone,
-                            country_code=country_code,
-                            amount_per_installment=r["amountPerInstallment"],
-                            number_of_installments=r["numberOfInstallments"]
-                        )
-                        created_receivers.append({
-                            "id": receiver.id,
-                            "name": receiver.name,
-                            "phone": receiver.phone,
-                            "country_code": receiver.country_code,
-                            "total_amount": str(receiver.total_amount),
-                            "amount_per_installment": str(receiver.amount_per_installment),
-                            "installments": receiver.number_of_installments
-                        })
-                    except Exception as receiver_error:
-                        # If receiver creation fails, clean up the payment schedule
-                        payment_schedule.delete()
-                        
-                        # Check if it's a duplicate phone number error
-                        if "UNIQUE constraint failed" in str(receiver_error) or "unique_together" in str(receiver_error).lower():
-                            return Response({
-                                "error": f"Phone number {phone} is already used in this payment schedule",
-                                "detail": "Each phone number can only appear once per payment schedule"
-                            }, status=400)
-                        
-                        return Response({
-                            "error": f"Failed to create receiver {r.get('name', 'Unknown')}",
-                            "detail": str(receiver_error)
-                        }, status=400)
+    # Return payment schedule details
+    schedule_serializer = PaymentScheduleSerializer(payment_schedule)
+    return Response({
+        "message": "Payment schedule created successfully",
+        "payment_schedule": schedule_serializer.data,
+        "receivers": created_receivers,
+        "financial_summary": {
+            "subtotal_amount": str(summary["subtotal"]),
+            "processing_fee": str(summary["processing_fee"]),
+            "processing_fee_percentage": "1.5%",
+            "total_amount": str(summary["total"])
+        },
+        "total_receivers": len(created_receivers)
+    }, status=201)
 
-                # Return payment schedule details
-                schedule_serializer = PaymentScheduleSerializer(payment_schedule)
-                return Response({
-                    "message": "Payment schedule created successfully",
-                    "payment_schedule": schedule_serializer.data,
-                    "receivers": created_receivers,
-                    "financial_summary": {
-                        "subtotal_amount": str(subtotal_amount),
-                        "processing_fee": str(round(processing_fee, 2)),
-                        "processing_fee_percentage": "1.5%",
-                        "total_amount": str(round(total_amount, 2))
-                    },
-                    "total_receivers": len(created_receivers)
-                }, status=201)
-                
-            except Exception as schedule_error:
-                return Response({
-                    "error": "Failed to create payment schedule",
-                    "detail": str(schedule_error)
-                }, status=500)
-                
-        return Response(serializer.errors, status=400)
+
+class CreatePaymentPlan(APIView):
+    def post(self, request):
+        return create_payment_plan_response(request)
 
 
 class PaymentScheduleListView(APIView):
@@ -290,162 +238,148 @@ class PaymentScheduleListView(APIView):
         
         queryset = PaymentSchedule.objects.all()
         
+        cache_key = None
         if customer_email:
             try:
                 customer = BitnobCustomer.objects.get(email=customer_email)
                 queryset = queryset.filter(customer=customer)
             except BitnobCustomer.DoesNotExist:
                 return Response({"error": "Customer not found"}, status=404)
+
+            # Per-customer listings are cached; the unfiltered admin listing is not
+            cache_key = customer_cache_key('schedule-list', customer.id, request.query_params)
+            payload = get_cached_payload(cache_key, 'schedule-list')
+            if payload is not None:
+                return Response(payload)
         
         if status_filter:
             queryset = queryset.filter(status=status_filter)
-        
-        serializer = PaymentScheduleSerializer(queryset, many=True)
-        return Response({
-            "payment_schedules": serializer.data,
-            "count": len(serializer.data)
-        })
-    
-    def post(self, request):
-        """Create a new payment schedule - same logic as CreatePaymentPlan"""
-        serializer = PaymentScheduleCreateSerializer(data=request.data)
-        if serializer.is_valid():
-            data = serializer.validated_data
-            
-            try:
-                customer = BitnobCustomer.objects.get(email=data["email"])
-            except BitnobCustomer.DoesNotExist:
-                return Response({"error": "Customer not found"}, status=404)
 
-            # Calculate total amount across all receivers
-            subtotal_amount = 0
-            receivers_data = data["receivers"]
-            
-            # Validate receivers data and calculate subtotal
-            phone_numbers_in_schedule = set()
-            for r in receivers_data:
-                try:
-                    amount_per_installment = float(r["amountPerInstallment"])
-                    number_of_installments = int(r["numberOfInstallments"])
-                    subtotal_amount += amount_per_installment * number_of_installments
-                    
-                    # Check for duplicate phone numbers within this payment schedule
-                    phone = str(r["phone"]).strip()
-                    if phone in phone_numbers_in_schedule:
-                        return Response({
-                            "error": f"Duplicate phone number {phone} found in payment schedule. Each phone number can only appear once per schedule.",
-                            "detail": "Phone numbers must be unique within a payment schedule"
-                        }, status=400)
-                    phone_numbers_in_schedule.add(phone)
-                    
-                except (ValueError, TypeError) as e:
-                    return Response({
-                        "error": f"Invalid amount or installments for receiver {r.get('name', 'Unknown')}",
-                        "detail": str(e)
-                    }, status=400)
+        # Sparse fieldsets: ?fields=id,title,status skips unrequested computed fields
+        fields = request.query_params.get('fields')
+        fields = [name.strip() for name in fields.split(',') if name.strip()] if fields else None
+        requested = fields if fields is not None else PaymentScheduleSerializer.Meta.fields
 
-            # Add 1.5% processing fee
-            processing_fee = subtotal_amount * 0.015
-            total_amount = subtotal_amount + processing_fee
+        if 'customer_name' in requested:
+            queryset = queryset.select_related('customer')
+        queryset = annotate_schedule_counts(queryset, requested)
 
-            try:
-                # Create the payment schedule with proper start_date handling
-                start_date = data.get("start_date")
-                if not start_date:
-                    start_date = timezone.now()
-                    
-                payment_schedule = PaymentSchedule.objects.create(
-                    customer=customer,
-                    title=data["title"],
-                    description=data.get("description", ""),
-                    frequency=data.get("frequency", "monthly"),
-                    subtotal_amount=subtotal_amount,
-                    processing_fee=round(processing_fee, 2),
-                    total_amount=round(total_amount, 2),
-                    start_date=start_date
-                )
-
-                # Create receivers for this payment schedule
-                created_receivers = []
-                for r in receivers_data:
-                    try:
-                        # Validate phone number format
-                        phone = str(r["phone"]).strip()
-                        country_code = str(r["countryCode"]).strip()
-                        
-                        if not phone or not country_code:
-                            raise ValueError("Phone number and country code are required")
-                        
-                        receiver = MobileReceiver.objects.create(
-                            payment_schedule=payment_schedule,
-                            customer=customer,
-                            name=r["name"],
-                            phone=phone,
-                            country_code=country_code,
-                            amount_per_installment=r["amountPerInstallment"],
-                            number_of_installments=r["numberOfInstallments"]
-                        )
-                        created_receivers.append({
-                            "id": receiver.id,
-                            "name": receiver.name,
-                            "phone": receiver.phone,
-                            "country_code": receiver.country_code,
-                            "total_amount": str(receiver.total_amount),
-                            "amount_per_installment": str(receiver.amount_per_installment),
-                            "installments": receiver.number_of_installments
-                        })
-                    except Exception as receiver_error:
-                        # If receiver creation fails, clean up the payment schedule
-                        payment_schedule.delete()
-                        
-                        # Check if it's a duplicate phone number error
-                        if "UNIQUE constraint failed" in str(receiver_error) or "unique_together" in str(receiver_error).lower():
-                            return Response({
-                                "error": f"Phone number {phone} is already used in this payment schedule",
-                                "detail": "Each phone number can only appear once per payment schedule"
-                            }, status=400)
-                        
-                        return Response({
-                            "error": f"Failed to create receiver {r.get('name', 'Unknown')}",
-                            "detail": str(receiver_error)
-                        }, status=400)
+        # Keyset pagination on (created_at, id), newest first
+        try:
+            page_size = parse_page_size(
+                request.query_params.get('page_size'),
+                default=settings.PAYMENT_SCHEDULES_PAGE_SIZE,
+                maximum=settings.PAYMENT_SCHEDULES_MAX_PAGE_SIZE
+            )
+            schedules, next_cursor = keyset_page(
+                queryset,
+                ('created_at', 'id'),
+                cursor=request.query_params.get('cursor'),
+                page_size=page_size,
+                key_parsers={'created_at': parse_cursor_datetime, 'id': uuid.UUID}
+            )
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=400)
 
-                # Return payment schedule details
-                schedule_serializer = PaymentScheduleSerializer(payment_schedule)
-                return Response({
-                    "message": "Payment schedule created successfully",
-                    "payment_schedule": schedule_serializer.data,
-                    "receivers": created_receivers,
-                    "financial_summary": {
-                        "subtotal_amount": str(subtotal_amount),
-                        "processing_fee": str(round(processing_fee, 2)),
-                        "processing_fee_percentage": "1.5%",
-                        "total_amount": str(round(total_amount, 2))
-                    },
-                    "total_receivers": len(created_receivers)
-                }, status=201)
-                
-            except Exception as schedule_error:
-                return Response({
-                    "error": "Failed to create payment schedule",
-                    "detail": str(schedule_error)
-                }, status=500)
-                
-        return Response(serializer.errors, status=400)
+        serializer = PaymentScheduleSerializer(schedules, many=True, fields=fields)
+        payload = {
+            "payment_schedules": serializer.data,
+            "count": len(serializer.data),
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
+        }
+        if cache_key is not None:
+            set_cached_payload(cache_key, payload)
+        return Response(payload)
+    
+    def post(self, request):
+        """Create a new payment schedule - same logic as CreatePaymentPlan"""
+        return create_payment_plan_response(request)
 
 
 class PaymentScheduleDetailView(APIView):
     """View to get, update, or delete a specific payment schedule"""
     def get(self, request, schedule_id):
-        try:
-            schedule = PaymentSchedule.objects.get(id=schedule_id)
-        except PaymentSchedule.DoesNotExist:
-            return Response({"error": "Payment schedule not found"}, status=404)
+        """
+        Schedule detail in a fixed number of queries, whatever the plan size:
+        the schedule (with counts annotated), one page of receivers (with
+        installment counts annotated) and one ordered transaction prefetch.
+
+        Query params:
+          summary=true            - schedule only, no receivers
+          receivers_page_size=N   - receivers per page (keyset on receiver id)
+          receivers_cursor=...    - next_cursor from the previous page
+          transactions_limit=N    - transactions shown per receiver
+
+        Responses carry an ETag derived from the schedule version; a matching
+        If-None-Match is answered with 304 after a single version lookup.
+        Rendered payloads of live schedules are served from the response cache.
+        """
+        summary_only = request.query_params.get('summary', '').lower() in ('1', 'true', 'yes')
+
+        etag = cache_key = None
+        version = schedule_version(schedule_id)
+        if version is not None:
+            etag = schedule_etag(schedule_id, version, 'detail', request.query_params)
+            not_modified = not_modified_response(request, etag)
+            if not_modified is not None:
+                return not_modified
+            cache_key = schedule_cache_key('detail', schedule_id, request.query_params, discriminator=f"v{version}")
+            payload = get_cached_payload(cache_key, 'detail')
+            if payload is not None:
+                return with_etag(Response(payload), etag)
+
+        schedules = annotate_schedule_counts(
+            PaymentSchedule.objects.filter(id=schedule_id).select_related('customer'),
+            PaymentScheduleSerializer.Meta.fields
+        )
+        schedule = schedules.first()
+        if schedule is None:
+            # Finished plans may have been moved to the archive tier
+            archived_schedule = get_archived_schedule(schedule_id)
+            if archived_schedule is None:
+                return Response({"error": "Payment schedule not found"}, status=404)
+            return Response(self.archived_response_data(archived_schedule))
         
         serializer = PaymentScheduleSerializer(schedule)
-        
-        # Also include receivers and their transactions
-        receivers = schedule.receivers.all()
+        if summary_only:
+            payload = {"payment_schedule": serializer.data}
+            set_cached_payload(cache_key, payload)
+            return with_etag(Response(payload), etag)
+
+        try:
+            page_size = parse_page_size(
+                request.query_params.get('receivers_page_size'),
+                default=settings.SCHEDULE_DETAIL_RECEIVERS_PAGE_SIZE,
+                maximum=settings.SCHEDULE_DETAIL_MAX_RECEIVERS_PAGE_SIZE
+            )
+            transactions_limit = parse_page_size(
+                request.query_params.get('transactions_limit'),
+                default=settings.SCHEDULE_DETAIL_TRANSACTIONS_LIMIT,
+                maximum=settings.SCHEDULE_DETAIL_TRANSACTIONS_LIMIT
+            )
+            receivers_queryset = schedule.receivers.annotate(
+                completed_installments=Count('transactions', filter=Q(transactions__status='success')),
+                transaction_count=Count('transactions')
+            ).prefetch_related(
+                Prefetch(
+                    'transactions',
+                    queryset=MobileTransaction.objects.order_by('installment_number')[:transactions_limit],
+                    to_attr='ordered_transactions'
+                )
+            )
+            receivers, next_cursor = keyset_page(
+                receivers_queryset,
+                ('id',),
+                cursor=request.query_params.get('receivers_cursor'),
+                page_size=page_size,
+                descending=False,
+                key_parsers={'id': int}
+            )
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=400)
+
         receivers_data = []
         for receiver in receivers:
             receiver_data = {
@@ -456,6 +390,8 @@ class PaymentScheduleDetailView(APIView):
                 "number_of_installments": receiver.number_of_installments,
                 "completed_installments": receiver.completed_installments,
                 "progress_percentage": receiver.progress_percentage,
+                "transaction_count": receiver.transaction_count,
+                "has_more_transactions": receiver.transaction_count > len(receiver.ordered_transactions),
                 "transactions": [
                     {
                         "id": txn.id,
@@ -466,21 +402,65 @@ class PaymentScheduleDetailView(APIView):
                         "completed_at": txn.completed_at,
                         "reference": txn.reference
                     }
-                    for txn in receiver.transactions.order_by('installment_number')
+                    for txn in receiver.ordered_transactions
                 ]
             }
             receivers_data.append(receiver_data)
         
-        return Response({
+        payload = {
             "payment_schedule": serializer.data,
-            "receivers": receivers_data
-        })
+            "receivers": receivers_data,
+            "receivers_pagination": {
+                "page_size": page_size,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None,
+                "transactions_limit": transactions_limit
+            }
+        }
+        set_cached_payload(cache_key, payload)
+        return with_etag(Response(payload), etag)
+
+    def archived_response_data(self, schedule):
+        """Render an archived schedule in the same shape as a live one"""
+        receivers_data = []
+        for receiver in schedule.receivers.all():
+            transactions = sorted(receiver.transactions.all(), key=lambda txn: txn.installment_number)
+            completed_installments = sum(1 for txn in transactions if txn.status == 'success')
+            receivers_data.append({
+                "id": receiver.id,
+                "name": receiver.name,
+                "phone": receiver.phone,
+                "amount_per_installment": str(receiver.amount_per_installment),
+                "number_of_installments": receiver.number_of_installments,
+                "completed_installments": completed_installments,
+                "progress_percentage": round((completed_installments / receiver.number_of_installments) * 100, 2) if receiver.number_of_installments else 0,
+                "transactions": [
+                    {
+                        "id": txn.id,
+                        "installment_number": txn.installment_number,
+                        "amount": str(txn.amount),
+                        "status": txn.status,
+                        "sent_at": txn.sent_at,
+                        "completed_at": txn.completed_at,
+                        "reference": txn.reference
+                    }
+                    for txn in transactions
+                ]
+            })
+
+        return {
+            "payment_schedule": ArchivedPaymentScheduleSerializer(schedule).data,
+            "receivers": receivers_data,
+            "archived": True
+        }
     
     def patch(self, request, schedule_id):
         """Update payment schedule status or other fields"""
         try:
             schedule = PaymentSchedule.objects.get(id=schedule_id)
         except PaymentSchedule.DoesNotExist:
+            if is_archived(schedule_id):
+                return Response({"error": "Archived payment schedules are read-only"}, status=409)
             return Response({"error": "Payment schedule not found"}, status=404)
         
         # Allow updating status, title, description
@@ -490,6 +470,7 @@ class PaymentScheduleDetailView(APIView):
                 setattr(schedule, field, request.data[field])
         
         schedule.save()
+        invalidate_schedule(schedule.id, schedule.customer_id)
         serializer = PaymentScheduleSerializer(schedule)
         return Response({
             "message": "Payment schedule updated successfully",
@@ -542,7 +523,8 @@ class InitiatePayout(APIView):
         number = receiver.phone
         
         # Use receiver's amount per installment as the payment amount
-        amount = int(float(receiver.amount_per_installment) * 100)  # Convert to cents
+        installment = receiver.installment_money
+        amount = installment.minor  # Bitnob expects cents
 
         # Check if receiver has completed all installments
         if receiver.completed_installments >= receiver.number_of_installments:
@@ -566,7 +548,30 @@ class InitiatePayout(APIView):
                 }
             }, status=400)
 
-        # 1. Optional lookup (skip if not supported)
+        # 1. Claim the next installment. The one_inflight_txn_per_receiver constraint
+        # (and receiver/installment uniqueness) reject the insert if a transaction
+        # is already in flight, so no pre-check query is needed.
+        # The claim is a pending row without a reference until Bitnob returns the
+        # invoice. If this request dies before then, the reconciler releases the
+        # row (moves it to cancelled) once it is RECONCILE_STUCK_AFTER_MINUTES old.
+        next_installment = receiver.next_installment()
+        try:
+            with transaction.atomic():
+                txn = MobileTransaction.objects.create(
+                    receiver=receiver, 
+                    amount=installment.amount,
+                    currency=installment.currency,
+                    installment_number=next_installment,
+                    sent_at=timezone.now()
+                )
+        except IntegrityError:
+            return Response({
+                "error": "A transaction is already in progress for this receiver",
+                "installment_number": next_installment
+            }, status=400)
+        invalidate_schedule(schedule.id, receiver.customer_id)
+
+        # 2. Optional lookup (skip if not supported)
         try:
             lookup = lookup_mobile(country, number)
             if not lookup.get("status"):
@@ -574,49 +579,41 @@ class InitiatePayout(APIView):
         except Exception as e:
             print(f"Warning: Lookup exception for {country} {number}, but continuing with payment: {str(e)}")
 
-        # 2. Request invoice
-        invoice = request_mobile_invoice(country, number, sender, amount, callback_url=None)
+        # 3. Request invoice
+        try:
+            invoice = request_mobile_invoice(country, number, sender, amount, callback_url=None)
+        except Exception as e:
+            invoice = {"success": False, "error": str(e)}
         if not invoice.get("success"):
+            # Release the claimed installment so the receiver can be paid again
+            self._move_claim(txn, schedule, "cancelled", failure_reason=f"Invoice failed: {invoice.get('error', '')}")
             return Response({"error": "Invoice failed", "detail": invoice}, status=400)
 
         ref = invoice["reference"]
         invoice_id = invoice["id"]
         payment_req = invoice["response"]["data"]["paymentRequest"]
 
-        # 3. Record transaction and pay
-        next_installment = receiver.next_installment()
-        
-        # Check if this installment already exists
-        existing_txn = MobileTransaction.objects.filter(
-            receiver=receiver, 
-            installment_number=next_installment
-        ).first()
-        
-        if existing_txn and existing_txn.status in ['pending', 'processing', 'success']:
+        # Save the reference before paying, so a settlement webhook or the
+        # reconciler can find the transaction whatever happens next. No row
+        # means the reconciler released the claim already: don't pay.
+        if not MobileTransaction.objects.filter(pk=txn.pk, status="pending", reference__isnull=True).update(
+            reference=ref, updated_at=timezone.now()
+        ):
             return Response({
-                "error": f"Installment {next_installment} already exists with status: {existing_txn.status}",
-                "transaction_id": existing_txn.id
-            }, status=400)
+                "error": "The claimed installment was released before the payment was sent",
+                "transactionId": txn.id
+            }, status=409)
+        txn.reference = ref
 
+        # 4. Pay and record the outcome
         try:
-            txn = MobileTransaction.objects.create(
-                receiver=receiver, 
-                amount=amount/100,  # Convert back to original amount
-                installment_number=next_installment,
-                sent_at=timezone.now()
-            )
-            
             # Use the receiver's customer email for the payment
             customer_email = receiver.customer.email
             pay = pay_mobile_invoice(customer_email, reference=ref, invoice_id=invoice_id, wallet="USD")
             if not pay.get("status"):
-                txn.status = "failed"
-                txn.failure_reason = pay.get("message", "Payment failed")
+                self._move_claim(txn, schedule, "failed", failure_reason=pay.get("message", "Payment failed"))
             else:
-                txn.status = "processing"
-                
-            txn.reference = ref
-            txn.save()
+                self._move_claim(txn, schedule, "processing")
 
             return Response({
                 "message": "Payout initiated successfully",
@@ -624,7 +621,7 @@ class InitiatePayout(APIView):
                 "paymentRequest": payment_req, 
                 "transactionId": txn.id,
                 "installment_number": next_installment,
-                "amount": str(amount/100),
+                "amount": str(installment),
                 "receiver": {
                     "id": receiver.id,
                     "name": receiver.name,
@@ -642,16 +639,39 @@ class InitiatePayout(APIView):
             }, status=201)
             
         except Exception as e:
+            # Don't leave the claimed installment blocking the receiver
+            self._move_claim(txn, schedule, "failed", failure_reason=f"Payout error: {str(e)}")
             return Response({
                 "error": "Failed to create transaction",
                 "detail": str(e)
             }, status=500)
 
+    @staticmethod
+    def _move_claim(txn, schedule, new_status, **changes):
+        """
+        Move the claimed transaction on through the state machine (logged in
+        the transition table). A webhook may have settled it first, in which
+        case it is left alone.
+        """
+        old_status = txn.status
+        if not transition_instance(txn, new_status, **changes):
+            return False
+        invalidate(MobileReceiver, txn.receiver_id)
+        invalidate(PaymentSchedule, schedule.id)
+        bump_schedule_version(schedule.id)
+        invalidate_schedule(schedule.id, schedule.customer_id)
+        events.publish_transaction_status(txn, old_status)
+        return True
+
 
 @api_view(['POST'])
 @csrf_exempt
 def bitnob_webhook(request):
-    """Handle Bitnob webhook notifications for transaction status updates"""
+    """
+    Receive a Bitnob webhook. The payload is stored in the webhook inbox and
+    acknowledged straight away; the drain_webhook_inbox task applies it.
+    Redeliveries of a stored event are acknowledged and dropped.
+    """
     data = request.data
     event = data.get("event")
     ref = data.get("reference")
@@ -662,188 +682,272 @@ def bitnob_webhook(request):
             "error": "Missing required fields: event or reference"
         }, status=400)
 
-    # Handle stablecoin/funding transaction webhooks
-    if event.startswith("stablecoin"):
-        return handle_fund_transaction_webhook(data, event, ref)
-    
-    # Handle mobile payment transaction webhooks
-    try:
-        txn = MobileTransaction.objects.get(reference=ref)
-    except MobileTransaction.DoesNotExist:
+    entry = webhooks.enqueue(data.dict() if hasattr(data, "dict") else data)
+    if entry is None:
+        # Redelivery of an event we already have: nothing to do
         return Response({
-            "error": "Transaction not found",
+            "status": "duplicate",
+            "event": event,
             "reference": ref
-        }, status=404)
+        })
+
+    if settings.WEBHOOK_PROCESS_INLINE:
+        body, status_code = webhooks.apply_now(entry)
+        return Response(body, status=status_code)
+
+    return Response({
+        "status": "queued",
+        "inbox_id": entry.id,
+        "event": event,
+        "reference": ref
+    }, status=202)
+
+
+@api_view(['GET'])
+def get_schedule_progress(request, receiver_id):
+    """Get the progress of a payment schedule for a receiver"""
+    # Receiver changes bump the owning schedule's version, so that version covers this view too
+    version_row = MobileReceiver.objects.filter(id=receiver_id).values_list(
+        'payment_schedule_id', 'payment_schedule__version'
+    ).first()
+    etag = cache_key = None
+    if version_row is not None and version_row[1] is not None:
+        schedule_id, version = version_row
+        etag = schedule_etag(schedule_id, version, f'receiver-progress:{receiver_id}', request.query_params)
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        cache_key = schedule_cache_key(
+            'receiver-progress', schedule_id, request.query_params, discriminator=f"r{receiver_id}:v{version}"
+        )
+        payload = get_cached_payload(cache_key, 'receiver-progress')
+        if payload is not None:
+            return with_etag(Response(payload), etag)
 
-    # Store original status for logging
-    original_status = txn.status
+    receivers = annotate_progress_counts(MobileReceiver.objects.filter(id=receiver_id))
+    progress_rows = receivers_progress(receivers)
+    if not progress_rows:
+        return Response({"error": "Receiver not found"}, status=404)
+    progress_data = progress_rows[0]
     
-    # Update transaction status based on webhook event
-    if event == "mobilepayment.settlement.success":
-        txn.status = "success"
-        txn.completed_at = timezone.now()
-        
-        # Update the payment schedule's payment dates when a transaction succeeds
-        schedule = txn.receiver.payment_schedule
-        schedule.update_payment_dates()
-        
-    elif event == "mobilepayment.settlement.failed":
-        txn.status = "failed"
-        txn.failure_reason = data.get("message", "Payment failed via webhook")
-    elif event == "mobilepayment.settlement.pending":
-        txn.status = "pending"
-    else:
-        # Log unknown event but don't update status
+    if cache_key is not None:
+        set_cached_payload(cache_key, progress_data)
+    return with_etag(Response(progress_data), etag)
+
+
+@api_view(['GET'])
+def get_receivers_progress(request):
+    """
+    Progress for many receivers in one request and two queries.
+
+    Query params (one of):
+      receiver_ids=1,2,3      - these receivers, in this order
+      schedule_id=<uuid>      - every receiver of the schedule, keyset paged
+                                by id with page_size / cursor
+    """
+    receiver_ids = request.query_params.get('receiver_ids')
+    schedule_id = request.query_params.get('schedule_id')
+    max_batch = settings.RECEIVER_PROGRESS_MAX_BATCH
+
+    if receiver_ids:
+        try:
+            ids = list(dict.fromkeys(int(value) for value in receiver_ids.split(',') if value.strip()))
+        except ValueError:
+            return Response({"error": "receiver_ids must be a comma separated list of integers"}, status=400)
+        if len(ids) > max_batch:
+            return Response({"error": f"At most {max_batch} receiver ids per request"}, status=400)
+        progress_rows, missing = progress_for_receiver_ids(ids)
         return Response({
-            "warning": f"Unknown event type: {event}",
-            "status": "received"
+            "receivers": progress_rows,
+            "count": len(progress_rows),
+            "missing_receiver_ids": missing
         })
-    
-    txn.save()
-    
-    # Log the status change for debugging
-    print(f"Webhook: Transaction {txn.id} status changed from {original_status} to {txn.status}")
-    
-    return Response({
-        "status": "received",
-        "transaction_id": txn.id,
-        "old_status": original_status,
-        "new_status": txn.status,
-        "event": event
-    })
-
 
-def handle_fund_transaction_webhook(data, event, ref):
-    """Handle stablecoin/funding transaction webhook events"""
-    try:
-        fund_txn = FundTransaction.objects.get(reference=ref)
-    except FundTransaction.DoesNotExist:
+    if schedule_id:
+        try:
+            schedule_id = uuid.UUID(schedule_id)
+        except ValueError:
+            return Response({"error": "Invalid schedule_id"}, status=400)
+        if not PaymentSchedule.objects.filter(id=schedule_id).exists():
+            return Response({"error": "Payment schedule not found"}, status=404)
+        try:
+            page_size = parse_page_size(request.query_params.get('page_size'), default=max_batch, maximum=max_batch)
+            receivers, next_cursor = keyset_page(
+                annotate_progress_counts(MobileReceiver.objects.filter(payment_schedule_id=schedule_id)),
+                ('id',),
+                cursor=request.query_params.get('cursor'),
+                page_size=page_size,
+                descending=False,
+                key_parsers={'id': int}
+            )
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=400)
+        progress_rows = receivers_progress(receivers)
         return Response({
-            "error": "Fund transaction not found",
-            "reference": ref
-        }, status=404)
+            "schedule_id": schedule_id,
+            "receivers": progress_rows,
+            "count": len(progress_rows),
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
+        })
 
-    # Store original status for logging
-    original_status = fund_txn.status
-    
-    # Update fund transaction status based on webhook event
-    if event in [
-        "stablecoin.settlement.success", 
-        "stablecoin.deposit.confirmed",
-        "stablecoin.transaction.confirmed",
-        "deposit.confirmed"
-    ]:
-        fund_txn.status = "paid"
-        fund_txn.updated_at = timezone.now()
+    return Response({"error": "Provide receiver_ids or schedule_id"}, status=400)
+
+
+def format_sse(event_type, data):
+    """One text/event-stream frame"""
+    return f"event: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def payment_event_stream(channels, hello):
+    """
+    Async generator behind the SSE endpoints. It waits on its subscription
+    queue without polling and sends a comment line as a keep-alive so proxies
+    do not close idle connections.
+    """
+    subscription = events.subscribe(channels)
+    try:
+        yield f"retry: {settings.PAYMENT_EVENTS_RETRY_MS}\n\n"
+        yield format_sse("ready", hello)
+        while True:
+            try:
+                payload = await asyncio.wait_for(
+                    subscription.get(), timeout=settings.PAYMENT_EVENTS_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(payload["type"], payload["data"])
+    finally:
+        events.unsubscribe(subscription)
+
+
+def event_stream_response(channels, hello):
+    response = StreamingHttpResponse(payment_event_stream(channels, hello), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_GET
+async def schedule_events(request, schedule_id):
+    """
+    Server-sent events for one schedule: ``transaction.status`` and
+    ``funding.status`` as webhooks settle them. Serve through ASGI (e.g.
+    ``uvicorn mpola.asgi:application``); under WSGI a stream holds a worker.
+    """
+    if not await PaymentSchedule.objects.filter(id=schedule_id).aexists():
+        return JsonResponse({"error": "Payment schedule not found"}, status=404)
+    return event_stream_response([events.schedule_channel(schedule_id)], {"schedule_id": str(schedule_id)})
+
+
+@require_GET
+async def customer_events(request, customer_id):
+    """Server-sent events for every schedule of one customer (see schedule_events)"""
+    if not await BitnobCustomer.objects.filter(id=customer_id).aexists():
+        return JsonResponse({"error": "Customer not found"}, status=404)
+    return event_stream_response([events.customer_channel(customer_id)], {"customer_id": customer_id})
+
+
+def quote_usdt_deposit(ugx_amount, customer_email, label, network):
+    """
+    Fetch the UGX rate and generate a deposit address for a USDT deposit of
+    ``ugx_amount``. Returns ``(quote, None)`` with the quote's usdt_amount,
+    ugx_rate and address, or ``(None, error response)``.
+    """
+    # 1. Get UGX to USD rate
+    try:
+        print(f"[BITNOB API] Fetching exchange rates from: {BITNOB_BASE}/wallets/payout/rates")
+        rate_resp = requests.get(f"{BITNOB_BASE}/wallets/payout/rates", headers=HEADERS)
+        print(f"[BITNOB API] Exchange rates response status: {rate_resp.status_code}")
+        print(f"[BITNOB API] Exchange rates response headers: {dict(rate_resp.headers)}")
+        print(f"[BITNOB API] Exchange rates response body: {rate_resp.text}")
         
-        # Update the associated payment schedule funding status
-        schedule = fund_txn.schedule
-        schedule.update_funding_status()
+        rate_resp.raise_for_status()
+        rate_data = rate_resp.json().get("data", {})
+        ugx_data = rate_data.get("UGX")
         
-        # Log successful funding
-        print(f"Fund Webhook: Schedule {schedule.id} funded. Total funded: {schedule.total_funded_amount}")
+        if not ugx_data:
+            print(f"[BITNOB API] ERROR: UGX rate not found in response data: {rate_data}")
+            return None, Response({
+                "error": "UGX exchange rate not available",
+                "detail": "Unable to fetch current UGX to USD exchange rate from Bitnob"
+            }, status=503)
         
-    elif event in [
-        "stablecoin.settlement.failed", 
-        "stablecoin.deposit.failed",
-        "stablecoin.transaction.failed",
-        "deposit.failed"
-    ]:
-        fund_txn.status = "failed"
-        fund_txn.updated_at = timezone.now()
+        # Use buyRate for converting from UGX to USD (we're buying USD with UGX)
+        ugx_rate = ugx_data.get("buyRate")
+        if not ugx_rate:
+            print(f"[BITNOB API] ERROR: UGX buyRate not found in UGX data: {ugx_data}")
+            return None, Response({
+                "error": "UGX exchange rate format invalid",
+                "detail": "UGX buyRate not available in Bitnob response"
+            }, status=503)
+            
+        print(f"[BITNOB API] UGX rates - sellRate: {ugx_data.get('sellRate')}, buyRate: {ugx_data.get('buyRate')}")
+        print(f"[BITNOB API] Using UGX buyRate for conversion: {ugx_rate}")
+        print(f"[BITNOB API] Successfully retrieved UGX rate: {ugx_rate}")
+            
+    except requests.exceptions.RequestException as e:
+        print(f"[BITNOB API] ERROR: Exchange rate API request failed: {str(e)}")
+        return None, Response({
+            "error": "Exchange rate service unavailable",
+            "detail": "Unable to connect to Bitnob exchange rate service"
+        }, status=503)
+    except Exception as e:
+        print(f"[BITNOB API] ERROR: Unexpected error fetching exchange rates: {str(e)}")
+        return None, Response({
+            "error": "Exchange rate fetch failed",
+            "detail": str(e)
+        }, status=500)
+
+    usd_amount = float(ugx_amount) / float(ugx_rate)
+    usdt_amount = round(usd_amount, 6)
+    print(f"[BITNOB API] Calculated amounts - UGX: {ugx_amount}, USD: {usd_amount}, USDT: {usdt_amount}")
+
+    # 2. Generate deposit address
+    try:
+        address_payload = { "customerEmail": f"{customer_email}", "label": label}
+        print(f"[BITNOB API] Generating deposit address for network: {network}")
+        print(f"[BITNOB API] Address generation payload: {address_payload}")
         
-        # Log failure reason if provided
-        failure_reason = data.get("message", "Funding failed via webhook")
-        print(f"Fund Webhook: Transaction {fund_txn.id} failed: {failure_reason}")
+        addr_resp = requests.post(
+            f"{BITNOB_BASE}/addresses/tron/generate",
+            headers=HEADERS,
+            json=address_payload
+        )
+        print(f"[BITNOB API] Address generation response status: {addr_resp.status_code}")
+        print(f"[BITNOB API] Address generation response headers: {dict(addr_resp.headers)}")
+        print(f"[BITNOB API] Address generation response body: {addr_resp.text}")
         
-    elif event in [
-        "stablecoin.settlement.expired", 
-        "stablecoin.deposit.expired",
-        "stablecoin.transaction.expired",
-        "deposit.expired"
-    ]:
-        fund_txn.status = "expired"
-        fund_txn.updated_at = timezone.now()
+        addr_resp.raise_for_status()
+        address_data = addr_resp.json()
         
-    elif event in [
-        "stablecoin.settlement.pending",
-        "stablecoin.deposit.pending", 
-        "deposit.pending"
-    ]:
-        fund_txn.status = "pending"
-        fund_txn.updated_at = timezone.now()
+        if not address_data.get("status") or "data" not in address_data:
+            print(f"[BITNOB API] ERROR: Invalid address generation response: {address_data}")
+            return None, Response({
+                "error": "Address generation failed",
+                "detail": "Invalid response from Bitnob address generation service"
+            }, status=503)
+            
+        address = address_data["data"]["address"]
+        print(f"[BITNOB API] Successfully generated deposit address: {address}")
         
-    else:
-        # Log unknown stablecoin event but don't update status
-        print(f"Unknown stablecoin event: {event} for reference: {ref}")
-        return Response({
-            "warning": f"Unknown stablecoin event type: {event}",
-            "status": "received",
-            "reference": ref
-        })
-    
-    fund_txn.save()
-    
-    # Log the status change for debugging
-    print(f"Fund Webhook: Transaction {fund_txn.id} status changed from {original_status} to {fund_txn.status}")
-    
-    return Response({
-        "status": "received",
-        "fund_transaction_id": str(fund_txn.id),
-        "schedule_id": str(fund_txn.schedule.id),
-        "old_status": original_status,
-        "new_status": fund_txn.status,
-        "event": event,
-        "schedule_funding_status": {
-            "is_funded": fund_txn.schedule.is_funded,
-            "total_funded": str(fund_txn.schedule.total_funded_amount),
-            "total_required": str(fund_txn.schedule.total_amount),
-            "shortfall": str(fund_txn.schedule.funding_shortfall)
-        }
-    })
+    except requests.exceptions.RequestException as e:
+        print(f"[BITNOB API] ERROR: Address generation API request failed: {str(e)}")
+        return None, Response({
+            "error": "Address generation service unavailable",
+            "detail": "Unable to connect to Bitnob address generation service"
+        }, status=503)
+    except Exception as e:
+        print(f"[BITNOB API] ERROR: Unexpected error generating address: {str(e)}")
+        return None, Response({
+            "error": "Address generation failed",
+            "detail": str(e)
+        }, status=500)
 
-
-@api_view(['GET'])
-def get_schedule_progress(request, receiver_id):
-    """Get the progress of a payment schedule for a receiver"""
-    try:
-        receiver = MobileReceiver.objects.get(id=receiver_id)
-    except MobileReceiver.DoesNotExist:
-        return Response({"error": "Receiver not found"}, status=404)
-    
-    transactions = receiver.transactions.all()
-    total_installments = receiver.number_of_installments
-    completed_installments = transactions.filter(status="success").count()
-    pending_installments = transactions.filter(status="pending").count()
-    failed_installments = transactions.filter(status="failed").count()
-    
-    total_amount = receiver.amount_per_installment * receiver.number_of_installments
-    completed_amount = receiver.amount_per_installment * completed_installments
-    
-    progress_data = {
-        "receiver_id": receiver.id,
-        "receiver_name": receiver.name,
-        "receiver_phone": receiver.phone,
-        "total_installments": total_installments,
-        "completed_installments": completed_installments,
-        "pending_installments": pending_installments,
-        "failed_installments": failed_installments,
-        "total_amount": str(total_amount),
-        "completed_amount": str(completed_amount),
-        "progress_percentage": round((completed_installments / total_installments) * 100, 2) if total_installments > 0 else 0,
-        "transactions": [
-            {
-                "id": txn.id,
-                "installment_number": txn.installment_number,
-                "amount": str(txn.amount),
-                "status": txn.status,
-                "sent_at": txn.sent_at
-            }
-            for txn in transactions.order_by('installment_number')
-        ]
-    }
-    
-    return Response(progress_data)
+    return {"usdt_amount": usdt_amount, "ugx_rate": ugx_rate, "address": address}, None
 
 
 class CreateUSDTDepositView(APIView):
@@ -874,6 +978,9 @@ class CreateUSDTDepositView(APIView):
                 }
             }, status=400)
 
+        # A lapsed quote must not block a new one, even before the periodic sweep reaches it
+        expire_chunk(schedule=schedule)
+
         # Check for existing pending transactions
         pending_transactions = FundTransaction.objects.filter(
             schedule=schedule, 
@@ -897,95 +1004,12 @@ class CreateUSDTDepositView(APIView):
         # Calculate remaining amount needed
         remaining_amount = schedule.funding_shortfall
 
-        # 1. Get UGX to USD rate
-        try:
-            print(f"[BITNOB API] Fetching exchange rates from: {BITNOB_BASE}/wallets/payout/rates")
-            rate_resp = requests.get(f"{BITNOB_BASE}/wallets/payout/rates", headers=HEADERS)
-            print(f"[BITNOB API] Exchange rates response status: {rate_resp.status_code}")
-            print(f"[BITNOB API] Exchange rates response headers: {dict(rate_resp.headers)}")
-            print(f"[BITNOB API] Exchange rates response body: {rate_resp.text}")
-            
-            rate_resp.raise_for_status()
-            rate_data = rate_resp.json().get("data", {})
-            ugx_data = rate_data.get("UGX")
-            
-            if not ugx_data:
-                print(f"[BITNOB API] ERROR: UGX rate not found in response data: {rate_data}")
-                return Response({
-                    "error": "UGX exchange rate not available",
-                    "detail": "Unable to fetch current UGX to USD exchange rate from Bitnob"
-                }, status=503)
-            
-            # Use buyRate for converting from UGX to USD (we're buying USD with UGX)
-            ugx_rate = ugx_data.get("buyRate")
-            if not ugx_rate:
-                print(f"[BITNOB API] ERROR: UGX buyRate not found in UGX data: {ugx_data}")
-                return Response({
-                    "error": "UGX exchange rate format invalid",
-                    "detail": "UGX buyRate not available in Bitnob response"
-                }, status=503)
-                
-            print(f"[BITNOB API] UGX rates - sellRate: {ugx_data.get('sellRate')}, buyRate: {ugx_data.get('buyRate')}")
-            print(f"[BITNOB API] Using UGX buyRate for conversion: {ugx_rate}")
-            print(f"[BITNOB API] Successfully retrieved UGX rate: {ugx_rate}")
-                
-        except requests.exceptions.RequestException as e:
-            print(f"[BITNOB API] ERROR: Exchange rate API request failed: {str(e)}")
-            return Response({
-                "error": "Exchange rate service unavailable",
-                "detail": "Unable to connect to Bitnob exchange rate service"
-            }, status=503)
-        except Exception as e:
-            print(f"[BITNOB API] ERROR: Unexpected error fetching exchange rates: {str(e)}")
-            return Response({
-                "error": "Exchange rate fetch failed",
-                "detail": str(e)
-            }, status=500)
-
-        usd_amount = float(remaining_amount) / float(ugx_rate)
-        usdt_amount = round(usd_amount, 6)
-        print(f"[BITNOB API] Calculated amounts - UGX: {remaining_amount}, USD: {usd_amount}, USDT: {usdt_amount}")
-
-        # 2. Generate deposit address
-        try:
-            address_payload = { "customerEmail": f"{schedule.customer.email}", "label": f"Payment Schedule {schedule.id} - {schedule.title}"}
-            print(f"[BITNOB API] Generating deposit address for network: {network}")
-            print(f"[BITNOB API] Address generation payload: {address_payload}")
-            
-            addr_resp = requests.post(
-                f"{BITNOB_BASE}/addresses/tron/generate",
-                headers=HEADERS,
-                json=address_payload
-            )
-            print(f"[BITNOB API] Address generation response status: {addr_resp.status_code}")
-            print(f"[BITNOB API] Address generation response headers: {dict(addr_resp.headers)}")
-            print(f"[BITNOB API] Address generation response body: {addr_resp.text}")
-            
-            addr_resp.raise_for_status()
-            address_data = addr_resp.json()
-            
-            if not address_data.get("status") or "data" not in address_data:
-                print(f"[BITNOB API] ERROR: Invalid address generation response: {address_data}")
-                return Response({
-                    "error": "Address generation failed",
-                    "detail": "Invalid response from Bitnob address generation service"
-                }, status=503)
-                
-            address = address_data["data"]["address"]
-            print(f"[BITNOB API] Successfully generated deposit address: {address}")
-            
-        except requests.exceptions.RequestException as e:
-            print(f"[BITNOB API] ERROR: Address generation API request failed: {str(e)}")
-            return Response({
-                "error": "Address generation service unavailable",
-                "detail": "Unable to connect to Bitnob address generation service"
-            }, status=503)
-        except Exception as e:
-            print(f"[BITNOB API] ERROR: Unexpected error generating address: {str(e)}")
-            return Response({
-                "error": "Address generation failed",
-                "detail": str(e)
-            }, status=500)
+        quote, error = quote_usdt_deposit(
+            remaining_amount, schedule.customer.email, f"Payment Schedule {schedule.id} - {schedule.title}", network
+        )
+        if error is not None:
+            return error
+        usdt_amount, ugx_rate, address = quote["usdt_amount"], quote["ugx_rate"], quote["address"]
 
         # 3. Save FundTransaction
         ref = str(uuid.uuid4())
@@ -999,6 +1023,7 @@ class CreateUSDTDepositView(APIView):
             usdt_required=usdt_amount,
             status="pending"
         )
+        invalidate_schedule(schedule.id, schedule.customer_id)
 
         return Response({
             "message": "Funding transaction created successfully.",
@@ -1029,6 +1054,18 @@ class CreateUSDTDepositView(APIView):
 @api_view(['GET'])
 def get_funding_status(request, schedule_id):
     """Get detailed funding status for a payment schedule"""
+    version = schedule_version(schedule_id)
+    if version is None:
+        return Response({"error": "Payment schedule not found"}, status=404)
+    etag = schedule_etag(schedule_id, version, 'funding-status', request.query_params)
+    not_modified = not_modified_response(request, etag)
+    if not_modified is not None:
+        return not_modified
+    cache_key = schedule_cache_key('funding-status', schedule_id, request.query_params, discriminator=f"v{version}")
+    payload = get_cached_payload(cache_key, 'funding-status')
+    if payload is not None:
+        return with_etag(Response(payload), etag)
+
     try:
         schedule = PaymentSchedule.objects.get(id=schedule_id)
     except PaymentSchedule.DoesNotExist:
@@ -1052,7 +1089,7 @@ def get_funding_status(request, schedule_id):
             "updated_at": txn.updated_at
         })
     
-    return Response({
+    payload = {
         "schedule": {
             "id": str(schedule.id),
             "title": schedule.title,
@@ -1071,6 +1108,129 @@ def get_funding_status(request, schedule_id):
         },
         "fund_transactions": transactions_data,
         "transaction_count": len(transactions_data)
+    }
+    set_cached_payload(cache_key, payload)
+    return with_etag(Response(payload), etag)
+
+
+class CreateWalletDepositView(APIView):
+    """
+    Top up a customer's pooled wallet with one USDT deposit. The balance is
+    allocated to the customer's unfunded schedules when payouts run, so one
+    deposit can fund many plans.
+    """
+    def post(self, request, customer_id):
+        network = request.data.get("network", "TRON").upper()
+        allowed_networks = ["TRON", "ETHEREUM", "BSC", "POLYGON"]
+        if network not in allowed_networks:
+            return Response({
+                "error": f"Unsupported network: {network}",
+                "allowed_networks": allowed_networks
+            }, status=400)
+        try:
+            amount = Money.from_major(request.data.get("amount")).amount
+        except (InvalidOperation, TypeError, ValueError):
+            return Response({"error": "amount (UGX) is required and must be a number"}, status=400)
+        if amount <= 0:
+            return Response({"error": "amount must be positive"}, status=400)
+
+        try:
+            customer = BitnobCustomer.objects.get(id=customer_id)
+        except BitnobCustomer.DoesNotExist:
+            return Response({"error": "Customer not found"}, status=404)
+        wallet = get_wallet(customer.id)
+
+        expire_chunk(wallet=wallet)
+        pending_txn = FundTransaction.objects.filter(wallet=wallet, status="pending").first()
+        if pending_txn is not None:
+            return Response({
+                "error": "A pending deposit already exists for this wallet.",
+                "existing_transaction": {
+                    "id": str(pending_txn.id),
+                    "reference": pending_txn.reference,
+                    "amount": str(pending_txn.amount),
+                    "created_at": pending_txn.created_at,
+                    "deposit_address": pending_txn.stablecoin_address,
+                    "network": pending_txn.stablecoin_network,
+                    "usdt_required": str(pending_txn.usdt_required)
+                }
+            }, status=400)
+
+        quote, error = quote_usdt_deposit(amount, customer.email, f"Wallet {wallet.id} - {customer.email}", network)
+        if error is not None:
+            return error
+
+        fund_txn = FundTransaction.objects.create(
+            wallet=wallet,
+            reference=str(uuid.uuid4()),
+            amount=amount,
+            currency="UGX",
+            stablecoin_address=quote["address"],
+            stablecoin_network=network,
+            usdt_required=quote["usdt_amount"],
+            status="pending"
+        )
+
+        return Response({
+            "message": "Wallet deposit created successfully.",
+            "funding_details": {
+                "reference": fund_txn.reference,
+                "network": network,
+                "usdt_required": str(quote["usdt_amount"]),
+                "ugx_amount": str(amount),
+                "usd_rate": str(quote["ugx_rate"]),
+                "deposit_address": quote["address"]
+            },
+            "wallet": {
+                "id": wallet.id,
+                "balance": str(wallet.balance)
+            },
+            "instructions": {
+                "step_1": f"Send exactly {quote['usdt_amount']} USDT to the address below",
+                "step_2": "Use the correct network (TRC20 for TRON, ERC20 for Ethereum, etc.)",
+                "step_3": "Wait for confirmation (usually 1-5 minutes)",
+                "step_4": "Your schedules draw on the wallet balance as their payouts come due"
+            }
+        }, status=201)
+
+
+@api_view(['GET'])
+def get_customer_wallet(request, customer_id):
+    """
+    A customer's pooled wallet: balance, deposits and the most recent ledger
+    entries (deposits in, allocations to schedules out).
+
+    Query params: limit (ledger entries, default 50, max 500)
+    """
+    if not BitnobCustomer.objects.filter(id=customer_id).exists():
+        return Response({"error": "Customer not found"}, status=404)
+    try:
+        limit = parse_page_size(request.query_params.get('limit'), default=50, maximum=500)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    wallet = get_wallet(customer_id)
+    deposits = wallet.fund_transactions.order_by('-created_at').values(
+        'id', 'reference', 'amount', 'currency', 'status', 'usdt_required',
+        'stablecoin_address', 'stablecoin_network', 'created_at', 'updated_at'
+    )[:limit]
+    ledger = wallet.ledger_entries.order_by('-created_at', '-id').values(
+        'kind', 'amount_minor', 'schedule_id', 'fund_transaction_id', 'created_at'
+    )[:limit]
+    return Response({
+        "wallet": {
+            "id": wallet.id,
+            "customer_id": customer_id,
+            "balance": str(wallet.balance),
+            "balance_minor": wallet.balance_minor,
+            "currency": wallet.currency,
+            "updated_at": wallet.updated_at
+        },
+        "deposits": [
+            {**deposit, "amount": str(deposit["amount"]),
+             "usdt_required": str(deposit["usdt_required"]) if deposit["usdt_required"] else None}
+            for deposit in deposits
+        ],
+        "ledger": list(ledger)
     })
 
 
@@ -1082,21 +1242,33 @@ def manual_fund_confirmation(request, fund_transaction_id):
     except FundTransaction.DoesNotExist:
         return Response({"error": "Fund transaction not found"}, status=404)
     
-    if fund_txn.status == "paid":
+    # Manually mark as paid; refused if it already is (or was confirmed concurrently)
+    original_status = fund_txn.status
+    if not transition_instance(fund_txn, "paid"):
         return Response({
             "message": "Transaction already confirmed",
-            "status": fund_txn.status
+            "status": "paid"
         })
     
-    # Manually mark as paid
-    original_status = fund_txn.status
-    fund_txn.status = "paid"
-    fund_txn.updated_at = timezone.now()
-    fund_txn.save()
-    
-    # Update schedule funding status
+    if fund_txn.schedule_id is None:
+        # A wallet top-up: the transition credited the customer's wallet in SQL
+        events.publish_funding_status(fund_txn, original_status)
+        wallet = fund_txn.wallet
+        return Response({
+            "message": "Wallet deposit manually confirmed",
+            "fund_transaction_id": str(fund_txn.id),
+            "old_status": original_status,
+            "new_status": fund_txn.status,
+            "wallet_id": wallet.id,
+            "wallet_balance": str(wallet.balance),
+        })
+
+    # The transition added the amount to the schedule's funded total and set
+    # is_funded in SQL (bumping its version); read back the result
     schedule = fund_txn.schedule
-    schedule.update_funding_status()
+    schedule.refresh_from_db(fields=['funded_amount_minor', 'is_funded'])
+    invalidate_schedule(schedule.id, schedule.customer_id)
+    events.publish_funding_status(fund_txn, original_status)
     
     return Response({
         "message": "Fund transaction manually confirmed",
@@ -1129,8 +1301,9 @@ def test_simulate_webhook(request):
         "network": "TRON"
     }
     
-    # Call our webhook handler
-    return handle_fund_transaction_webhook(webhook_data, event, fund_reference)
+    # Applied synchronously so the caller sees the outcome
+    body, status_code = webhooks.handle_fund_event(webhook_data, event, fund_reference)
+    return Response(body, status=status_code)
 
 
 @api_view(['POST'])
@@ -1192,64 +1365,17 @@ def trigger_scheduled_payments(request):
 @permission_classes([AllowAny])
 @csrf_exempt
 def get_scheduled_payments_status(request):
-    """Get status of scheduled payments"""
-    from payments.models import PaymentSchedule, MobileTransaction
-    from django.db.models import Count, Q
-    
-    # Get all active, funded schedules
-    active_schedules = PaymentSchedule.objects.filter(
-        status='active',
-        is_funded=True
-    )
-    
-    schedule_summaries = []
-    
-    for schedule in active_schedules:
-        # Get transaction counts
-        total_transactions = MobileTransaction.objects.filter(
-            receiver__payment_schedule=schedule
-        ).count()
-        
-        pending_transactions = MobileTransaction.objects.filter(
-            receiver__payment_schedule=schedule,
-            status__in=['pending', 'processing']
-        ).count()
-        
-        successful_transactions = MobileTransaction.objects.filter(
-            receiver__payment_schedule=schedule,
-            status='success'
-        ).count()
-        
-        failed_transactions = MobileTransaction.objects.filter(
-            receiver__payment_schedule=schedule,
-            status='failed'
-        ).count()
-        
-        # Calculate expected total transactions
-        expected_total = sum(receiver.number_of_installments for receiver in schedule.receivers.all())
-        
-        schedule_summaries.append({
-            "schedule_id": str(schedule.id),
-            "title": schedule.title,
-            "frequency": schedule.frequency,
-            "is_funded": schedule.is_funded,
-            "next_payment_date": schedule.next_payment_date,
-            "last_payment_date": schedule.last_payment_date,
-            "is_payment_due": schedule.is_payment_due(),
-            "total_receivers": schedule.receivers.count(),
-            "expected_total_transactions": expected_total,
-            "actual_total_transactions": total_transactions,
-            "pending_transactions": pending_transactions,
-            "successful_transactions": successful_transactions,
-            "failed_transactions": failed_transactions,
-            "completion_percentage": round((successful_transactions / expected_total * 100), 2) if expected_total > 0 else 0,
-            "created_at": schedule.created_at,
-            "funding_status": {
-                "total_required": str(schedule.total_amount),
-                "total_funded": str(schedule.total_funded_amount),
-                "is_adequately_funded": schedule.is_adequately_funded
-            }
-        })
+    """
+    Get status of scheduled payments.
+
+    Pass ?source=snapshot to read the precomputed snapshots instead of
+    aggregating the live tables.
+    """
+    source = request.query_params.get('source', 'live')
+    if source == 'snapshot':
+        schedule_summaries = snapshot_schedule_summaries()
+    else:
+        schedule_summaries = live_schedule_summaries()
     
     return Response({
         "active_schedules_count": len(schedule_summaries),
@@ -1260,10 +1386,172 @@ def get_scheduled_payments_status(request):
             "total_successful": sum(s["successful_transactions"] for s in schedule_summaries),
             "total_failed": sum(s["failed_transactions"] for s in schedule_summaries),
         },
+        "source": "snapshot" if source == 'snapshot' else "live",
         "current_time": timezone.now()
     })
 
 
+@api_view(['GET'])
+def get_changes(request):
+    """
+    Delta sync: schedules, receivers, transactions and fund transactions
+    created or modified since ``since`` (the next_cursor of the previous
+    call; omit it for a full sync). Keep calling while has_more is true.
+
+    Query params: since, customer_email, page_size (per feed)
+    """
+    customer_id = None
+    customer_email = request.query_params.get('customer_email')
+    if customer_email:
+        customer_id = BitnobCustomer.objects.filter(email=customer_email).values_list('id', flat=True).first()
+        if customer_id is None:
+            return Response({"error": "Customer not found"}, status=404)
+
+    try:
+        page_size = parse_page_size(
+            request.query_params.get('page_size'),
+            default=settings.CHANGES_PAGE_SIZE,
+            maximum=settings.CHANGES_MAX_PAGE_SIZE
+        )
+        changes, next_cursor, has_more = changes_since(
+            request.query_params.get('since'), customer_id=customer_id, page_size=page_size
+        )
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=400)
+
+    return Response({
+        **changes,
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    })
+
+
+TRANSITION_KINDS = {"mobile", "fund"}
+
+
+def _parse_minutes(value, default):
+    minutes = int(value) if value not in (None, "") else default
+    if minutes <= 0:
+        raise ValueError("minutes must be positive")
+    return minutes
+
+
+@api_view(['GET'])
+def get_transaction_transitions(request):
+    """
+    Status history from the transition log, newest first: one transaction's
+    (kind + transaction_id) or every change in the last ``minutes``.
+
+    Query params: kind=mobile|fund, transaction_id, minutes (default 5), limit (default/max 500)
+    """
+    kind = request.query_params.get('kind')
+    transaction_id = request.query_params.get('transaction_id')
+    if kind is not None and kind not in TRANSITION_KINDS:
+        return Response({"error": "kind must be mobile or fund"}, status=400)
+    try:
+        limit = parse_page_size(request.query_params.get('limit'), default=500, maximum=500)
+        minutes = _parse_minutes(request.query_params.get('minutes'), default=5)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    transitions = TransactionTransition.objects.order_by('-changed_at', '-id')
+    if transaction_id:
+        if kind is None:
+            return Response({"error": "kind is required with transaction_id"}, status=400)
+        transitions = transitions.filter(kind=kind, transaction_id=transaction_id)
+    else:
+        transitions = transitions.filter(changed_at__gte=timezone.now() - timedelta(minutes=minutes))
+        if kind:
+            transitions = transitions.filter(kind=kind)
+
+    return Response({
+        "transitions": list(transitions.values(
+            'kind', 'transaction_id', 'schedule_id', 'from_status', 'to_status', 'changed_at'
+        )[:limit])
+    })
+
+
+@api_view(['GET'])
+def get_time_in_status(request):
+    """
+    How long transactions spent in a status (seconds, percentiles), over the
+    stays that ended in the last ``minutes``.
+
+    Query params: kind=mobile|fund (default mobile), status (default processing), minutes (default 60)
+    """
+    kind = request.query_params.get('kind', 'mobile')
+    status_name = request.query_params.get('status', 'processing')
+    if kind not in TRANSITION_KINDS:
+        return Response({"error": "kind must be mobile or fund"}, status=400)
+    try:
+        minutes = _parse_minutes(request.query_params.get('minutes'), default=60)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    return Response({
+        "kind": kind,
+        "status": status_name,
+        "minutes": minutes,
+        **time_in_status(kind, status_name, timezone.now() - timedelta(minutes=minutes))
+    })
+
+
+EXPORT_CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+@api_view(['GET'])
+def export_transactions(request):
+    """
+    Stream mobile or fund transactions as CSV or NDJSON for reconciliation.
+
+    Query params:
+      kind=mobile|fund             - which transactions (default mobile)
+      output=csv|ndjson            - file format (default csv; ``format`` is reserved by DRF)
+      customer_id / customer_email - only this customer's transactions
+      schedule_id                  - only this schedule's transactions
+      status=a,b                   - only these statuses
+      from / to                    - created_at bounds (ISO date or datetime, inclusive)
+    """
+    params = request.query_params
+    kind = params.get('kind', 'mobile')
+    fmt = params.get('output', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return Response({"error": f"Unknown export format: {fmt}"}, status=400)
+
+    try:
+        queryset = export_queryset(
+            kind,
+            customer_id=params.get('customer_id'),
+            customer_email=params.get('customer_email'),
+            schedule_id=params.get('schedule_id'),
+            status=params.get('status'),
+            date_from=params.get('from'),
+            date_to=params.get('to'),
+        )
+    except ExportError as e:
+        return Response({"error": str(e)}, status=400)
+
+    response = StreamingHttpResponse(iter_export_lines(queryset, kind, fmt), content_type=EXPORT_CONTENT_TYPES[fmt])
+    filename = f"{kind}-transactions-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_cache_stats(request):
+    """Hit/miss counters of the response cache, per cached endpoint"""
+    try:
+        stats = cache_stats()
+    except Exception as e:
+        return Response({"error": "Cache unavailable", "detail": str(e)}, status=503)
+    return Response({
+        "backend": settings.CACHES["default"]["BACKEND"],
+        "timeout_seconds": settings.PAYMENT_CACHE_TIMEOUT,
+        "scopes": stats
+    })
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @csrf_exempt
@@ -1440,7 +1728,8 @@ def create_5min_test_payment(request):
         country = receiver.country_code
         number = receiver.phone
         sender = f"{test_customer.first_name} {test_customer.last_name}"
-        amount = int(float(receiver.amount_per_installment) * 100)  # Convert to cents
+        installment = receiver.installment_money
+        amount = installment.minor  # Bitnob expects cents
         
         # Check if payment is now due
         can_pay, timing_message = receiver.can_receive_next_installment()
@@ -1483,7 +1772,7 @@ def create_5min_test_payment(request):
         next_installment = receiver.next_installment()
         txn = MobileTransaction.objects.create(
             receiver=receiver,
-            amount=amount/100,  # Convert back to original amount
+            amount=installment.amount,
             installment_number=next_installment,
             reference=ref,
             sent_at=timezone.now(),
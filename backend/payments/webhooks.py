@@ -0,0 +1,545 @@
+# webhooks.py
+"""
+Bitnob webhook processing.
+
+The webhook endpoint only validates the payload and stores it in the
+WebhookInbox (a single INSERT), so the provider is acknowledged in constant
+time however busy we are. ``drain_inbox``, run by the drain_webhook_inbox
+Celery task, claims pending entries in batches with
+``SELECT ... FOR UPDATE SKIP LOCKED`` so several workers can drain in
+parallel, and applies each one with ``handle_event``.
+
+An entry whose transaction cannot be found (a settlement can overtake the
+commit of the row it settles) or whose handler raises stays
+pending and is retried by later drains, up to WEBHOOK_INBOX_MAX_ATTEMPTS.
+
+Providers redeliver webhooks. Every entry carries a unique ``event_key``;
+a redelivery fails the insert (or, more cheaply, hits the in-process cache
+of recently seen keys) and is acknowledged as a duplicate without being
+applied again.
+
+A batch is applied coalesced: its transactions are fetched with one query
+per kind, status changes are written as grouped conditional UPDATEs (see
+payments.transitions) and each affected
+schedule's payment dates, funding status, version and cache are updated
+once, so the writes per burst scale with the number of schedules rather
+than the number of events. If anything in the coalesced pass fails, the
+batch falls back to applying its entries one by one.
+"""
+import hashlib
+import logging
+import threading
+from collections import Counter, OrderedDict
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+
+from payments import events
+from payments.cache import invalidate_schedule
+from payments.memo import memo_scope, invalidate
+from payments.models import (
+    PaymentSchedule, MobileReceiver, MobileTransaction, FundTransaction, WebhookInbox,
+    bump_schedule_version, record_transitions,
+)
+from payments.transitions import can_transition, transition_instance, transition_rows
+
+logger = logging.getLogger(__name__)
+
+FUND_PAID_EVENTS = [
+    "stablecoin.settlement.success",
+    "stablecoin.deposit.confirmed",
+    "stablecoin.transaction.confirmed",
+    "deposit.confirmed",
+]
+FUND_FAILED_EVENTS = [
+    "stablecoin.settlement.failed",
+    "stablecoin.deposit.failed",
+    "stablecoin.transaction.failed",
+    "deposit.failed",
+]
+FUND_EXPIRED_EVENTS = [
+    "stablecoin.settlement.expired",
+    "stablecoin.deposit.expired",
+    "stablecoin.transaction.expired",
+    "deposit.expired",
+]
+FUND_PENDING_EVENTS = [
+    "stablecoin.settlement.pending",
+    "stablecoin.deposit.pending",
+    "deposit.pending",
+]
+
+# event -> status it moves the transaction to
+MOBILE_EVENT_STATUSES = {
+    "mobilepayment.settlement.success": "success",
+    "mobilepayment.settlement.failed": "failed",
+    "mobilepayment.settlement.pending": "pending",
+}
+FUND_EVENT_STATUSES = {
+    **{event: "paid" for event in FUND_PAID_EVENTS},
+    **{event: "failed" for event in FUND_FAILED_EVENTS},
+    **{event: "expired" for event in FUND_EXPIRED_EVENTS},
+    **{event: "pending" for event in FUND_PENDING_EVENTS},
+}
+
+
+def is_fund_event(event):
+    return event.startswith("stablecoin")
+
+
+def handle_event(data):
+    """Apply one webhook payload; returns ``(response body, HTTP status)``"""
+    event = data.get("event")
+    ref = data.get("reference")
+    if is_fund_event(event):
+        return handle_fund_event(data, event, ref)
+    return handle_mobile_event(data, event, ref)
+
+
+def handle_mobile_event(data, event, ref):
+    """Handle mobile payment transaction webhook events"""
+    try:
+        txn = MobileTransaction.objects.select_related('receiver__payment_schedule').get(reference=ref)
+    except MobileTransaction.DoesNotExist:
+        return {"error": "Transaction not found", "reference": ref}, 404
+
+    original_status = txn.status
+    new_status = MOBILE_EVENT_STATUSES.get(event)
+    if new_status is None:
+        # Unknown event: acknowledge without touching the transaction
+        return {"warning": f"Unknown event type: {event}", "status": "received"}, 200
+
+    if not transition_instance(txn, new_status, **_transaction_changes(new_status, data, timezone.now())):
+        # Late or repeated event, e.g. "pending" after "success"
+        return {
+            "warning": f"Transaction {txn.id} cannot move from {original_status} to {new_status}",
+            "status": "received",
+            "transaction_id": txn.id,
+            "event": event
+        }, 200
+
+    schedule = txn.receiver.payment_schedule
+    invalidate(MobileReceiver, txn.receiver_id)
+    invalidate(PaymentSchedule, schedule.id)
+    if new_status == "success":
+        # A successful installment moves the schedule's payment dates on (and bumps its version)
+        schedule.update_payment_dates()
+    else:
+        bump_schedule_version(schedule.id)
+    invalidate_schedule(schedule.id, schedule.customer_id)
+    events.publish_transaction_status(txn, original_status)
+    logger.info(f"Webhook: Transaction {txn.id} status changed from {original_status} to {txn.status}")
+
+    return {
+        "status": "received",
+        "transaction_id": txn.id,
+        "old_status": original_status,
+        "new_status": txn.status,
+        "event": event
+    }, 200
+
+
+def handle_fund_event(data, event, ref):
+    """Handle stablecoin/funding transaction webhook events"""
+    try:
+        fund_txn = FundTransaction.objects.select_related('schedule', 'wallet').get(reference=ref)
+    except FundTransaction.DoesNotExist:
+        return {"error": "Fund transaction not found", "reference": ref}, 404
+
+    original_status = fund_txn.status
+    schedule = fund_txn.schedule
+    new_status = FUND_EVENT_STATUSES.get(event)
+    if new_status is None:
+        logger.warning(f"Unknown stablecoin event: {event} for reference: {ref}")
+        return {"warning": f"Unknown stablecoin event type: {event}", "status": "received", "reference": ref}, 200
+
+    if not transition_instance(fund_txn, new_status):
+        return {
+            "warning": f"Fund transaction {fund_txn.id} cannot move from {original_status} to {new_status}",
+            "status": "received",
+            "reference": ref
+        }, 200
+
+    _log_fund_status(fund_txn, data)
+    if schedule is None:
+        return _wallet_deposit_result(fund_txn, original_status, event)
+    invalidate(PaymentSchedule, schedule.id)
+    if fund_txn.status == "paid":
+        # The transition moved the funded total and is_funded in SQL; read back the result
+        schedule.refresh_from_db(fields=['funded_amount_minor', 'is_funded'])
+        logger.info(f"Fund Webhook: Schedule {schedule.id} funded. Total funded: {schedule.total_funded_amount}")
+    else:
+        bump_schedule_version(schedule.id)
+    invalidate_schedule(schedule.id, schedule.customer_id)
+    events.publish_funding_status(fund_txn, original_status)
+    logger.info(f"Fund Webhook: Transaction {fund_txn.id} status changed from {original_status} to {fund_txn.status}")
+
+    return {
+        "status": "received",
+        "fund_transaction_id": str(fund_txn.id),
+        "schedule_id": str(schedule.id),
+        "old_status": original_status,
+        "new_status": fund_txn.status,
+        "event": event,
+        "schedule_funding_status": {
+            "is_funded": schedule.is_funded,
+            "total_funded": str(schedule.total_funded_amount),
+            "total_required": str(schedule.total_amount),
+            "shortfall": str(schedule.funding_shortfall)
+        }
+    }, 200
+
+
+def _wallet_deposit_result(fund_txn, original_status, event):
+    """Finish a top-up of a customer's pooled wallet; the transition credited it in SQL"""
+    events.publish_funding_status(fund_txn, original_status)
+    logger.info(f"Fund Webhook: Wallet deposit {fund_txn.id} status changed from {original_status} to {fund_txn.status}")
+    wallet = fund_txn.wallet
+    wallet.refresh_from_db(fields=['balance_minor'])
+    return {
+        "status": "received",
+        "fund_transaction_id": str(fund_txn.id),
+        "wallet_id": wallet.id,
+        "old_status": original_status,
+        "new_status": fund_txn.status,
+        "event": event,
+        "wallet_balance": str(wallet.balance),
+    }, 200
+
+
+def _transaction_changes(new_status, data, now):
+    """Columns written alongside a MobileTransaction status change"""
+    if new_status == "success":
+        return {"completed_at": now}
+    if new_status == "failed":
+        return {"failure_reason": data.get("message", "Payment failed via webhook")}
+    return {}
+
+
+def _log_fund_status(fund_txn, data):
+    if fund_txn.status == "failed":
+        logger.info(f"Fund Webhook: Transaction {fund_txn.id} failed: {data.get('message', 'Funding failed via webhook')}")
+
+
+def apply_coalesced(entries):
+    """
+    Apply a batch of inbox entries together; returns ``{entry id: (outcome, error)}``
+    with outcome "processed", "ignored" or "retry".
+
+    Events are first played against the rows' statuses in memory, in arrival
+    order; events the state machine refuses are ignored. The surviving
+    changes are then written as one conditional UPDATE per (model, old
+    status, new status, columns) group. Rows another worker moved in the
+    meantime are not ours to log, fund or announce: their entries are
+    ignored if the row already reached the target status, retried otherwise.
+    """
+    now = timezone.now()
+    mobile_refs = {entry.reference for entry in entries if not is_fund_event(entry.event)}
+    fund_refs = {entry.reference for entry in entries if is_fund_event(entry.event)}
+    rows = {}
+    if mobile_refs:
+        for txn in MobileTransaction.objects.select_related('receiver__payment_schedule').filter(reference__in=mobile_refs):
+            rows[(MobileTransaction, txn.reference)] = txn
+    if fund_refs:
+        for fund_txn in FundTransaction.objects.select_related('schedule', 'wallet').filter(reference__in=fund_refs):
+            rows[(FundTransaction, fund_txn.reference)] = fund_txn
+
+    results = {}
+    original_statuses = {}  # row -> status before this batch
+    changes = {}  # row -> columns to write besides status
+    entry_ids = {}  # row -> entries applied to it
+
+    for entry in entries:
+        model = FundTransaction if is_fund_event(entry.event) else MobileTransaction
+        new_status = (FUND_EVENT_STATUSES if model is FundTransaction else MOBILE_EVENT_STATUSES).get(entry.event)
+        row = rows.get((model, entry.reference))
+        if new_status is None:
+            results[entry.id] = ("ignored", None)
+            continue
+        if row is None:
+            results[entry.id] = ("retry", "Fund transaction not found" if model is FundTransaction else "Transaction not found")
+            continue
+        if not can_transition(model, row.status, new_status):
+            results[entry.id] = ("ignored", None)
+            continue
+
+        original_statuses.setdefault(row, row.status)
+        row.status = new_status
+        if model is MobileTransaction:
+            row_changes = _transaction_changes(new_status, entry.payload, now)
+        else:
+            row_changes = {}
+            _log_fund_status(row, entry.payload)
+        changes.setdefault(row, {}).update(row_changes)
+        for field, value in row_changes.items():
+            setattr(row, field, value)
+        entry_ids.setdefault(row, []).append(entry.id)
+        results[entry.id] = ("processed", None)
+
+    # A row may have gone through several statuses in memory; only its first and last matter
+    changed = [row for row in original_statuses if row.status != original_statuses[row]]
+    groups = {}
+    for row in changed:
+        key = (type(row), original_statuses[row], row.status, tuple(sorted(changes[row].items())))
+        groups.setdefault(key, []).append(row)
+
+    for (model, old_status, new_status, row_changes), group in groups.items():
+        moved = transition_rows(
+            model, new_status, [row.pk for row in group], old_status, {"updated_at": now, **dict(row_changes)}
+        )
+        lost = [row for row in group if row.pk not in moved]
+        if not lost:
+            continue
+        # Only rows this statement moved count; whoever moved the others logs, funds and announces them
+        current = dict(model.objects.filter(pk__in=[row.pk for row in lost]).values_list('pk', 'status'))
+        for row in lost:
+            changed.remove(row)
+            for entry_id in entry_ids[row]:
+                if current.get(row.pk) == new_status:
+                    results[entry_id] = ("ignored", None)
+                else:
+                    results[entry_id] = ("retry", f"Status changed concurrently from {original_statuses[row]}")
+    record_transitions([(row, original_statuses[row]) for row in changed], now)
+
+    # Derived schedule state, once per schedule however many events it had
+    schedules = {}
+    for row in changed:
+        if isinstance(row, FundTransaction) and row.schedule_id is None:
+            continue  # a wallet top-up; the transition credited the wallet
+        schedule = row.schedule if isinstance(row, FundTransaction) else row.receiver.payment_schedule
+        schedule = schedules.setdefault(schedule.id, schedule)
+        if isinstance(row, FundTransaction):
+            row.schedule = schedule
+        else:
+            row.receiver.payment_schedule = schedule
+            invalidate(MobileReceiver, row.receiver_id)
+        invalidate(PaymentSchedule, schedule.id)
+    paid_schedule_ids = {
+        row.receiver.payment_schedule_id for row in changed
+        if isinstance(row, MobileTransaction) and row.status == "success"
+    }
+    funded_schedule_ids = {
+        row.schedule_id for row in changed
+        if isinstance(row, FundTransaction) and row.status == "paid" and row.schedule_id is not None
+    }
+    for schedule_id in paid_schedule_ids:
+        schedules[schedule_id].update_payment_dates()
+    if funded_schedule_ids:
+        # Funded totals were moved in SQL along with the transition log; pick up the results
+        funding = PaymentSchedule.objects.filter(pk__in=funded_schedule_ids).values_list(
+            'pk', 'funded_amount_minor', 'is_funded'
+        )
+        for schedule_id, funded_amount_minor, is_funded in funding:
+            schedules[schedule_id].funded_amount_minor = funded_amount_minor
+            schedules[schedule_id].is_funded = is_funded
+    # The schedules saved or funded above already had their version bumped
+    bump_schedule_version(*(set(schedules) - paid_schedule_ids - funded_schedule_ids))
+    for schedule in schedules.values():
+        invalidate_schedule(schedule.id, schedule.customer_id)
+
+    # One event per row, from its status before the batch to its final one
+    for row in changed:
+        if isinstance(row, FundTransaction):
+            events.publish_funding_status(row, original_statuses[row])
+        else:
+            events.publish_transaction_status(row, original_statuses[row])
+
+    logger.info(
+        f"Webhook batch: {len(changed)} transactions updated with {len(groups)} statements "
+        f"across {len(schedules)} schedules"
+    )
+    return results
+
+
+# Payload fields that carry the provider's id, in order of preference. The
+# payload is flat, so this may be the transaction's id rather than one per
+# delivery; keys built from it also carry the event and status.
+EVENT_ID_FIELDS = ("id", "eventId")
+
+# Longest key stored as is (WebhookInbox.event_key holds 128 characters)
+MAX_PLAIN_EVENT_KEY = 128
+
+
+def event_key(data):
+    """
+    Stable identity of a webhook delivery: the provider id with the event and
+    status, or a hash of reference, event and status when there is no id
+    """
+    outcome = "|".join(str(data.get(field) or "") for field in ("event", "status"))
+    for field in EVENT_ID_FIELDS:
+        if data.get(field):
+            identity = f"{data[field]}|{outcome}"
+            key = f"id:{identity}"
+            if len(key) <= MAX_PLAIN_EVENT_KEY:
+                return key
+            return "id:sha256:" + hashlib.sha256(identity.encode()).hexdigest()
+    identity = f"{data.get('reference') or ''}|{outcome}"
+    return "sha256:" + hashlib.sha256(identity.encode()).hexdigest()
+
+
+class RecentKeys:
+    """Bounded, thread-safe LRU set of event keys already stored by this process"""
+
+    def __init__(self, size):
+        self.size = size
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return True
+            return False
+
+    def add(self, key):
+        with self._lock:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.size:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+recent_keys = RecentKeys(settings.WEBHOOK_DEDUP_CACHE_SIZE)
+
+
+def enqueue(data):
+    """
+    Store a validated webhook payload for the drain; the only work done while
+    the provider waits. Returns the new entry, or None for a redelivery.
+    """
+    key = event_key(data)
+    if key in recent_keys:
+        return None
+    try:
+        with transaction.atomic():
+            entry = WebhookInbox.objects.create(
+                event=data["event"], reference=data["reference"], event_key=key, payload=data
+            )
+    except IntegrityError:
+        # Stored before (possibly by another process)
+        recent_keys.add(key)
+        return None
+    transaction.on_commit(lambda: recent_keys.add(key))
+    return entry
+
+
+def apply_now(entry):
+    """Apply a freshly stored entry synchronously (inline mode); returns the handler's ``(body, status)``"""
+    with transaction.atomic(), memo_scope():
+        body, status_code = handle_event(entry.payload)
+    entry.attempts = 1
+    if status_code == 404:
+        entry.last_error = body["error"]
+    else:
+        entry.status = "ignored" if "warning" in body else "processed"
+        entry.processed_at = timezone.now()
+    entry.save(update_fields=['status', 'attempts', 'last_error', 'processed_at'])
+    return body, status_code
+
+
+def _record_outcome(entry, outcome, error=None):
+    """Record an attempt's outcome on the (unsaved) entry; returns the outcome to count"""
+    entry.attempts += 1
+    if outcome != "retry":
+        entry.status = outcome
+        entry.last_error = ""
+        entry.processed_at = timezone.now()
+        return outcome
+    entry.last_error = error
+    if entry.attempts >= settings.WEBHOOK_INBOX_MAX_ATTEMPTS:
+        entry.status = "failed"
+        entry.processed_at = timezone.now()
+        return "failed"
+    return "retry"
+
+
+def _apply_entry(entry):
+    """Run one inbox entry through its handler on its own; returns ``(outcome, error)``"""
+    try:
+        # Savepoint: a failing entry must not roll back the rest of the batch
+        with transaction.atomic(), memo_scope():
+            body, status_code = handle_event(entry.payload)
+    except Exception as e:
+        logger.exception(f"Webhook inbox entry {entry.id} ({entry.event} {entry.reference}) failed")
+        return "retry", str(e)
+    if status_code == 404:
+        return "retry", body["error"]
+    return ("ignored" if "warning" in body else "processed"), None
+
+
+def _apply_batch(entries):
+    try:
+        with transaction.atomic(), memo_scope():
+            return apply_coalesced(entries)
+    except Exception:
+        # e.g. a status change refused by a constraint: find the culprit entry by entry
+        logger.exception(f"Coalesced webhook batch of {len(entries)} failed; applying entries one by one")
+        return {entry.id: _apply_entry(entry) for entry in entries}
+
+
+def process_batch(batch_size, after_id=0):
+    """
+    Claim and apply up to ``batch_size`` pending entries with ids above
+    ``after_id``. Returns ``(outcome counts, last id claimed or None)``.
+    """
+    with transaction.atomic():
+        entries = list(
+            WebhookInbox.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", id__gt=after_id)
+            .order_by('id')[:batch_size]
+        )
+        if not entries:
+            return Counter(), None
+        results = _apply_batch(entries)
+        outcomes = Counter(_record_outcome(entry, *results[entry.id]) for entry in entries)
+        WebhookInbox.objects.bulk_update(entries, ['status', 'attempts', 'last_error', 'processed_at'])
+    return outcomes, entries[-1].id
+
+
+def apply_payloads(payloads):
+    """
+    Apply webhook-shaped payloads straight away, bypassing the inbox (the
+    reconciler uses this). Returns one outcome per payload: "processed",
+    "ignored" or "retry".
+    """
+    entries = [
+        SimpleNamespace(id=index, event=payload["event"], reference=payload["reference"], payload=payload)
+        for index, payload in enumerate(payloads)
+    ]
+    with transaction.atomic():
+        results = _apply_batch(entries)
+    return [results[entry.id][0] for entry in entries]
+
+
+def drain_inbox(batch_size=None):
+    """
+    Apply everything pending in the inbox, one batch (and one database
+    transaction) at a time. Each entry is tried at most once per drain, so
+    retries wait for the next run.
+    """
+    batch_size = batch_size or settings.WEBHOOK_INBOX_BATCH_SIZE
+    totals = Counter()
+    after_id = 0
+    while True:
+        outcomes, after_id = process_batch(batch_size, after_id)
+        if after_id is None:
+            break
+        totals.update(outcomes)
+    return dict(totals)
+
+
+def prune_inbox():
+    """Delete settled entries older than the retention window; failed ones are kept for inspection"""
+    cutoff = timezone.now() - timedelta(days=settings.WEBHOOK_INBOX_RETENTION_DAYS)
+    deleted, _ = WebhookInbox.objects.filter(
+        status__in=["processed", "ignored"], received_at__lt=cutoff
+    ).delete()
+    return deleted
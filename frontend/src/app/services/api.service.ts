@@ -92,6 +92,19 @@ export class ApiService {
     return this.http.get(`${this.baseUrl}/schedule-progress/${receiverId}/`, this.httpOptions);
   }
 
+  // One request (and a fixed number of queries) for a whole receiver table
+  getReceiversProgress(receiverIds: number[]): Observable<any> {
+    return this.http.get(`${this.baseUrl}/receiver-progress/?receiver_ids=${receiverIds.join(',')}`, this.httpOptions);
+  }
+
+  getScheduleReceiversProgress(scheduleId: string, cursor?: string): Observable<any> {
+    let url = `${this.baseUrl}/receiver-progress/?schedule_id=${scheduleId}`;
+    if (cursor) {
+      url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+    return this.http.get(url, this.httpOptions);
+  }
+
   // Funding Management
   createUSDTDeposit(scheduleId: string, network: string = 'TRON'): Observable<any> {
     return this.http.post(`${this.baseUrl}/payment-schedules/${scheduleId}/fund/`, 
@@ -131,6 +144,26 @@ export class ApiService {
     return this.http.get(`${this.baseUrl}/check-payment-timing/${receiverId}/`, this.httpOptions);
   }
 
+  // Live status updates (server-sent events) instead of polling
+  streamScheduleEvents(scheduleId: string): Observable<{ type: string; data: any }> {
+    return this.streamEvents(`${this.baseUrl}/events/schedules/${scheduleId}/`);
+  }
+
+  streamCustomerEvents(customerId: number): Observable<{ type: string; data: any }> {
+    return this.streamEvents(`${this.baseUrl}/events/customers/${customerId}/`);
+  }
+
+  private streamEvents(url: string): Observable<{ type: string; data: any }> {
+    return new Observable(subscriber => {
+      const source = new EventSource(url);
+      const forward = (event: MessageEvent) => subscriber.next({ type: event.type, data: JSON.parse(event.data) });
+      source.addEventListener('transaction.status', forward);
+      source.addEventListener('funding.status', forward);
+      // EventSource reconnects on its own; closing it on unsubscribe ends the stream
+      return () => source.close();
+    });
+  }
+
   // Testing Endpoints
   createTestSchedule(): Observable<any> {
     return this.http.post(`${this.baseUrl}/create-test-schedule/`, {}, this.httpOptions);